@@ -0,0 +1,99 @@
+import hashlib
+import json
+import sqlite3
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any, Optional, Union
+from zipfile import ZipFile
+
+from attr import asdict
+
+from constants import REPO
+from musescore.features import Features
+
+__all__ = ["FeatureCache", "get_version_stamp"]
+
+# packages whose source decides the extracted values
+_stamped_packages = ["musescore", "utils"]
+
+
+def get_version_stamp(extra: Iterable[str] = ()) -> str:
+    """Returns a hash of the source of the `musescore` (and `utils`) package.
+
+    Any change to e.g. `common.get_features` or a version parser gives a new stamp,
+    which invalidates everything cached under the old one.
+    """
+    h = hashlib.sha256()
+    for package in _stamped_packages:
+        for path in sorted((REPO / "packages" / package).glob("*.py")):
+            h.update(path.name.encode())
+            h.update(path.read_bytes())
+    for e in extra:
+        h.update(e.encode())
+    return h.hexdigest()[:16]
+
+
+def get_digest(zfile: ZipFile, filename: str, chunk_size: int = 1 << 16) -> str:
+    """Returns the SHA-256 of the inner file's bytes."""
+    h = hashlib.sha256()
+    with zfile.open(filename, "r") as f:
+        while chunk := f.read(chunk_size):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class FeatureCache:
+    """Persistent cache of extracted features, keyed by the `.mscx` content hash and the version stamp.
+
+    Stores the `Features`, the csv row and the `meta_info` produced by `open_and_extract`,
+    including empty results (not piano, no parser) so they are not parsed again either.
+    """
+
+    def __init__(self, path: Union[str, Path], stamp: str):
+        self.path = Path(path)
+        self.stamp = stamp
+        self._conn = sqlite3.connect(self.path, timeout=60)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS features ("
+            " digest TEXT NOT NULL,"
+            " stamp TEXT NOT NULL,"
+            " features TEXT,"
+            " row TEXT,"
+            " meta_info TEXT,"
+            " PRIMARY KEY (digest, stamp))"
+        )
+        self._conn.commit()
+
+    def get(self, digest: str) -> Optional[tuple[Optional[Features], Optional[list], Optional[dict[str, Any]]]]:
+        """Returns (features, row, meta_info), or None if not cached."""
+        found = self._conn.execute(
+            "SELECT features, row, meta_info FROM features WHERE digest = ? AND stamp = ?", (digest, self.stamp)
+        ).fetchone()
+        if found is None:
+            return None
+        features, row, meta_info = map(lambda s: None if s is None else json.loads(s), found)
+        return None if features is None else Features(**features), row, meta_info
+
+    def put(
+        self,
+        digest: str,
+        features: Optional[Features],
+        row: Optional[list],
+        meta_info: Optional[dict[str, Any]],
+    ) -> None:
+        features = None if features is None else asdict(features)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO features (digest, stamp, features, row, meta_info) VALUES (?, ?, ?, ?, ?)",
+            (digest, self.stamp, *(None if o is None else json.dumps(o) for o in (features, row, meta_info))),
+        )
+        self._conn.commit()
+
+    def prune(self) -> int:
+        """Deletes entries of other version stamps. Returns the number of deleted entries."""
+        cursor = self._conn.execute("DELETE FROM features WHERE stamp != ?", (self.stamp,))
+        self._conn.commit()
+        return cursor.rowcount
+
+    def close(self) -> None:
+        self._conn.close()
@@ -1,9 +1,13 @@
+import argparse
 import csv
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
 from pathlib import Path
 from pprint import pprint
-from traceback import print_exc
-from typing import Any, Literal, Optional, Union
+from traceback import format_exc, print_exc
+from typing import Any, Iterator, Literal, Optional, Union
 from zipfile import ZipFile
 
 from bs4 import BeautifulSoup
@@ -14,8 +18,10 @@ sys.path.append(str(REPO / "packages"))
 from musescore.features import Features
 from musescore import common
 from musescore.next import newMuseScore
+from musescore.stream import read_version
+from cache import FeatureCache, get_digest, get_version_stamp
 
-__all__ = ["open_and_extract"]
+__all__ = ["extract_parallel", "open_and_extract"]
 
 init()
 
@@ -54,17 +60,49 @@ headers = [
 
 
 def open_and_extract(
-    zfp: Path, *, throw: Union[bool, Literal["ask"]] = "ask", verbose: bool = True
+    zfp: Path,
+    *,
+    throw: Union[bool, Literal["ask"]] = "ask",
+    verbose: bool = True,
+    backend: Literal["bs4", "lxml"] = "bs4",
+    cache: Optional[FeatureCache] = None,
+    print_source: bool = True,
 ) -> tuple[Optional[Features], Optional[list]]:
     zfile = ZipFile(zfp)
     mscx_files = list(filter(lambda n: n.endswith(".mscx"), zfile.namelist()))
     if not mscx_files:
         raise FileNotFoundError(zfile.namelist())
     filename = mscx_files[0]
+    digest = None
+    if cache is not None:
+        digest = get_digest(zfile, filename)
+        cached = cache.get(digest)
+        if cached is not None:
+            f, data, meta_info = cached
+            print(Fore.YELLOW + zfp.stem, Fore.GREEN + filename, Fore.BLUE + "cached" + Style.RESET_ALL, end=" ")
+            if verbose:
+                print(f, meta_info)
+            else:
+                print()
+            if data is not None:
+                # the same content may have been cached under another id
+                data = [zfp.stem, filename, *data[2:]]
+            return f, data
     openfile = zfile.open(filename, "r")
-    soup = BeautifulSoup(openfile, "xml")
+    if backend == "lxml":
+        soup = None
+        source = openfile
+    else:
+        soup = BeautifulSoup(openfile, "xml")
+        source = soup
+
+    def get_version() -> str:
+        if soup is None:
+            return read_version(zfile.open(filename, "r"))
+        return soup.find("museScore").get("version")
+
     try:
-        musescore = newMuseScore(soup)
+        musescore = newMuseScore(source, backend=backend)
         if musescore is not None:
             f = musescore.get_features()
             if f is not None:
@@ -107,8 +145,12 @@ def open_and_extract(
                     data.append(func(info, ["Subtitle"]))
                     data.append(func(info, ["composer", "Composer"]))
                     assert len(data) == len(headers)
+                    if cache is not None:
+                        cache.put(digest, f, data, info)
                     return f, data
                 except IndexError:
+                    if cache is not None:
+                        cache.put(digest, f, None, None)
                     return f, None
             else:
                 print(
@@ -121,14 +163,16 @@ def open_and_extract(
             print(
                 Fore.YELLOW + zfp.stem,
                 Fore.GREEN + filename,
-                Fore.CYAN + soup.find("museScore").get("version"),
+                Fore.CYAN + get_version(),
                 Fore.RED + "× no parser" + Style.RESET_ALL,
             )
+        if cache is not None:
+            cache.put(digest, None, None, None)
     except Exception as e:
         print(
             Fore.YELLOW + zfp.stem,
             Fore.GREEN + filename,
-            Fore.CYAN + soup.find("museScore").get("version"),
+            Fore.CYAN + get_version(),
             Fore.RED + "× error while parsing" + Style.RESET_ALL,
         )
         if not throw:
@@ -138,26 +182,121 @@ def open_and_extract(
                 print_exc()
                 input("Enter to continue...")
                 return None, None
-        print(openfile.read())
+        if print_source:
+            print(openfile.read())
         raise
     return None, None
 
 
+_worker_cache: Optional[FeatureCache] = None
+
+
+def _init_worker(cache_path: Optional[Path], stamp: Optional[str]) -> None:
+    global _worker_cache
+    if cache_path is not None:
+        _worker_cache = FeatureCache(cache_path, stamp)
+
+
+def _extract_worker(zfp: Path, backend: Literal["bs4", "lxml"]) -> tuple[Optional[list], set[str], Optional[str]]:
+    """Runs in a worker process. Returns the row, not-piano values seen and the traceback if it failed."""
+    common._known_not_piano_values.clear()
+    try:
+        # the traceback goes to mdc-errors.txt, the .mscx would flood the output of every worker
+        _, data = open_and_extract(
+            zfp, throw=True, verbose=False, backend=backend, cache=_worker_cache, print_source=False
+        )
+    except Exception:
+        return None, set(common._known_not_piano_values), format_exc()
+    return data, set(common._known_not_piano_values), None
+
+
+def extract_parallel(
+    zip_filepaths: list[Path],
+    *,
+    jobs: int,
+    backend: Literal["bs4", "lxml"] = "bs4",
+    cache: Optional[FeatureCache] = None,
+    chunksize: int = 8,
+) -> Iterator[tuple[Path, Optional[list], Optional[str]]]:
+    """Extracts zip files across a process pool.
+
+    Yields (zip filepath, row, traceback) in the order of `zip_filepaths` as soon as each is done,
+    so rows can be streamed out while later files are still being parsed.
+    Failures never raise, their traceback is yielded instead.
+    If a worker dies (e.g. killed when out of memory), the files not done yet are yielded as failed.
+    Values collected into ``common._known_not_piano_values`` by the workers are merged into this process.
+    Each worker opens its own connection to `cache`, if given.
+    """
+    initargs = (None, None) if cache is None else (cache.path, cache.stamp)
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=initargs) as executor:
+        results = executor.map(partial(_extract_worker, backend=backend), zip_filepaths, chunksize=chunksize)
+        for i, zfp in enumerate(zip_filepaths):
+            try:
+                data, not_piano_values, error = next(results)
+            except BrokenProcessPool as e:
+                for zfp in zip_filepaths[i:]:
+                    yield zfp, None, f"not extracted, a worker process died: {e!r}\n"
+                return
+            common._known_not_piano_values.update(not_piano_values)
+            yield zfp, data, error
+
+
 if __name__ == "__main__":
-    rows = []
+    parser = argparse.ArgumentParser(description="Extract features of assets/musescore/*.zip into mdc.csv")
+    parser.add_argument("--backend", choices=["bs4", "lxml"], default="bs4", help="parsing backend")
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=None,
+        help="extract with N worker processes, failures are written to mdc-errors.txt instead of asking",
+    )
+    parser.add_argument(
+        "--cache",
+        type=Path,
+        default=Path("mdc-cache.sqlite3"),
+        help="feature cache, only new or changed scores are parsed",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="parse every score again")
+    args = parser.parse_args()
+
+    cache = None
+    if not args.no_cache:
+        cache = FeatureCache(args.cache, get_version_stamp(headers))
+        cache.prune()
+
     zip_filepaths = list(
         sorted((REPO / "assets/musescore").glob("*.zip"), key=lambda a: int(a.stem))
     )
-    for zfp in zip_filepaths:
-        _, data = open_and_extract(zfp, throw="ask")
-        if data is not None:
-            rows.append(data)
+    if args.jobs is None:
+        rows = []
+        for zfp in zip_filepaths:
+            _, data = open_and_extract(zfp, throw="ask", backend=args.backend, cache=cache)
+            if data is not None:
+                rows.append(data)
+
+        with open("mdc.csv", "w", encoding="utf-8", newline="") as f:
+            write = csv.writer(f)
+            write.writerow(headers)
+            write.writerows(rows)
+    else:
+        num_errors = 0
+        with open("mdc.csv", "w", encoding="utf-8", newline="") as f, open(
+            "mdc-errors.txt", "w", encoding="utf-8"
+        ) as ferr:
+            write = csv.writer(f)
+            write.writerow(headers)
+            for zfp, data, error in extract_parallel(
+                zip_filepaths, jobs=args.jobs, backend=args.backend, cache=cache
+            ):
+                if error is not None:
+                    num_errors += 1
+                    ferr.write(f"{zfp.stem} {zfp}\n{error}\n")
+                    ferr.flush()
+                elif data is not None:
+                    write.writerow(data)
+        print(f"{num_errors} error(s), see mdc-errors.txt")
 
     print("done!")
     with open("_known_not_piano_values.txt", "w", encoding="utf-8") as f:
         pprint(common._known_not_piano_values, stream=f)
-
-    with open("mdc.csv", "w", encoding="utf-8", newline="") as f:
-        write = csv.writer(f)
-        write.writerow(headers)
-        write.writerows(rows)
@@ -27,17 +27,19 @@ expected_output = [
 
 
 class ExtractorTestCase(unittest.TestCase):
-    def help_test(self, version):
+    def help_test(self, version, backend="bs4"):
         d = difflib.Differ()
         missing_files = []
         for expected in filter(lambda o: o[1] == version, expected_output):
             id_, _, ex_features = expected
             try:
-                actual, _ = open_and_extract(REPO / f"assets/musescore/{id_}.zip", throw=True, verbose=False)
+                actual, _ = open_and_extract(
+                    REPO / f"assets/musescore/{id_}.zip", throw=True, verbose=False, backend=backend
+                )
             except FileNotFoundError:
                 missing_files.append(str(id_))
                 continue
-            with self.subTest(id=id_, version=version):
+            with self.subTest(id=id_, version=version, backend=backend):
                 try:
                     self.assertEqual(actual, ex_features)
                 except AssertionError:
@@ -60,6 +62,18 @@ class ExtractorTestCase(unittest.TestCase):
     def test_v302(self):
         self.help_test(3.02)
 
+    def test_v114_lxml(self):
+        self.help_test(1.14, backend="lxml")
+
+    def test_v206_lxml(self):
+        self.help_test(2.06, backend="lxml")
+
+    def test_v301_lxml(self):
+        self.help_test(3.01, backend="lxml")
+
+    def test_v302_lxml(self):
+        self.help_test(3.02, backend="lxml")
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1 +1,10 @@
+from typing import Optional
+
 from fastapi import Depends, HTTPException
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header matches `etag` (weak comparison)."""
+    if header is None:
+        return False
+    return header.strip() == "*" or etag in (tag.strip().replace("W/", "", 1) for tag in header.split(","))
@@ -1,10 +1,12 @@
-from typing import Any, List
+from typing import Any, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, Response
+from fastapi import APIRouter, Depends, Header, HTTPException, UploadFile, Response
 from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 
 from app import schemas, utils
 from app.api import deps
+from app.core.config import settings
 
 router = APIRouter()
 
@@ -15,9 +17,9 @@ def read_uploads(
     limit: int = 100,
 ) -> Any:
     """
-    Retrieve uploaded files.
+    Retrieve uploaded files, oldest first.
     """
-    return []
+    return utils.file.retrieve_all(skip=skip, limit=limit)
 
 
 @router.post("/", response_model=schemas.FileInfo)
@@ -28,19 +30,52 @@ async def create_upload(
     """
     Upload a file.
     """
-    fileinfo = await utils.file.save(file)
+    try:
+        fileinfo = await utils.file.save(file)
+    except utils.file.UploadTooLargeError:
+        raise HTTPException(status_code=413, detail=f"File larger than {settings.UPLOAD_MAX_BYTES} bytes")
     return fileinfo
 
 
 @router.get("/{id}")
-def read_upload(*, id: str):
+def read_upload(
+    *,
+    id: str,
+    range: Optional[str] = Header(None),
+    if_range: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+):
     """
-    Get an uploaded file by ID.
+    Get an uploaded file by ID. Supports a single byte range and conditional requests with ETag.
     """
     try:
         fileinfo = utils.file.retrieve_by_id(id)
     except FileNotFoundError:
-        return HTTPException(status_code=404)
-    with fileinfo.filepath.open('rb') as f:
-        data = f.read()
-    return Response(content=data, media_type=utils.file.get_mime_type(fileinfo.filepath))
+        raise HTTPException(status_code=404)
+    etag = f'"{utils.file.get_digest(fileinfo)}"'
+    size = fileinfo.filepath.stat().st_size
+    headers = {"ETag": etag, "Accept-Ranges": "bytes"}
+    if deps.etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    media_type = utils.file.get_mime_type(fileinfo.filepath)
+
+    byte_range = None
+    if range is not None and (if_range is None or if_range.strip() == etag):
+        try:
+            byte_range = utils.file.parse_range(range, size)
+        except ValueError:
+            raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    if byte_range is None:
+        first, last = 0, size - 1
+        status_code = 200
+    else:
+        first, last = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {first}-{last}/{size}"
+    headers["Content-Length"] = str(last - first + 1)
+    return StreamingResponse(
+        utils.file.iter_file(fileinfo.filepath, first, last),
+        status_code=status_code,
+        headers=headers,
+        media_type=media_type,
+    )
@@ -0,0 +1,26 @@
+from typing import Any, List
+
+from fastapi import APIRouter, Response
+
+from app import schemas, utils
+
+router = APIRouter()
+
+
+@router.get("/ready", response_model=schemas.Readiness)
+def read_readiness(response: Response) -> Any:
+    """
+    Whether models are loaded, with their load and dry-run times. Responds 503 until ready.
+    """
+    readiness = utils.model.readiness
+    if not readiness.ready:
+        response.status_code = 503
+    return readiness
+
+
+@router.get("/cache", response_model=List[schemas.CacheStats])
+def read_cache_stats() -> Any:
+    """
+    Hit and miss counters of the feature and prediction caches.
+    """
+    return [utils.model.feature_cache.stats(), utils.model.prediction_cache.stats()]
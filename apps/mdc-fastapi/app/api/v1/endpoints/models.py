@@ -1,15 +1,24 @@
-from typing import Any, List
+from typing import Any, List, Optional
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Header, Response
 
 from app import schemas, utils
+from app.api import deps
 
 router = APIRouter()
 
 
 @router.get("/", response_model=List[schemas.ModelInfo])
-def read_models() -> Any:
+def read_models(
+    *,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+) -> Any:
     """
-    Retrieve models information.
+    Retrieve models information. Supports conditional requests with ETag.
     """
+    etag = f'"{utils.model.get_registry().etag}"'
+    if deps.etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
     return utils.model.info()
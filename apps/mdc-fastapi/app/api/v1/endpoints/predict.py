@@ -1,13 +1,31 @@
-from typing import Any
+from typing import Any, List
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 
 from app import schemas, utils
 from app.api import deps
+from app.core.config import settings
 
 router = APIRouter()
 
 
+def _get_input(model: str, id: str) -> schemas.FileInfo:
+    """The uploaded file `id`, if `model` can predict it."""
+    if not utils.model.exists(model):
+        raise HTTPException(status_code=404, detail="Model not found")
+    try:
+        fileinfo = utils.file.retrieve_by_id(id)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File not found")
+    feature_set = utils.model.get_file_feature_set(fileinfo)
+    if feature_set is None:
+        raise HTTPException(status_code=400, detail=f"Unsupported file type: {fileinfo.filepath.suffix}")
+    if feature_set != utils.model.get_feature_set(model):
+        suffixes = ", ".join(utils.model.FEATURE_SET_SUFFIXES[utils.model.get_feature_set(model)])
+        raise HTTPException(status_code=400, detail=f"Model {model} takes {suffixes} files")
+    return fileinfo
+
+
 @router.get("/", response_model=schemas.Prediction)
 async def read_prediction(
     *,
@@ -17,14 +35,117 @@ async def read_prediction(
     """
     Retrieve prediction of an uploaded file.
     """
-    try:
-        fileinfo = utils.file.retrieve_by_id(id)
-    except FileNotFoundError:
-        raise HTTPException(status_code=404, detail="File not found")
-    if fileinfo.filepath.suffix != ".mxl":
-        raise HTTPException(status_code=400, detail=f"Unsupported file type: {fileinfo.filepath.suffix}")
+    fileinfo = _get_input(model, id)
     try:
         prediction = await utils.model.predict(model, fileinfo)
-    except utils.model.BadModelError:
-        raise HTTPException(status_code=503, headers={"Retry-After": "2"})
+    except utils.model.FeatureExtractionError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except (utils.model.BadModelError, utils.pool.PoolBusyError):
+        raise HTTPException(status_code=503, headers={"Retry-After": str(settings.WORKER_RETRY_AFTER)})
+    except utils.pool.PoolTimeoutError:
+        raise HTTPException(status_code=504, detail="Prediction timed out")
     return prediction
+
+
+@router.get("/ensemble", response_model=schemas.EnsemblePrediction)
+async def read_ensemble_prediction(
+    *,
+    id: str,
+    models: List[str] = Query(["all"]),
+) -> Any:
+    """
+    Predict an uploaded file with many models, `all` for every model taking its file type.
+    Features are extracted once. Returns every model's prediction and their mean or weighted vote.
+    """
+    if models == ["all"]:
+        try:
+            fileinfo = utils.file.retrieve_by_id(id)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="File not found")
+        feature_set = utils.model.get_file_feature_set(fileinfo)
+        models = [m.id for m in utils.model.info() if m.feature_set == feature_set]
+        if not models:
+            raise HTTPException(status_code=400, detail=f"No model takes {fileinfo.filepath.suffix} files")
+    models = list(dict.fromkeys(models))
+    for model in models:
+        fileinfo = _get_input(model, id)
+    try:
+        predictions, errors = await utils.model.predict_ensemble(models, fileinfo)
+    except utils.model.FeatureExtractionError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except (utils.model.BadModelError, utils.pool.PoolBusyError):
+        raise HTTPException(status_code=503, headers={"Retry-After": str(settings.WORKER_RETRY_AFTER)})
+    except utils.pool.PoolTimeoutError:
+        raise HTTPException(status_code=504, detail="Feature extraction timed out")
+    return schemas.EnsemblePrediction(
+        id=fileinfo.id,
+        input=fileinfo.filename,
+        predictions=predictions,
+        aggregates=utils.model.aggregate(predictions),
+        errors=errors,
+    )
+
+
+@router.post("/batch", response_model=schemas.BatchPrediction)
+async def create_batch_prediction(
+    *,
+    batch: schemas.BatchPredictionRequest,
+) -> Any:
+    """
+    Predict many uploaded files with one or more models.
+    """
+    for model in batch.models:
+        if not utils.model.exists(model):
+            raise HTTPException(status_code=404, detail=f"Model not found: {model}")
+    fileinfos = []
+    errors = {}
+    for id in dict.fromkeys(batch.ids):
+        try:
+            fileinfo = utils.file.retrieve_by_id(id)
+        except FileNotFoundError:
+            errors[id] = "File not found"
+            continue
+        if utils.model.get_file_feature_set(fileinfo) is None:
+            errors[id] = f"Unsupported file type: {fileinfo.filepath.suffix}"
+            continue
+        fileinfos.append(fileinfo)
+    try:
+        predictions, failed = await utils.model.predict_batch(list(dict.fromkeys(batch.models)), fileinfos)
+    except utils.pool.PoolBusyError:
+        raise HTTPException(status_code=503, headers={"Retry-After": str(settings.WORKER_RETRY_AFTER)})
+    errors.update(failed)
+    return schemas.BatchPrediction(predictions=predictions, errors=errors)
+
+
+@router.post("/jobs", response_model=schemas.Job, status_code=202)
+async def create_prediction_job(
+    *,
+    job: schemas.JobRequest,
+) -> Any:
+    """
+    Queue prediction of an uploaded file. Poll the returned job for the result.
+    """
+    _get_input(job.model, job.id)
+    return utils.jobs.get_queue().submit(job.model, job.id, job.priority)
+
+
+@router.get("/jobs/stats", response_model=schemas.JobStats)
+async def read_prediction_job_stats() -> Any:
+    """
+    Queue depth, and wait and run time percentiles of recent jobs.
+    """
+    return utils.jobs.get_queue().stats()
+
+
+@router.get("/jobs/{job_id}", response_model=schemas.Job)
+async def read_prediction_job(
+    *,
+    job_id: str,
+) -> Any:
+    """
+    Retrieve status and result of a prediction job.
+    """
+    job = utils.jobs.get_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
@@ -1,11 +1,13 @@
 import os
 import pathlib
 from pathlib import Path
-from typing import List, Union
+from typing import List, Optional, Union
 
 from pydantic import AnyHttpUrl, BaseSettings, validator
 
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
+# the repository's packages/, for `musescore`
+PACKAGES_DIR = BASE_DIR.parent.parent / "packages"
 
 
 class Settings(BaseSettings):
@@ -27,6 +29,33 @@ class Settings(BaseSettings):
     PROJECT_NAME: str
     DATA_PATH: str = "data"
     UPLOAD_PATH: str = "userupload"
+    UPLOAD_MAX_BYTES: int = 50 * 2 ** 20
+    UPLOAD_CHUNK_SIZE: int = 2 ** 16  # bytes read or written at once for uploads and downloads
+    PREDICT_BATCH_MAX_FILES: int = 1000
+
+    # process pool for feature extraction and inference
+    WORKER_PROCESSES: Optional[int] = None  # defaults to the number of CPUs
+    WORKER_QUEUE_SIZE: int = 16  # jobs waiting for a free process, more are rejected with 503
+    WORKER_TIMEOUT: float = 120  # seconds
+    WORKER_RETRY_AFTER: int = 2  # seconds, sent with 503
+
+    MODEL_PRELOAD: bool = True  # load and dry-run every model when a worker process starts
+    MODEL_PRELOAD_TIMEOUT: float = 600  # seconds
+    MODEL_MEMORY_BUDGET_MB: Optional[int] = None  # per worker process, least recently used models are dropped
+    MODEL_COMPILE: bool = True  # predict with the fitted estimator directly when it matches predict_model
+    MODEL_PARITY_SAMPLE_SIZE: int = 32  # rows compared with predict_model, without a <model>.sample.csv
+
+    FEATURE_VECTORIZED: bool = True  # music21 features from intermediates shared by all extractors, see jsymbolic
+    FEATURE_CACHE_SIZE: int = 1024  # extracted feature rows kept in memory
+    PREDICTION_CACHE_SIZE: int = 4096  # predictions kept in memory
+    CACHE_PATH: Optional[str] = None  # e.g. "cache", directory under DATA_DIR to also keep them on disk
+    FEATURE_CACHE_DISK_SIZE: int = 65536  # extracted feature rows kept on disk, with CACHE_PATH
+    PREDICTION_CACHE_DISK_SIZE: int = 262144  # predictions kept on disk, with CACHE_PATH
+
+    JOB_CONCURRENCY: Optional[int] = None  # jobs run at once, defaults to WORKER_PROCESSES
+    JOB_RETENTION_SECONDS: float = 24 * 60 * 60  # finished jobs are deleted after this
+    JOB_MAX_ATTEMPTS: int = 3  # runs of a job whose model does not load, before it fails
+    JOB_STALE_SECONDS: float = 10 * 60  # a job running longer was left by a stopped server, it is queued again
 
     @property
     def DATA_DIR(self) -> pathlib.Path:
@@ -46,6 +75,10 @@ class Settings(BaseSettings):
             os.mkdir(path)
         return path
 
+    @property
+    def CACHE_DIR(self) -> Optional[pathlib.Path]:
+        return None if self.CACHE_PATH is None else self.DATA_DIR / self.CACHE_PATH
+
     class Config:
         case_sensitive = True
 
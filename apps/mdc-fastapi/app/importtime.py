@@ -0,0 +1,74 @@
+"""
+Cold-start report: how long importing the app takes, broken down by package.
+
+    python -m app.importtime [--module app.main] [--top 20] [--budget 2.0]
+
+Runs ``python -X importtime -c "import <module>"`` in a fresh interpreter and sums the time spent
+importing each module (without its own imports) by top-level package.
+Exits with 1 when the total is over ``--budget`` seconds.
+"""
+import argparse
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, NamedTuple
+
+_line = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+class Import(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def measure(module: str) -> List[Import]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    imports = []
+    for line in result.stderr.splitlines():
+        match = _line.match(line)
+        if match is not None:
+            self_us, cumulative_us, indent, name = match.groups()
+            imports.append(Import(name, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    if result.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{result.stderr[-2000:]}")
+    return imports
+
+
+def by_package(imports: List[Import]) -> Dict[str, int]:
+    """Microseconds spent importing the modules of each top-level package, slowest first."""
+    packages = defaultdict(int)
+    for i in imports:
+        packages[i.module.split(".")[0]] += i.self_us
+    return dict(sorted(packages.items(), key=lambda item: item[1], reverse=True))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Import time of the app, by package.")
+    parser.add_argument("--module", default="app.main", help="module to import (default: app.main)")
+    parser.add_argument("--top", type=int, default=20, help="number of packages to list")
+    parser.add_argument("--budget", type=float, default=None, help="fail when the total is over this many seconds")
+    args = parser.parse_args()
+
+    imports = measure(args.module)
+    packages = by_package(imports)
+    total = sum(packages.values()) / 1e6
+    print(f"{'package':<32} {'seconds':>8}")
+    for package, us in list(packages.items())[: args.top]:
+        print(f"{package:<32} {us / 1e6:>8.3f}")
+    print(f"{'total':<32} {total:>8.3f}")
+    if args.budget is not None and total > args.budget:
+        print(f"over budget of {args.budget} s", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,14 @@
-from fastapi import FastAPI
+import asyncio
+import time
+
+from fastapi import FastAPI, Request, Response
 from starlette.middleware.cors import CORSMiddleware
 
+from app import utils
 from app.api.v1.api import api_router
 from app.core.config import settings
+from app.utils import metrics
+from app.utils.pool import pool
 
 app = FastAPI(title=settings.PROJECT_NAME, openapi_url=f"{settings.API_V1_STR}/openapi.json")
 
@@ -17,3 +23,43 @@ if settings.BACKEND_CORS_ORIGINS:
     )
 
 app.include_router(api_router, prefix=settings.API_V1_STR)
+
+requests_in_flight = metrics.Gauge("mdc_requests_in_flight", "Requests being handled.")
+request_seconds = metrics.Histogram("mdc_request_seconds", "Seconds taken to handle requests, by route.", ["route"])
+metrics.Gauge("mdc_pool_pending", "Jobs running or waiting in the worker pool.", function=lambda: pool.pending)
+
+
+@app.middleware("http")
+async def measure_requests(request: Request, call_next):
+    with requests_in_flight.track_inprogress():
+        start = time.perf_counter()
+        try:
+            return await call_next(request)
+        finally:
+            # the route's path template (e.g. /api/v1/files/{id}), not the path, to keep the number of labels bounded
+            route = request.scope.get("route")
+            request_seconds.observe(time.perf_counter() - start, route=getattr(route, "path", "other"))
+
+
+@app.get("/metrics", include_in_schema=False)
+def read_metrics() -> Response:
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.on_event("startup")
+async def preload_models() -> None:
+    # in the background, so the server starts answering (GET /health/ready says when it is ready)
+    app.state.preload = asyncio.create_task(utils.model.preload())
+
+
+@app.on_event("startup")
+async def start_jobs() -> None:
+    # queued jobs, including those left from before a restart
+    app.state.jobs = asyncio.create_task(utils.jobs.run_consumers())
+
+
+@app.on_event("shutdown")
+async def shutdown_pool() -> None:
+    # running jobs are marked queued again at the next start
+    app.state.jobs.cancel()
+    pool.shutdown()
@@ -1,3 +1,5 @@
+from .cache import CacheStats
 from .file import FileInfo
-from .model import ModelInfo
-from .prediction import Prediction
+from .job import Job, JobRequest, JobStats
+from .model import FeatureSet, ModelEntry, ModelInfo, ModelStatus, ModelTask, Readiness
+from .prediction import BatchPrediction, BatchPredictionRequest, EnsembleAggregate, EnsemblePrediction, Prediction
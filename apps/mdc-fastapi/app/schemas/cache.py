@@ -0,0 +1,10 @@
+from pydantic import BaseModel
+
+
+class CacheStats(BaseModel):
+    name: str
+    size: int  # entries in memory
+    maxsize: int
+    hits: int  # found in memory
+    disk_hits: int  # found on disk
+    misses: int
@@ -1,4 +1,6 @@
 import pathlib
+from datetime import datetime
+from typing import Optional
 
 from pydantic import BaseModel
 
@@ -8,6 +10,9 @@ from app.core.config import settings
 class FileInfo(BaseModel):
     id: str
     filename: str
+    size: Optional[int] = None  # bytes
+    sha256: Optional[str] = None
+    created: Optional[datetime] = None
 
     @property
     def filepath(self) -> pathlib.Path:
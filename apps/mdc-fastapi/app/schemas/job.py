@@ -0,0 +1,37 @@
+from datetime import datetime
+from typing import Dict, Literal, Optional
+
+from pydantic import BaseModel
+
+from app.schemas.prediction import Prediction
+
+JobStatus = Literal["queued", "running", "done", "failed"]
+
+
+class JobRequest(BaseModel):
+    model: str
+    id: str  # file id
+    priority: int = 0  # higher runs first
+
+
+class Job(BaseModel):
+    id: str
+    model: str
+    file_id: str
+    priority: int
+    status: JobStatus
+    result: Optional[Prediction] = None
+    error: Optional[str] = None
+    created: datetime
+    started: Optional[datetime] = None
+    finished: Optional[datetime] = None
+
+
+class JobStats(BaseModel):
+    queued: int
+    running: int
+    done: int
+    failed: int
+    # over the last finished jobs, e.g. {"p50": 0.1, "p90": 0.5, "p99": 2.0}
+    wait_seconds: Dict[str, float]  # submitted -> started
+    run_seconds: Dict[str, float]  # started -> finished
@@ -1,6 +1,38 @@
+from typing import List, Literal, Optional
+
 from pydantic import BaseModel
 
+ModelTask = Literal["regression", "classification"]  # pycaret module the model is loaded and run with
+FeatureSet = Literal["music21", "musescore"]  # music21 features of .mxl, musescore features of .mscz/.mscx
+
 
 class ModelInfo(BaseModel):
     id: str
     description: str
+    task: ModelTask
+    feature_set: FeatureSet
+    sha256: str
+    load_seconds: Optional[float] = None  # measured when preloading
+
+
+class ModelEntry(ModelInfo):
+    """A model in the registry manifest."""
+
+    size: int  # bytes
+    target: Optional[str] = None
+    columns: Optional[List[str]] = None  # feature columns in the order the model was trained with
+
+
+class ModelStatus(BaseModel):
+    id: str
+    loaded: bool  # loaded and predicted the dry-run input
+    resident: bool  # still in memory, see MODEL_MEMORY_BUDGET_MB
+    compiled: Optional[str] = None  # "select" or "pipeline" when predicting without predict_model, see MODEL_COMPILE
+    load_seconds: Optional[float] = None
+    dry_run_seconds: Optional[float] = None
+    error: Optional[str] = None
+
+
+class Readiness(BaseModel):
+    ready: bool
+    models: List[ModelStatus]
@@ -1,10 +1,40 @@
-from typing import Optional, Union
+from typing import Dict, List, Literal, Optional, Union
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, StrictInt
+
+from app.core.config import settings
+from app.schemas.model import ModelTask
 
 
 class Prediction(BaseModel):
     model: str
     input: str
-    label: Union[int, float]
+    label: Union[StrictInt, float]  # not int first, which would truncate regression labels
     score: Optional[float] = None
+    id: Optional[str] = None
+
+
+class BatchPredictionRequest(BaseModel):
+    ids: List[str] = Field(..., min_items=1, max_items=settings.PREDICT_BATCH_MAX_FILES)
+    models: List[str] = Field(..., min_items=1)
+
+
+class BatchPrediction(BaseModel):
+    predictions: List[Prediction]
+    errors: Dict[str, str] = {}  # file id -> reason it was not predicted, model -> reason it did not predict
+
+
+class EnsembleAggregate(BaseModel):
+    task: ModelTask
+    method: Literal["mean", "weighted_vote"]  # regression labels are averaged, classes voted for weighted by score
+    label: Union[StrictInt, float]
+    score: Optional[float] = None  # share of the votes for the label
+    models: List[str]
+
+
+class EnsemblePrediction(BaseModel):
+    id: str
+    input: str
+    predictions: List[Prediction]
+    aggregates: List[EnsembleAggregate]  # one per task
+    errors: Dict[str, str] = {}  # model -> reason it did not predict
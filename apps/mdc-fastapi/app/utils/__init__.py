@@ -1,2 +1,8 @@
+from . import cache
+from . import compiled
 from . import file
+from . import jobs
+from . import metrics
 from . import model
+from . import pool
+from . import registry
@@ -0,0 +1,116 @@
+import hashlib
+import os
+import pickle
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional
+
+from app import schemas
+from app.utils import metrics
+
+lookups = metrics.Counter("mdc_cache_lookups_total", "Cache lookups, by cache and result.", ["cache", "result"])
+
+
+class LRUCache:
+    """
+    In-process LRU cache with an optional on-disk tier.
+
+    With `disk_dir`, every value is also pickled to a file there, so it survives restarts
+    and entries evicted from memory are read back from disk. Past `disk_maxsize` files, the least recently
+    used ones (by modification time, which reads update) are deleted down to 90% of it.
+    """
+
+    def __init__(self, name: str, maxsize: int, disk_dir: Optional[Path] = None, disk_maxsize: int = 65536):
+        self.name = name
+        self.maxsize = maxsize
+        self.disk_dir = disk_dir
+        self.disk_maxsize = disk_maxsize
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[str, Any]" = OrderedDict()
+        self._disk_size = 0
+        if disk_dir is not None:
+            disk_dir.mkdir(parents=True, exist_ok=True)
+            self._evict_disk()
+
+    def _path(self, key: str) -> Path:
+        return self.disk_dir / f"{hashlib.sha256(key.encode()).hexdigest()}.pkl"
+
+    def _remember(self, key: str, value: Any) -> None:
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Any]:
+        if key in self._data:
+            self._data.move_to_end(key)
+            self.hits += 1
+            lookups.inc(cache=self.name, result="hit")
+            return self._data[key]
+        if self.disk_dir is not None:
+            try:
+                value = pickle.loads(self._path(key).read_bytes())
+            except (OSError, pickle.UnpicklingError, EOFError):
+                pass
+            else:
+                self._touch(self._path(key))
+                self.disk_hits += 1
+                lookups.inc(cache=self.name, result="disk_hit")
+                self._remember(key, value)
+                return value
+        self.misses += 1
+        lookups.inc(cache=self.name, result="miss")
+        return None
+
+    def put(self, key: str, value: Any) -> None:
+        self._remember(key, value)
+        if self.disk_dir is not None:
+            path = self._path(key)
+            if not path.exists():
+                self._disk_size += 1
+            tmp = path.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_bytes(pickle.dumps(value))
+            tmp.replace(path)
+            # counted by this process only, other processes sharing the directory are found by `_evict_disk`
+            if self._disk_size > self.disk_maxsize:
+                self._evict_disk()
+
+    @staticmethod
+    def _touch(path: Path) -> None:
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _evict_disk(self) -> None:
+        entries = []
+        with os.scandir(self.disk_dir) as it:
+            for entry in it:
+                if entry.name.endswith(".pkl"):
+                    try:
+                        entries.append((entry.stat().st_mtime, entry.path))
+                    except OSError:
+                        pass
+        self._disk_size = len(entries)
+        if len(entries) <= self.disk_maxsize:
+            return
+        entries.sort()
+        # to below the limit, so not every put scans the directory
+        for _, path in entries[: len(entries) - int(self.disk_maxsize * 0.9)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self._disk_size -= 1
+
+    def stats(self) -> schemas.CacheStats:
+        return schemas.CacheStats(
+            name=self.name,
+            size=len(self._data),
+            maxsize=self.maxsize,
+            hits=self.hits,
+            disk_hits=self.disk_hits,
+            misses=self.misses,
+        )
@@ -0,0 +1,149 @@
+"""
+Predicting with a pycaret pipeline's fitted estimator directly, skipping `predict_model`.
+
+`predict_model` checks its input, copies it, runs every preprocessing step and builds a result DataFrame
+for each call. `compile_model` looks at the steps once: when they only select and order columns of numeric
+input (checked on a sample), the estimator is called on a NumPy array of those columns. Otherwise the steps'
+`transform` is called before the estimator. Either way the result must equal `predict_model`'s on the sample,
+or the model is not compiled.
+"""
+from __future__ import annotations
+
+import warnings
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Literal, Optional
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+CompiledKind = Literal["select", "pipeline"]
+
+# pycaret rounds Label (regression) and Score to this many decimals
+ROUND = 4
+
+
+class CompiledModel:
+    def __init__(
+        self,
+        kind: CompiledKind,
+        task: str,
+        estimator: Any,
+        steps: List[Any],
+        columns: Optional[List[str]],
+        labels: Optional[Dict[Any, Any]],
+    ):
+        self.kind = kind
+        self.task = task
+        self.estimator = estimator
+        self.steps = steps  # preprocessing, used by "pipeline"
+        self.columns = columns  # estimator input columns, used by "select"
+        self.labels = labels  # encoded class -> original label
+
+    def _features(self, data: pd.DataFrame):
+        if self.kind == "select":
+            return data[self.columns].to_numpy(dtype=float)
+        for step in self.steps:
+            data = step.transform(data)
+        return data
+
+    def _call(self, method: str, X):
+        with warnings.catch_warnings():
+            # estimators fitted on a DataFrame warn about arrays, the columns are in the fitted order
+            warnings.filterwarnings("ignore", message="X does not have valid feature names")
+            return getattr(self.estimator, method)(X)
+
+    def predict(self, data: pd.DataFrame) -> pd.DataFrame:
+        """`predict_model`'s Label and Score columns."""
+        import numpy as np
+        import pandas as pd
+
+        X = self._features(data)
+        if self.task == "regression":
+            return pd.DataFrame({"Label": np.round(self._call("predict", X), ROUND)})
+        proba = self._call("predict_proba", X)
+        classes = self.estimator.classes_[proba.argmax(axis=1)]
+        if self.labels is not None:
+            classes = [self.labels.get(c, c) for c in classes]
+        return pd.DataFrame({"Label": classes, "Score": np.round(proba.max(axis=1), ROUND)})
+
+
+def _selected_columns(steps: List[Any], sample: pd.DataFrame) -> Optional[List[str]]:
+    """Input columns the steps give the estimator, if they only select and order numeric input columns."""
+    import numpy as np
+
+    transformed = sample
+    for step in steps:
+        transformed = step.transform(transformed)
+    if not hasattr(transformed, "columns") or len(transformed) != len(sample):
+        return None
+    columns = [str(c) for c in transformed.columns]
+    for column in columns:
+        if column not in sample.columns:
+            return None
+        try:
+            same = np.array_equal(
+                transformed[column].to_numpy(dtype=float), sample[column].to_numpy(dtype=float), equal_nan=True
+            )
+        except (TypeError, ValueError):
+            return None
+        if not same:
+            return None
+    return columns
+
+
+def _target_labels(steps: List[Any]) -> Optional[Dict[Any, Any]]:
+    # pycaret's DataTypes_Auto_infer keeps the target's {label: encoded} when it encoded it
+    for step in steps:
+        replacement = getattr(step, "replacement", None)
+        if isinstance(replacement, dict) and replacement:
+            return {encoded: label for label, encoded in replacement.items()}
+    return None
+
+
+def _same(expected: pd.DataFrame, actual: pd.DataFrame) -> bool:
+    import numpy as np
+
+    for column in actual.columns:
+        if column not in expected.columns:
+            return False
+        e, a = expected[column].reset_index(drop=True), actual[column].reset_index(drop=True)
+        if e.dtype.kind in "fiu" and a.dtype.kind in "fiu":
+            if not np.allclose(e.to_numpy(dtype=float), a.to_numpy(dtype=float), rtol=0, atol=1e-9):
+                return False
+        elif list(e.astype(str)) != list(a.astype(str)):
+            return False
+    return True
+
+
+def compile_model(
+    pipeline: Any, task: str, reference: Callable[[pd.DataFrame], pd.DataFrame], sample: pd.DataFrame
+) -> Optional[CompiledModel]:
+    """
+    Compiles a fitted pycaret pipeline (an sklearn Pipeline ending with the estimator).
+
+    `reference` is `predict_model` for the pipeline, the compiled model must give its Label and Score on `sample`.
+    Returns None when the pipeline cannot be compiled or gives other results.
+    """
+    steps = [step for _, step in getattr(pipeline, "steps", [])]
+    if not steps:
+        return None
+    estimator, preprocessing = steps[-1], steps[:-1]
+    if not hasattr(estimator, "predict_proba" if task == "classification" else "predict"):
+        return None
+    expected = reference(sample)
+    labels = _target_labels(preprocessing) if task == "classification" else None
+    candidates = []
+    try:
+        columns = _selected_columns(preprocessing, sample)
+    except Exception:
+        columns = None
+    if columns is not None:
+        candidates.append(CompiledModel("select", task, estimator, [], columns, labels))
+    candidates.append(CompiledModel("pipeline", task, estimator, preprocessing, None, labels))
+    for compiled in candidates:
+        try:
+            actual = compiled.predict(sample)
+        except Exception:
+            continue
+        if _same(expected, actual):
+            return compiled
+    return None
@@ -1,55 +1,184 @@
+import csv
+import hashlib
+import mimetypes
 import os
 import pathlib
 import secrets
 import typing
-from typing import Generator
+from functools import lru_cache
+from types import MappingProxyType
+from typing import AsyncIterator, Generator, List, Mapping, Optional, Tuple
 
-import pandas as pd
 from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
 
 from app import schemas
 from app.core.config import settings
+from app.utils import metrics
+from app.utils.index import UploadIndex
+
+
+_index: Optional[UploadIndex] = None
+
+
+def get_index() -> UploadIndex:
+    global _index
+    if _index is None:
+        _index = UploadIndex(settings.DATA_DIR / "uploads.sqlite3", settings.UPLOAD_DIR)
+    return _index
+
+
+class UploadTooLargeError(Exception):
+    pass
+
+
+upload_bytes = metrics.Counter("mdc_upload_bytes_total", "Bytes of files uploaded.")
 
 
 async def save(file: UploadFile) -> schemas.FileInfo:
+    """Streams the upload to disk in chunks. Raises `UploadTooLargeError` over `UPLOAD_MAX_BYTES`."""
+    index = get_index()
     while True:
         id_ = secrets.token_hex(8)
-        fileinfo = schemas.FileInfo(id=id_, filename=file.filename)
+        if index.reserve(id_, file.filename):
+            break
+    fileinfo = schemas.FileInfo(id=id_, filename=file.filename)
+    size = 0
+    h = hashlib.sha256()
+    try:
+        f = await run_in_threadpool(fileinfo.filepath.open, "wb")
         try:
-            retrieve_by_id(id_)
-            continue
-        except FileNotFoundError:
-            with fileinfo.filepath.open("wb") as f:
-                contents = await file.read()
-                f.write(contents)
-            return fileinfo
+            while chunk := await file.read(settings.UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > settings.UPLOAD_MAX_BYTES:
+                    raise UploadTooLargeError
+                h.update(chunk)
+                await run_in_threadpool(f.write, chunk)
+        finally:
+            await run_in_threadpool(f.close)
+    except BaseException:
+        index.remove(id_)
+        fileinfo.filepath.unlink(missing_ok=True)
+        raise
+    index.complete(id_, size, h.hexdigest())
+    upload_bytes.inc(size)
+    return index.get(id_)
 
 
 def retrieve_by_id(id: str) -> schemas.FileInfo:
-    search_path = settings.DATA_DIR / "userupload"
-    for path in search_path.glob(f"{id}_*"):
-        _, filename = path.name.split("_", 1)
-        return schemas.FileInfo(id=id, filename=filename)
-    raise FileNotFoundError
+    with metrics.timed("retrieve"):
+        fileinfo = get_index().get(id)
+    if fileinfo is None:
+        raise FileNotFoundError
+    return fileinfo
 
 
 def retrieve_by_name(filename: str) -> Generator[schemas.FileInfo, typing.Any, None]:
-    search_path = settings.DATA_DIR / "userupload"
-    for path in search_path.glob(f"*_{filename}"):
-        _, filename = path.name.split("_", 1)
-        yield schemas.FileInfo(id=id, filename=filename)
-    return
+    yield from get_index().find_by_name(filename)
+
+
+def retrieve_all(skip: int = 0, limit: int = 100) -> List[schemas.FileInfo]:
+    return get_index().list(skip=skip, limit=limit)
+
+
+def get_digest(fileinfo: schemas.FileInfo) -> str:
+    """SHA-256 of the uploaded file."""
+    if fileinfo.sha256 is not None:
+        return fileinfo.sha256
+    stat = fileinfo.filepath.stat()
+    return _get_digest(fileinfo.filepath, stat.st_size, stat.st_mtime_ns)
+
+
+async def with_digest(fileinfo: schemas.FileInfo) -> schemas.FileInfo:
+    """
+    `fileinfo` with its SHA-256 set, for async callers of `get_digest`.
+
+    Files uploaded before the index existed have none: they are hashed in the thread pool, not on the event loop,
+    and the digest is stored in the index so they are hashed once.
+    """
+    if fileinfo.sha256 is not None:
+        return fileinfo
+    digest = await run_in_threadpool(get_digest, fileinfo)
+    size = fileinfo.size if fileinfo.size is not None else fileinfo.filepath.stat().st_size
+    await run_in_threadpool(get_index().complete, fileinfo.id, size, digest)
+    return fileinfo.copy(update=dict(sha256=digest))
+
+
+@lru_cache(maxsize=4096)
+def _get_digest(filepath: pathlib.Path, size: int, mtime_ns: int) -> str:
+    # size and mtime are part of the key, so a changed file is hashed again
+    h = hashlib.sha256()
+    with filepath.open("rb") as f:
+        while chunk := f.read(1 << 16):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Returns the (first, last) byte of a single `Range: bytes=...` header, or None to send the whole file.
+
+    Raises ValueError if the range cannot be satisfied.
+    """
+    unit, _, ranges = header.partition("=")
+    if unit.strip() != "bytes" or "," in ranges:
+        # multiple ranges are not supported, which allows sending everything
+        return None
+    first, _, last = ranges.strip().partition("-")
+    try:
+        if not first:
+            # suffix: the last N bytes
+            n = int(last)
+            if n <= 0 or size == 0:
+                raise ValueError(header)
+            return max(size - n, 0), size - 1
+        first = int(first)
+        last = size - 1 if not last else min(int(last), size - 1)
+    except ValueError:
+        raise ValueError(header) from None
+    if first > last or first >= size:
+        raise ValueError(header)
+    return first, last
+
+
+async def iter_file(filepath: pathlib.Path, first: int, last: int) -> AsyncIterator[bytes]:
+    """Yields bytes `first` to `last` (inclusive) of the file in chunks."""
+    f = await run_in_threadpool(filepath.open, "rb")
+    try:
+        await run_in_threadpool(f.seek, first)
+        remaining = last - first + 1
+        while remaining > 0:
+            chunk = await run_in_threadpool(f.read, min(settings.UPLOAD_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        await run_in_threadpool(f.close)
 
 
 def clean():
+    get_index().clear()
     search_path = settings.DATA_DIR / "userupload"
     for path in search_path.glob("*"):
         yield os.remove(path)
 
 
-common_mime = pd.read_csv(pathlib.Path(__file__).resolve().parent / "common-mime-types.csv")
+def _load_common_mime_types() -> Mapping[str, str]:
+    types = {}
+    with (pathlib.Path(__file__).resolve().parent / "common-mime-types.csv").open(newline="") as f:
+        for row in csv.DictReader(f):
+            # e.g. ".jpeg .jpg"
+            for ext in row["Extension"].split():
+                types[ext.lower()] = row["MIME Type"]
+    return MappingProxyType(types)
+
+
+common_mime = _load_common_mime_types()  # {lowercase extension: MIME type}
 
 
 def get_mime_type(filepath: pathlib.Path) -> str:
     ext = filepath.suffix.lower()
-    return next(common_mime[common_mime['Extension'] == ext].iterrows())[1]['MIME Type']
+    if ext in common_mime:
+        return common_mime[ext]
+    return mimetypes.guess_type(filepath.name)[0] or "application/octet-stream"
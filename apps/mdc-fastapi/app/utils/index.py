@@ -0,0 +1,115 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from app import schemas
+
+_columns = "id, filename, size, sha256, created"
+
+
+def _to_fileinfo(row: tuple) -> schemas.FileInfo:
+    return schemas.FileInfo(**dict(zip(("id", "filename", "size", "sha256", "created"), row)))
+
+
+class UploadIndex:
+    """
+    SQLite index of the upload directory: id -> filename, size, content hash and upload time.
+
+    Replaces globbing the directory, which takes time proportional to the number of uploads, for every lookup.
+    Uploads made before the index existed are added once, when it is first opened.
+    An entry is reserved before its upload is written and has no size until it is complete; lookups skip it, and
+    those left by uploads interrupted by a restart are removed on opening.
+    """
+
+    def __init__(self, path: Path, upload_dir: Path):
+        self.path = path
+        self.upload_dir = upload_dir
+        self._lock = threading.Lock()  # sync endpoints run in a thread pool
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS uploads ("
+            " id TEXT PRIMARY KEY,"
+            " filename TEXT NOT NULL,"
+            " size INTEGER,"
+            " sha256 TEXT,"
+            " created REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS uploads_filename ON uploads (filename)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS uploads_created ON uploads (created)")
+        self._conn.commit()
+        self._remove_incomplete()
+        if self.count() == 0:
+            self._add_existing()
+
+    def _remove_incomplete(self) -> None:
+        with self._lock:
+            rows = self._conn.execute("SELECT id, filename FROM uploads WHERE size IS NULL").fetchall()
+            self._conn.execute("DELETE FROM uploads WHERE size IS NULL")
+            self._conn.commit()
+        for id_, filename in rows:
+            (self.upload_dir / f"{id_}_{filename}").unlink(missing_ok=True)
+
+    def _add_existing(self) -> None:
+        rows = []
+        for path in self.upload_dir.glob("*_*"):
+            id_, filename = path.name.split("_", 1)
+            stat = path.stat()
+            rows.append((id_, filename, stat.st_size, None, stat.st_mtime))
+        with self._lock:
+            self._conn.executemany(f"INSERT OR IGNORE INTO uploads ({_columns}) VALUES (?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+
+    def reserve(self, id: str, filename: str) -> bool:
+        """Adds an entry for an upload about to be written. Returns False if the id is taken."""
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT INTO uploads (id, filename, created) VALUES (?, ?, ?)", (id, filename, time.time())
+                )
+            except sqlite3.IntegrityError:
+                return False
+            self._conn.commit()
+            return True
+
+    def complete(self, id: str, size: int, sha256: str) -> None:
+        with self._lock:
+            self._conn.execute("UPDATE uploads SET size = ?, sha256 = ? WHERE id = ?", (size, sha256, id))
+            self._conn.commit()
+
+    def get(self, id: str) -> Optional[schemas.FileInfo]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT {_columns} FROM uploads WHERE id = ? AND size IS NOT NULL", (id,)).fetchone()
+        return None if row is None else _to_fileinfo(row)
+
+    def find_by_name(self, filename: str) -> List[schemas.FileInfo]:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {_columns} FROM uploads WHERE filename = ? AND size IS NOT NULL", (filename,)
+            ).fetchall()
+        return list(map(_to_fileinfo, rows))
+
+    def list(self, skip: int = 0, limit: int = 100) -> List[schemas.FileInfo]:
+        """Uploads, oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {_columns} FROM uploads WHERE size IS NOT NULL ORDER BY created, id LIMIT ? OFFSET ?",
+                (limit, skip),
+            ).fetchall()
+        return list(map(_to_fileinfo, rows))
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM uploads WHERE size IS NOT NULL").fetchone()[0]
+
+    def remove(self, id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM uploads WHERE id = ?", (id,))
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM uploads")
+            self._conn.commit()
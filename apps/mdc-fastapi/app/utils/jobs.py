@@ -0,0 +1,233 @@
+import asyncio
+import json
+import secrets
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app import schemas
+from app.core.config import settings
+from app.utils import file, model
+from app.utils.pool import PoolBusyError, PoolTimeoutError, pool
+
+_columns = "id, model, file_id, priority, status, result, error, created, started, finished"
+
+
+def _to_job(row: tuple) -> schemas.Job:
+    job = dict(zip(_columns.split(", "), row))
+    job["result"] = None if job["result"] is None else json.loads(job["result"])
+    return schemas.Job(**job)
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    values = sorted(values)
+    return {f"p{p}": values[min(len(values) - 1, int(len(values) * p / 100))] for p in (50, 90, 99)}
+
+
+class JobQueue:
+    """
+    Prediction jobs in SQLite, so queued jobs survive restarts.
+
+    Jobs are taken by highest priority first, then in the order they were submitted.
+    Finished jobs are kept for `retention` seconds.
+    Every server process takes jobs from the same file, so a job is claimed by a single conditional update,
+    and a job running for more than `stale_after` seconds is taken to be left by a stopped process and queued again.
+    """
+
+    def __init__(self, path: Path, retention: float, stale_after: float):
+        self.path = path
+        self.retention = retention
+        self.stale_after = stale_after
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " model TEXT NOT NULL,"
+            " file_id TEXT NOT NULL,"
+            " priority INTEGER NOT NULL,"
+            " status TEXT NOT NULL,"
+            " result TEXT,"
+            " error TEXT,"
+            " created REAL NOT NULL,"
+            " started REAL,"
+            " finished REAL)"
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")]
+        if "attempts" not in columns:
+            # failed attempts to run the job, added after the table
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority DESC, created)")
+        self._conn.commit()
+        self.requeue_stale()
+        self.added = asyncio.Event()
+
+    def submit(self, model_name: str, file_id: str, priority: int = 0) -> schemas.Job:
+        with self._lock:
+            while True:
+                id_ = secrets.token_hex(8)
+                try:
+                    self._conn.execute(
+                        "INSERT INTO jobs (id, model, file_id, priority, status, created) VALUES (?, ?, ?, ?, ?, ?)",
+                        (id_, model_name, file_id, priority, "queued", time.time()),
+                    )
+                except sqlite3.IntegrityError:
+                    continue
+                self._conn.commit()
+                break
+        self.added.set()
+        return self.get(id_)
+
+    def get(self, id: str) -> Optional[schemas.Job]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT {_columns} FROM jobs WHERE id = ?", (id,)).fetchone()
+        return None if row is None else _to_job(row)
+
+    def claim(self) -> Optional[schemas.Job]:
+        """Marks the next queued job as running and returns it."""
+        with self._lock:
+            while True:
+                row = self._conn.execute(
+                    "SELECT id FROM jobs WHERE status = 'queued' ORDER BY priority DESC, created, rowid LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    return None
+                # another process may have claimed it since the select
+                cursor = self._conn.execute(
+                    "UPDATE jobs SET status = 'running', started = ? WHERE id = ? AND status = 'queued'",
+                    (time.time(), row[0]),
+                )
+                self._conn.commit()
+                if cursor.rowcount == 1:
+                    break
+        return self.get(row[0])
+
+    def requeue_stale(self) -> int:
+        """Queues again jobs running for more than `stale_after` seconds. Returns their number."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', started = NULL WHERE status = 'running' AND started < ?",
+                (time.time() - self.stale_after,),
+            )
+            self._conn.commit()
+        return cursor.rowcount
+
+    def requeue(self, id: str) -> None:
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET status = 'queued', started = NULL WHERE id = ?", (id,))
+            self._conn.commit()
+
+    def retry(self, id: str, max_attempts: int) -> bool:
+        """Counts a failed attempt and requeues the job, unless it had `max_attempts`. Returns whether it was."""
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET attempts = attempts + 1 WHERE id = ?", (id,))
+            (attempts,) = self._conn.execute("SELECT attempts FROM jobs WHERE id = ?", (id,)).fetchone()
+            if attempts < max_attempts:
+                self._conn.execute("UPDATE jobs SET status = 'queued', started = NULL WHERE id = ?", (id,))
+            self._conn.commit()
+        return attempts < max_attempts
+
+    def finish(self, id: str, result: schemas.Prediction) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'done', result = ?, finished = ? WHERE id = ?",
+                (result.json(), time.time(), id),
+            )
+            self._conn.commit()
+
+    def fail(self, id: str, error: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, finished = ? WHERE id = ?", (error, time.time(), id)
+            )
+            self._conn.commit()
+
+    def prune(self) -> int:
+        """Deletes jobs finished more than `retention` seconds ago. Returns the number of deleted jobs."""
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM jobs WHERE finished < ?", (time.time() - self.retention,))
+            self._conn.commit()
+        return cursor.rowcount
+
+    def stats(self, last: int = 1000) -> schemas.JobStats:
+        """Number of jobs by status, and percentiles of wait and run time of the `last` finished jobs."""
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            times = self._conn.execute(
+                "SELECT created, started, finished FROM jobs WHERE finished IS NOT NULL ORDER BY finished DESC LIMIT ?",
+                (last,),
+            ).fetchall()
+        return schemas.JobStats(
+            queued=counts.get("queued", 0),
+            running=counts.get("running", 0),
+            done=counts.get("done", 0),
+            failed=counts.get("failed", 0),
+            wait_seconds=_percentiles([started - created for created, started, _ in times]),
+            run_seconds=_percentiles([finished - started for _, started, finished in times]),
+        )
+
+
+_queue: Optional[JobQueue] = None
+
+
+def get_queue() -> JobQueue:
+    global _queue
+    if _queue is None:
+        _queue = JobQueue(
+            settings.DATA_DIR / "jobs.sqlite3", settings.JOB_RETENTION_SECONDS, settings.JOB_STALE_SECONDS
+        )
+    return _queue
+
+
+async def _run(job: schemas.Job) -> None:
+    queue = get_queue()
+    try:
+        fileinfo = file.retrieve_by_id(job.file_id)
+        prediction = await model.predict(job.model, fileinfo)
+    except PoolBusyError:
+        # try again later, the job keeps its place
+        queue.requeue(job.id)
+        await asyncio.sleep(settings.WORKER_RETRY_AFTER)
+    except model.BadModelError:
+        # may not load because of the worker, e.g. out of memory, but a broken model file never does
+        if queue.retry(job.id, settings.JOB_MAX_ATTEMPTS):
+            await asyncio.sleep(settings.WORKER_RETRY_AFTER)
+        else:
+            queue.fail(job.id, "Model failed to load")
+    except FileNotFoundError:
+        queue.fail(job.id, "File not found")
+    except PoolTimeoutError:
+        queue.fail(job.id, "Prediction timed out")
+    except model.FeatureExtractionError as e:
+        queue.fail(job.id, str(e))
+    except Exception as e:
+        queue.fail(job.id, f"Prediction failed: {e!r}")
+    else:
+        queue.finish(job.id, prediction)
+
+
+async def _consume() -> None:
+    queue = get_queue()
+    while True:
+        job = queue.claim()
+        if job is None:
+            queue.added.clear()
+            try:
+                await asyncio.wait_for(queue.added.wait(), timeout=60)
+            except asyncio.TimeoutError:
+                queue.prune()
+                queue.requeue_stale()
+            continue
+        await _run(job)
+
+
+async def run_consumers() -> None:
+    """Processes jobs with `JOB_CONCURRENCY` concurrent consumers, until cancelled."""
+    get_queue().prune()
+    await asyncio.gather(*(_consume() for _ in range(settings.JOB_CONCURRENCY or pool.processes)))
+
@@ -0,0 +1,246 @@
+"""
+music21's jSymbolic meter (r31-r35) and pitch (p1-p21) features, computed with NumPy from intermediates
+derived once per score.
+
+`features.DataSet` gives the score a `DataInstance`, which copies it to strip ties, and copies every part and
+voice again. Each extractor then collects what it needs from that. `Intermediates` strips the ties of the
+parsed score in place and keeps the pitch space values, MIDI pitch and pitch class histograms and time signatures,
+the only things the features above read. The values equal music21's (see test_features.py); the primary
+register (p12) is a float mean and may differ in the last digit.
+"""
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from music21 import stream
+
+Vector = Optional[List[Any]]  # None when music21's extractor fails, it then gives zeros
+
+
+class Intermediates:
+    """What the features are computed from, derived from a score once."""
+
+    def __init__(self, s: stream.Stream):
+        from music21 import meter
+
+        # as `DataInstance`, but the score was parsed for this and needs no copy
+        s.stripTies(inPlace=True)
+        # the order of `Stream.pitches` decides ties between equally common pitches
+        self.ps = np.fromiter((p.ps for p in s.pitches), dtype=float)
+        # `Pitch.midi`: rounded half up, octaves outside 0-127 folded in
+        rounded = np.floor(self.ps + 0.5).astype(int)
+        high = 108 + rounded % 12
+        high = np.where(high < 115, high + 12, high)
+        self.midi = np.where(rounded > 127, high, np.where(rounded < 0, rounded % 12, rounded))
+        # `Pitch.pitchClass`: rounded half to even, as np.round
+        self.pitch_classes = np.round(self.ps).astype(int) % 12
+        # `midiPitchHistogram` is a Counter, its pitches in the order they first occur
+        pitches, first, counts = np.unique(self.midi, return_index=True, return_counts=True)
+        order = np.argsort(first)
+        self.pitches = pitches[order]
+        self.pitch_counts = counts[order]
+        # Counter.most_common order, the first to occur first among equal counts
+        self.common = np.argsort(-self.pitch_counts, kind="stable")
+        self.pitch_class_histogram = np.bincount(self.pitch_classes, minlength=12)
+        self.time_signatures = list(s.flatten().getElementsByClass(meter.TimeSignature))
+
+    @property
+    def total(self) -> int:
+        return len(self.ps)
+
+
+def _normalized(vector: np.ndarray) -> Vector:
+    total = vector.sum()
+    if not total:
+        return None
+    return (vector * (1.0 / total)).tolist()
+
+
+def _initial_time_signature(d: Intermediates) -> Vector:
+    if not d.time_signatures:
+        return [0, 0]
+    return [d.time_signatures[0].numerator, d.time_signatures[0].denominator]
+
+
+def _compound_or_simple_meter(d: Intermediates) -> Vector:
+    from music21 import exceptions21
+
+    if not d.time_signatures:
+        return [0]
+    try:
+        return [int(d.time_signatures[0].beatDivisionCountName == "Compound")]
+    except exceptions21.TimeSignatureException:
+        return [0]
+
+
+def _meter(numerator: int) -> Callable[[Intermediates], Vector]:
+    def process(d: Intermediates) -> Vector:
+        return [int(bool(d.time_signatures) and d.time_signatures[0].numerator == numerator)]
+
+    return process
+
+
+def _changes_of_meter(d: Intermediates) -> Vector:
+    first = d.time_signatures[0] if d.time_signatures else None
+    return [int(any(not first.ratioEqual(ts) for ts in d.time_signatures[1:]))]
+
+
+def _most_common_pitch_prevalence(d: Intermediates) -> Vector:
+    if not d.total:
+        return None
+    return [float(d.pitch_counts.max() / d.total)]
+
+
+def _most_common_pitch_class_prevalence(d: Intermediates) -> Vector:
+    if not d.total:
+        return None
+    return [float(d.pitch_class_histogram.max() / d.total)]
+
+
+def _relative_strength_of_top_pitches(d: Intermediates) -> Vector:
+    if len(d.common) < 2:
+        return [0.0]
+    first, second = d.pitch_counts[d.common[:2]]
+    return [float(second / first)]
+
+
+def _top_pitch_classes(d: Intermediates):
+    """The most and the next most common pitch class (C=0), the lowest of equally common ones."""
+    histogram = d.pitch_class_histogram.copy()
+    first = int(histogram.argmax())
+    histogram[first] = 0
+    return first, int(histogram.argmax())
+
+
+def _relative_strength_of_top_pitch_classes(d: Intermediates) -> Vector:
+    if not d.total:
+        return None
+    first, second = _top_pitch_classes(d)
+    return [float(d.pitch_class_histogram[second] / d.pitch_class_histogram[first])]
+
+
+def _interval_between_strongest_pitches(d: Intermediates) -> Vector:
+    if len(d.common) < 2:
+        return [0.0]
+    first, second = d.pitches[d.common[:2]]
+    return [abs(int(second) - int(first))]
+
+
+def _interval_between_strongest_pitch_classes(d: Intermediates) -> Vector:
+    first, second = _top_pitch_classes(d)
+    return [abs(first - second)]
+
+
+def _number_of_common_pitches(d: Intermediates) -> Vector:
+    if not d.total:
+        return [0]
+    return [int((d.pitch_counts / d.total >= 0.09).sum())]
+
+
+def _pitch_variety(d: Intermediates) -> Vector:
+    # music21 counts the histogram's keys (MIDI pitches) that are >= 1, so only pitch 0 is left out
+    return [int((d.pitches >= 1).sum())]
+
+
+def _pitch_class_variety(d: Intermediates) -> Vector:
+    return [int((d.pitch_class_histogram >= 1).sum())]
+
+
+def _range(d: Intermediates) -> Vector:
+    if not d.total:
+        return None
+    return [int(d.pitches.max() - d.pitches.min())]
+
+
+def _most_common_pitch(d: Intermediates) -> Vector:
+    if not d.total:
+        return [0.0]
+    return [int(d.pitches[d.common[0]])]
+
+
+def _primary_register(d: Intermediates) -> Vector:
+    if not d.total:
+        return None
+    return [float(d.ps.mean())]
+
+
+def _register(low: int, high: int) -> Callable[[Intermediates], Vector]:
+    def process(d: Intermediates) -> Vector:
+        if not d.total:
+            return None
+        return [int(d.pitch_counts[(d.pitches >= low) & (d.pitches <= high)].sum()) / d.total]
+
+    return process
+
+
+def _most_common_pitch_class(d: Intermediates) -> Vector:
+    return [int(d.pitch_class_histogram.argmax())]
+
+
+def _basic_pitch_histogram(d: Intermediates) -> Vector:
+    vector = np.zeros(128, dtype=int)
+    vector[d.pitches] = d.pitch_counts
+    return _normalized(vector)
+
+
+def _pitch_class_distribution(d: Intermediates) -> Vector:
+    # rotated so the most common pitch class comes first
+    return _normalized(np.roll(d.pitch_class_histogram, -int(d.pitch_class_histogram.argmax())))
+
+
+def _fifths_pitch_histogram(d: Intermediates) -> Vector:
+    # pitch class i goes to 7 * i % 12, so adjacent bins are a fifth apart
+    vector = np.zeros(12, dtype=int)
+    vector[np.arange(12) * 7 % 12] = d.pitch_class_histogram
+    return _normalized(vector)
+
+
+# by music21 extractor id, as in `features.extractorsById`
+FEATURES: Dict[str, Callable[[Intermediates], Vector]] = {
+    'r31': _initial_time_signature,
+    'r32': _compound_or_simple_meter,
+    'r33': _meter(3),
+    'r34': _meter(5),
+    'r35': _changes_of_meter,
+    'p1': _most_common_pitch_prevalence,
+    'p2': _most_common_pitch_class_prevalence,
+    'p3': _relative_strength_of_top_pitches,
+    'p4': _relative_strength_of_top_pitch_classes,
+    'p5': _interval_between_strongest_pitches,
+    'p6': _interval_between_strongest_pitch_classes,
+    'p7': _number_of_common_pitches,
+    'p8': _pitch_variety,
+    'p9': _pitch_class_variety,
+    'p10': _range,
+    'p11': _most_common_pitch,
+    'p12': _primary_register,
+    'p13': _register(-1, 54),
+    'p14': _register(55, 72),
+    'p15': _register(73, 128),
+    'p16': _most_common_pitch_class,
+    'p19': _basic_pitch_histogram,
+    'p20': _pitch_class_distribution,
+    'p21': _fifths_pitch_histogram,
+}
+
+
+def supports(extractor_ids: List[str]) -> bool:
+    return all(id_.lower() in FEATURES for id_ in extractor_ids)
+
+
+def get_id(s: stream.Stream) -> str:
+    """`DataSet`'s Identifier of a parsed score: its title."""
+    title = s.metadata.title if s.metadata is not None else None
+    return "" if title is None else title.replace(" ", "_")
+
+
+def process(data: Intermediates, extractors: list) -> List[Any]:
+    """Feature vectors of the (instantiated) music21 extractors, concatenated as in `DataSet.getFeaturesAsList`."""
+    row = []
+    for extractor in extractors:
+        vector = FEATURES[extractor.id.lower()](data)
+        row.extend([0] * extractor.dimensions if vector is None else vector)
+    return row
@@ -0,0 +1,226 @@
+"""
+Counters, gauges and histograms in the Prometheus text format, without dependencies.
+
+    from app.utils import metrics
+
+    with metrics.timed("parse"):
+        s = converter.parse(path)
+
+Observations made in `WorkerPool` processes are sent back with the job's result (see `call_recorded`)
+and added to the metrics of the server process, so `render()` there includes them.
+"""
+import bisect
+import contextlib
+import math
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# seconds, from a cached lookup to a long music21 parse
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_metrics: Dict[str, "_Metric"] = {}
+# (metric name, labels, value) of the observations made in the current `record()` block
+_recorded: Optional[List[Tuple[str, Labels, float]]] = None
+
+
+def _format_labels(labels: Labels, extra: Labels = ()) -> str:
+    labels = labels + extra
+    if not labels:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        if name in _metrics:
+            raise ValueError(f"metric {name} already exists")
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _metrics[name] = self
+
+    def _labels(self, labels: Dict[str, Any]) -> Labels:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple((name, str(labels[name])) for name in self.labelnames)
+
+    def _record(self, labels: Labels, value: float) -> None:
+        if _recorded is not None:
+            _recorded.append((self.name, labels, value))
+
+    def _apply(self, labels: Labels, value: float) -> None:
+        raise NotImplementedError
+
+    def _samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        labels = self._labels(labels)
+        self._apply(labels, amount)
+        self._record(labels, amount)
+
+    def _apply(self, labels: Labels, value: float) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + value
+
+    def _samples(self) -> Iterator[str]:
+        for labels, value in self._values.items():
+            yield f"{self.name}{_format_labels(labels)} {_format_value(value)}"
+
+
+class Gauge(_Metric):
+    """A value that goes up and down. With `function`, the value is read when rendering."""
+
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), function: Callable[[], float] = None):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Labels, float] = {}
+        self.function = function
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        labels = self._labels(labels)
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: Any) -> None:
+        labels = self._labels(labels)
+        with self._lock:
+            self._values[labels] = value
+
+    @contextlib.contextmanager
+    def track_inprogress(self, **labels: Any) -> Iterator[None]:
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def _samples(self) -> Iterator[str]:
+        if self.function is not None:
+            yield f"{self.name} {_format_value(self.function())}"
+            return
+        for labels, value in self._values.items():
+            yield f"{self.name}{_format_labels(labels)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(
+        self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> (count per bucket, +Inf last), sum
+        self._values: Dict[Labels, Tuple[List[int], float]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        labels = self._labels(labels)
+        self._apply(labels, value)
+        self._record(labels, value)
+
+    def _apply(self, labels: Labels, value: float) -> None:
+        with self._lock:
+            counts, total = self._values.get(labels) or ([0] * (len(self.buckets) + 1), 0.0)
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[labels] = counts, total + value
+
+    @contextlib.contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        """Observes the seconds the block takes, also when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> Iterator[str]:
+        for labels, (counts, total) in self._values.items():
+            cumulative = 0
+            for le, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels(labels, (('le', _format_value(le)),))} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(labels)} {cumulative}"
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    return "\n".join(metric.render() for metric in _metrics.values()) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4"  # starlette adds the charset
+
+
+@contextlib.contextmanager
+def record() -> Iterator[List[Tuple[str, Labels, float]]]:
+    """Collects the counter increments and histogram observations made in the block, for `replay`."""
+    global _recorded
+    previous, _recorded = _recorded, []
+    try:
+        yield _recorded
+    finally:
+        _recorded = previous
+
+
+def replay(recorded: List[Tuple[str, Labels, float]]) -> None:
+    """Applies observations recorded in another process."""
+    for name, labels, value in recorded:
+        _metrics[name]._apply(labels, value)
+
+
+class RecordedError(Exception):
+    """Wraps an exception raised in `call_recorded`, with the observations made before it."""
+
+    def __init__(self, error: BaseException, recorded: List[Tuple[str, Labels, float]]):
+        super().__init__(error, recorded)
+        self.error = error
+        self.recorded = recorded
+
+
+def call_recorded(fn: Callable, *args: Any) -> Tuple[Any, List[Tuple[str, Labels, float]]]:
+    """Calls `fn(*args)` and returns its result with the observations it made. Runs in worker processes."""
+    with record() as recorded:
+        try:
+            return fn(*args), recorded
+        except Exception as e:
+            raise RecordedError(e, recorded) from None
+
+
+stage_seconds = Histogram("mdc_stage_seconds", "Seconds taken by each stage of a prediction.", ["stage"])
+
+
+def timed(stage: str):
+    """Times a stage of the prediction pipeline into `mdc_stage_seconds`."""
+    return stage_seconds.time(stage=stage)
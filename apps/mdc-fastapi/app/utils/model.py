@@ -1,128 +1,623 @@
-import asyncio
-from typing import List
+from __future__ import annotations
 
-from pycaret.classification import load_model as load_cls_model, predict_model as predict_cls_model
-from pycaret.regression import load_model as load_reg_model, predict_model as predict_reg_model
-from music21 import features, converter
-import pandas as pd
+import asyncio
+import hashlib
+import importlib
+import pathlib
+import sys
+import time
+import zlib
+from collections import OrderedDict
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Union
+from zipfile import BadZipFile, ZipFile
 
 from app import schemas
-from app.core.config import settings
+from app.core.config import PACKAGES_DIR, settings
+from app.utils import jsymbolic, metrics
+from app.utils.cache import LRUCache
+from app.utils.compiled import CompiledModel, compile_model
+from app.utils.file import get_digest, with_digest
+from app.utils.pool import PoolBusyError, PoolTimeoutError, pool
+from app.utils.registry import ModelRegistry
 
+# pycaret, music21 and pandas take seconds to import, they are imported on first use
+# which is in the `pool` worker processes, except for pandas
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+_registry: Optional[ModelRegistry] = None
+
+
+def get_registry() -> ModelRegistry:
+    global _registry
+    if _registry is None:
+        _registry = ModelRegistry(settings.DATA_DIR / "models")
+    return _registry
+
+
+def exists(model_name: str) -> bool:
+    return model_name in get_registry()
+
+
+def info() -> List[schemas.ModelEntry]:
+    return get_registry().entries()
+
+
+FEATURE_EXTRACTOR_IDS = [
+    'r31',  # music21.features.jSymbolic.InitialTimeSignatureFeature
+    'r32',  # music21.features.jSymbolic.CompoundOrSimpleMeterFeature
+    'r33',  # music21.features.jSymbolic.TripleMeterFeature
+    'r34',  # music21.features.jSymbolic.QuintupleMeterFeature
+    'r35',  # music21.features.jSymbolic.ChangesOfMeterFeature
+    'p1',   # music21.features.jSymbolic.MostCommonPitchPrevalenceFeature
+    'p2',   # music21.features.jSymbolic.MostCommonPitchClassPrevalenceFeature
+    'p3',   # music21.features.jSymbolic.RelativeStrengthOfTopPitchesFeature
+    'p4',   # music21.features.jSymbolic.RelativeStrengthOfTopPitchClassesFeature
+    'p5',   # music21.features.jSymbolic.IntervalBetweenStrongestPitchesFeature`
+    'p6',   # music21.features.jSymbolic.IntervalBetweenStrongestPitchClassesFeature
+    'p7',   # music21.features.jSymbolic.NumberOfCommonPitchesFeature
+    'p8',   # music21.features.jSymbolic.PitchVarietyFeature
+    'p9',   # music21.features.jSymbolic.PitchClassVarietyFeature
+    'p10',  # music21.features.jSymbolic.RangeFeature
+    'p11',  # music21.features.jSymbolic.MostCommonPitchFeature
+    'p12',  # music21.features.jSymbolic.PrimaryRegisterFeature
+    'p13',  # music21.features.jSymbolic.ImportanceOfBassRegisterFeature
+    'p14',  # music21.features.jSymbolic.ImportanceOfMiddleRegisterFeature
+    'p15',  # music21.features.jSymbolic.ImportanceOfHighRegisterFeature
+    'p16',  # music21.features.jSymbolic.MostCommonPitchClassFeature
+    'p19',  # music21.features.jSymbolic.BasicPitchHistogramFeature
+    'p20',  # music21.features.jSymbolic.PitchClassDistributionFeature
+    'p21',  # music21.features.jSymbolic.FifthsPitchHistogramFeature
+]
+
+FeatureSet = schemas.FeatureSet
+
+# suffixes of the files each feature set is extracted from
+FEATURE_SET_SUFFIXES: Dict[FeatureSet, Tuple[str, ...]] = {
+    "music21": (".mxl",),
+    "musescore": (".mscz", ".mscx"),
+}
+
+# `musescore.features.Features` as columns of mdc.csv (see apps/mdc-extractor)
+MUSESCORE_FEATURE_COLUMNS = ["PS_LH", "PS_RH", "PE", "DSR", "HDR_LH", "HDR_RH", "HS", "PPR_LH", "PPR_RH", "ANR"]
+
+
+def get_feature_set(model_name: str) -> FeatureSet:
+    return get_registry().get(model_name).feature_set
+
+
+def get_file_feature_set(fileinfo: schemas.FileInfo) -> Optional[FeatureSet]:
+    suffix = fileinfo.filepath.suffix.lower()
+    for feature_set, suffixes in FEATURE_SET_SUFFIXES.items():
+        if suffix in suffixes:
+            return feature_set
+    return None
+
+
+class FeatureExtractionError(Exception):
+    pass
+
+
+# a tiny score to check that models load and predict
+DRY_RUN_SOURCE = "tinyNotation: 4/4 c4 e4 g4 c'4 B2 d'2 c'1"
+
+# per process, extraction and inference run in `pool` workers
+_models: "OrderedDict[str, Any]" = OrderedDict()  # least recently used first
+_model_sizes: Dict[str, int] = {}
+_model_status: Dict[str, dict] = {}
+_dry_run_data: Dict[FeatureSet, pd.DataFrame] = {}
+_compiled: Dict[str, Optional[CompiledModel]] = {}  # see MODEL_COMPILE
+_feature_extractors = None
+_instantiated_extractors = None
+
+
+def get_feature_extractors() -> list:
+    global _feature_extractors
+    if _feature_extractors is None:
+        from music21 import features
+
+        _feature_extractors = features.extractorsById(FEATURE_EXTRACTOR_IDS)
+    return _feature_extractors
 
-def info() -> List[schemas.ModelInfo]:
-    out = []
-    for model_path in (settings.DATA_DIR / "models").glob("*.pkl"):
-        parts = []
-        if "rf" in model_path.name:
-            parts.append("Random Forest")
-        elif "et" in model_path.name:
-            parts.append("Extra Trees")
-        elif "xgb" in model_path.name:
-            parts.append("Extreme Gradient Boosting")
-        elif "catboost" in model_path.name:
-            parts.append("CatBoost")
-        if "reg" in model_path.name:
-            parts.append("Regressor")
-        else:
-            parts.append("Classifier")
-        if "v1" in model_path.name:
-            parts.append("v1")
-        out.append(schemas.ModelInfo(id=model_path.stem, description=" ".join(parts)))
-    return out
 
+def _get_instantiated_extractors() -> list:
+    """Extractor instances for their dimensions and labels, `jsymbolic` computes their features."""
+    global _instantiated_extractors
+    if _instantiated_extractors is None:
+        _instantiated_extractors = [cls() for cls in get_feature_extractors()]
+    return _instantiated_extractors
 
-_models = dict()
-feature_extractors = []
-
-
-async def load_feature_extractors():
-    global feature_extractors
-    feature_extractors = features.extractorsById([
-        'r31',  # music21.features.jSymbolic.InitialTimeSignatureFeature
-        'r32',  # music21.features.jSymbolic.CompoundOrSimpleMeterFeature
-        'r33',  # music21.features.jSymbolic.TripleMeterFeature
-        'r34',  # music21.features.jSymbolic.QuintupleMeterFeature
-        'r35',  # music21.features.jSymbolic.ChangesOfMeterFeature
-        'p1',   # music21.features.jSymbolic.MostCommonPitchPrevalenceFeature
-        'p2',   # music21.features.jSymbolic.MostCommonPitchClassPrevalenceFeature
-        'p3',   # music21.features.jSymbolic.RelativeStrengthOfTopPitchesFeature
-        'p4',   # music21.features.jSymbolic.RelativeStrengthOfTopPitchClassesFeature
-        'p5',   # music21.features.jSymbolic.IntervalBetweenStrongestPitchesFeature`
-        'p6',   # music21.features.jSymbolic.IntervalBetweenStrongestPitchClassesFeature
-        'p7',   # music21.features.jSymbolic.NumberOfCommonPitchesFeature
-        'p8',   # music21.features.jSymbolic.PitchVarietyFeature
-        'p9',   # music21.features.jSymbolic.PitchClassVarietyFeature
-        'p10',  # music21.features.jSymbolic.RangeFeature
-        'p11',  # music21.features.jSymbolic.MostCommonPitchFeature
-        'p12',  # music21.features.jSymbolic.PrimaryRegisterFeature
-        'p13',  # music21.features.jSymbolic.ImportanceOfBassRegisterFeature
-        'p14',  # music21.features.jSymbolic.ImportanceOfMiddleRegisterFeature
-        'p15',  # music21.features.jSymbolic.ImportanceOfHighRegisterFeature
-        'p16',  # music21.features.jSymbolic.MostCommonPitchClassFeature
-        'p19',  # music21.features.jSymbolic.BasicPitchHistogramFeature
-        'p20',  # music21.features.jSymbolic.PitchClassDistributionFeature
-        'p21',  # music21.features.jSymbolic.FifthsPitchHistogramFeature
-    ])
-
-
-_task = asyncio.create_task(load_feature_extractors())
-
-
-async def get_feature_extractors():
-    await _task
-    return feature_extractors
+
+def _get_feature_labels() -> List[str]:
+    """The columns of `DataSet.getAttributeLabels`."""
+    labels = [label for fe in _get_instantiated_extractors() for label in fe.getAttributeLabels()]
+    return ['Identifier'] + labels + ['ClassLabel']
 
 
 class BadModelError(Exception):
     pass
 
 
-async def get_model(model_name: str):
+model_cache = metrics.Counter("mdc_model_cache_total", "Model lookups in the worker processes, by result.", ["result"])
+
+
+def _get_pycaret(task: schemas.ModelTask):
+    """pycaret.regression or pycaret.classification"""
+    return importlib.import_module(f"pycaret.{task}")
+
+
+def get_model(model_name: str):
     if model_name in _models:
+        model_cache.inc(result="hit")
+        _models.move_to_end(model_name)
         return _models[model_name]
     else:
+        model_cache.inc(result="miss")
+        entry = get_registry().get(model_name)
         try:
-            if "reg" in model_name:
-                model = load_reg_model(str(settings.DATA_DIR / "models" / model_name))
-            else:
-                model = load_cls_model(str(settings.DATA_DIR / "models" / model_name))
-            _models[model_name] = model
+            with metrics.timed("load_model"):
+                model = _get_pycaret(entry.task).load_model(str(settings.DATA_DIR / "models" / model_name))
         except ValueError as e:
             # sometimes it errors, trying again works somehow
             raise BadModelError from e
+        _models[model_name] = model
+        _model_sizes[model_name] = entry.size
+        if settings.MODEL_COMPILE:
+            _compiled[model_name] = _compile_model(model_name, model)
+        _evict_models()
+        return model
 
 
-async def extract_features(fileinfo: schemas.FileInfo) -> pd.DataFrame:
+def _get_parity_sample(model_name: str, feature_set: FeatureSet) -> pd.DataFrame:
+    """Held-out rows saved as <model>.sample.csv next to the model, else variations of the dry-run input."""
+    import numpy as np
+    import pandas as pd
+
+    path = settings.DATA_DIR / "models" / f"{model_name}.sample.csv"
+    if path.is_file():
+        return pd.read_csv(path)
+    base = _get_dry_run_data(feature_set)
+    sample = pd.concat([base] * settings.MODEL_PARITY_SAMPLE_SIZE, ignore_index=True)
+    numeric = sample.select_dtypes("number").columns
+    factors = np.random.default_rng(0).uniform(0.5, 1.5, size=(len(sample), len(numeric)))
+    factors[0] = 1
+    sample[numeric] = sample[numeric] * factors
+    return sample
+
+
+def _compile_model(model_name: str, model: Any) -> Optional[CompiledModel]:
+    """The model without `predict_model`, if it gives the same predictions on the parity sample."""
+    entry = get_registry().get(model_name)
+    pycaret = _get_pycaret(entry.task)
+    try:
+        sample = _select_columns(model_name, _get_parity_sample(model_name, entry.feature_set))
+        with metrics.timed("compile_model"):
+            return compile_model(model, entry.task, lambda data: pycaret.predict_model(model, data=data), sample)
+    except Exception as e:
+        print(f"Compiling {model_name} failed, using predict_model: {e!r}")
+        return None
+
+
+def _evict_models() -> None:
+    """Drops least recently used models while over `MODEL_MEMORY_BUDGET_MB`, always keeping the last one."""
+    if settings.MODEL_MEMORY_BUDGET_MB is None:
+        return
+    budget = settings.MODEL_MEMORY_BUDGET_MB * 2 ** 20
+    # the pickle size is used as an estimate of the memory a model takes
+    while len(_models) > 1 and sum(_model_sizes[name] for name in _models) > budget:
+        name, _ = _models.popitem(last=False)
+        _compiled.pop(name, None)
+
+
+def _get_dry_run_data(feature_set: FeatureSet) -> pd.DataFrame:
+    if feature_set not in _dry_run_data:
+        if feature_set == "musescore":
+            import pandas as pd
+
+            row = [0.5] * len(MUSESCORE_FEATURE_COLUMNS)
+            _dry_run_data[feature_set] = pd.DataFrame([row], columns=MUSESCORE_FEATURE_COLUMNS)
+        else:
+            _dry_run_data[feature_set] = _extract_features(DRY_RUN_SOURCE)
+    return _dry_run_data[feature_set]
+
+
+def _warm_up_model(model_name: str) -> dict:
+    status = dict(id=model_name, loaded=False, load_seconds=None, dry_run_seconds=None, error=None)
+    for _ in range(2):  # loading sometimes fails, trying again works
+        try:
+            start = time.perf_counter()
+            get_model(model_name)
+            status["load_seconds"] = time.perf_counter() - start
+            data = _get_dry_run_data(get_feature_set(model_name))
+            start = time.perf_counter()
+            _predict_model(model_name, data)
+            status["dry_run_seconds"] = time.perf_counter() - start
+            status["loaded"] = True
+            status["error"] = None
+            break
+        except Exception as e:
+            _models.pop(model_name, None)
+            _compiled.pop(model_name, None)
+            status["error"] = repr(e)
+    return status
+
+
+def _preload_models(model_names: List[str]) -> None:
+    """Worker initializer, loads and validates every model before the worker takes jobs."""
+    for model_name in model_names:
+        _model_status[model_name] = _warm_up_model(model_name)
+
+
+def _get_model_status() -> List[dict]:
+    return [
+        dict(status, resident=name in _models, compiled=getattr(_compiled.get(name), "kind", None))
+        for name, status in _model_status.items()
+    ]
+
+
+def _extract_features(source: Union[pathlib.Path, str]) -> pd.DataFrame:
+    import pandas as pd
+    from music21 import converter, features
+
+    if settings.FEATURE_VECTORIZED and jsymbolic.supports(FEATURE_EXTRACTOR_IDS):
+        with metrics.timed("parse"):
+            s = converter.parse(str(source))
+        with metrics.timed("prepare"):
+            data = jsymbolic.Intermediates(s)
+        with metrics.timed("process"):
+            row = jsymbolic.process(data, _get_instantiated_extractors())
+        return pd.DataFrame([[jsymbolic.get_id(s)] + row + ['']], columns=_get_feature_labels())
+
     ds = features.DataSet(classLabel='ClassLabel')
-    ds.addFeatureExtractors(await get_feature_extractors())
-    s = converter.parse(str(fileinfo.filepath))
+    ds.addFeatureExtractors(get_feature_extractors())
+    with metrics.timed("parse"):
+        s = converter.parse(str(source))
     ds.addData(s)
-    ds.process()
+    with metrics.timed("process"):
+        ds.process()
     df = pd.DataFrame(ds.getFeaturesAsList(), columns=ds.getAttributeLabels())
     return df
 
 
-async def predict(model_name: str, fileinfo: schemas.FileInfo) -> schemas.Prediction:
-    task1 = asyncio.create_task(extract_features(fileinfo))
-    task2 = asyncio.create_task(get_model(model_name))
-    # model = load_model(str(settings.DATA_DIR / "models" / model_name))
-    await asyncio.gather(task1, task2)
+def _extract_musescore_features(filepath: pathlib.Path) -> pd.DataFrame:
+    import pandas as pd
+    from lxml import etree
+
+    if str(PACKAGES_DIR) not in sys.path:
+        sys.path.append(str(PACKAGES_DIR))
+    from musescore.next import newMuseScore
+
     try:
-        if "reg" in fileinfo.filename:
-            predictions = predict_reg_model(task2.result(), data=task1.result())
+        if filepath.suffix.lower() == ".mscz":
+            with ZipFile(filepath) as zfile:
+                mscx_files = [name for name in zfile.namelist() if name.endswith(".mscx")]
+                if not mscx_files:
+                    raise FeatureExtractionError("No .mscx file in the .mscz file")
+                with zfile.open(mscx_files[0], "r") as f, metrics.timed("parse"):
+                    musescore = newMuseScore(f, backend="lxml")
         else:
-            predictions = predict_cls_model(task2.result(), data=task1.result())
+            with filepath.open("rb") as f, metrics.timed("parse"):
+                musescore = newMuseScore(f, backend="lxml")
+    except (BadZipFile, zlib.error, etree.XMLSyntaxError) as e:
+        # corrupt archive or compressed data, malformed XML
+        raise FeatureExtractionError("Not a valid MuseScore file") from e
+    if musescore is None:
+        raise FeatureExtractionError("Unsupported MuseScore version")
+    with metrics.timed("process"):
+        f = musescore.get_features()
+    if f is None:
+        raise FeatureExtractionError("No piano part found")
+    row = [f.PS[0], f.PS[1], f.PE, f.DSR, f.HDR[0], f.HDR[1], f.HS, f.PPR[0], f.PPR[1], f.ANR]
+    return pd.DataFrame([row], columns=MUSESCORE_FEATURE_COLUMNS)
+
+
+_extractors = {
+    "music21": _extract_features,
+    "musescore": _extract_musescore_features,
+}
+
+
+def _cache_dir(name: str) -> Optional[pathlib.Path]:
+    return None if settings.CACHE_DIR is None else settings.CACHE_DIR / name
+
+
+# extracted features by file content, predictions by file content and model
+feature_cache = LRUCache(
+    "features", settings.FEATURE_CACHE_SIZE, _cache_dir("features"), settings.FEATURE_CACHE_DISK_SIZE
+)
+prediction_cache = LRUCache(
+    "predictions", settings.PREDICTION_CACHE_SIZE, _cache_dir("predictions"), settings.PREDICTION_CACHE_DISK_SIZE
+)
+
+# packages whose source the musescore features are computed by
+_STAMPED_PACKAGES = ["musescore", "utils"]
+
+
+@lru_cache(maxsize=None)
+def _get_musescore_version_stamp() -> str:
+    """Hash of the source of `packages/musescore` (and `utils`), as apps/mdc-extractor stamps its cache."""
+    h = hashlib.sha256()
+    for package in _STAMPED_PACKAGES:
+        for path in sorted((PACKAGES_DIR / package).glob("*.py")):
+            h.update(path.name.encode())
+            h.update(path.read_bytes())
+    return h.hexdigest()[:16]
+
+
+def _feature_key(digest: str, feature_set: FeatureSet) -> str:
+    if feature_set == "music21":
+        # other extractors give other features
+        return f"{digest}:{','.join(FEATURE_EXTRACTOR_IDS)}"
+    # changed feature code gives other features
+    return f"{digest}:{feature_set}:{_get_musescore_version_stamp()}"
+
+
+def _prediction_key(digest: str, model_name: str) -> str:
+    # predicted from the features, and a replaced model file gives other predictions
+    feature_key = _feature_key(digest, get_feature_set(model_name))
+    return f"{feature_key}:{model_name}:{get_registry().get(model_name).sha256}"
+
+
+async def extract_features(fileinfo: schemas.FileInfo) -> pd.DataFrame:
+    """music21 features of .mxl files, `musescore.features.Features` of .mscz and .mscx files."""
+    feature_set = get_file_feature_set(fileinfo)
+    if feature_set is None:
+        raise FeatureExtractionError(f"Unsupported file type: {fileinfo.filepath.suffix}")
+    fileinfo = await with_digest(fileinfo)
+    key = _feature_key(get_digest(fileinfo), feature_set)
+    df = feature_cache.get(key)
+    if df is None:
+        df = await pool.run(_extractors[feature_set], fileinfo.filepath)
+        feature_cache.put(key, df)
+    return df.copy()
+
+
+async def extract_features_many(fileinfos: List[schemas.FileInfo]) -> List[Union[pd.DataFrame, Exception]]:
+    """
+    Extracts features of many files concurrently, using at most `pool.processes` workers at a time.
+
+    Failed extractions are returned as their exception, except `PoolBusyError` which is raised.
+    """
+    semaphore = asyncio.Semaphore(pool.processes)
+
+    async def extract(fileinfo: schemas.FileInfo) -> pd.DataFrame:
+        async with semaphore:
+            return await extract_features(fileinfo)
+
+    extracted = await asyncio.gather(*map(extract, fileinfos), return_exceptions=True)
+    for e in extracted:
+        if isinstance(e, PoolBusyError):
+            raise e
+    return extracted
+
+
+def _select_columns(model_name: str, data: pd.DataFrame) -> pd.DataFrame:
+    """The model's feature columns, in the order it was trained with."""
+    columns = get_registry().get(model_name).columns
+    if columns is None:
+        return data
+    missing = [column for column in columns if column not in data.columns]
+    if missing:
+        raise FeatureExtractionError(f"Features missing for {model_name}: {', '.join(missing)}")
+    return data[columns]
+
+
+def _predict_model(model_name: str, data: pd.DataFrame) -> pd.DataFrame:
+    model = get_model(model_name)
+    data = _select_columns(model_name, data)
+    compiled = _compiled.get(model_name)
+    if compiled is not None:
+        with metrics.timed("predict_compiled"):
+            return compiled.predict(data)
+    try:
+        with metrics.timed("predict_model"):
+            return _get_pycaret(get_registry().get(model_name).task).predict_model(model, data=data)
     except ValueError as e:
         # sometimes it errors, trying again works somehow
         raise BadModelError from e
-    print(model_name)
-    print(predictions)
-    label = predictions.loc[0]['Label']
+
+
+async def predict_model(model_name: str, data: pd.DataFrame) -> pd.DataFrame:
+    return await pool.run(_predict_model, model_name, data)
+
+
+def _to_prediction(model_name: str, fileinfo: schemas.FileInfo, row: pd.Series) -> schemas.Prediction:
+    label = row['Label']
     if isinstance(label, str):
         label = int(label[-1])
-    try:
-        score = predictions.loc[0]['Score']
-    except KeyError:
-        score = None
-    return schemas.Prediction(model=model_name, input=fileinfo.filename, label=label, score=score)
+    elif hasattr(label, "item"):
+        # numpy scalar, so classes stay int and regression labels float
+        label = label.item()
+    score = row.get('Score')
+    return schemas.Prediction(model=model_name, input=fileinfo.filename, label=label, score=score, id=fileinfo.id)
+
+
+def _get_cached_prediction(model_name: str, fileinfo: schemas.FileInfo) -> Optional[schemas.Prediction]:
+    prediction = prediction_cache.get(_prediction_key(get_digest(fileinfo), model_name))
+    if prediction is None:
+        return None
+    # cached by content, the same file may have been uploaded under another name
+    return prediction.copy(update=dict(input=fileinfo.filename, id=fileinfo.id))
+
+
+def _put_cached_prediction(prediction: schemas.Prediction, fileinfo: schemas.FileInfo) -> None:
+    prediction_cache.put(_prediction_key(get_digest(fileinfo), prediction.model), prediction)
+
+
+async def predict(model_name: str, fileinfo: schemas.FileInfo) -> schemas.Prediction:
+    fileinfo = await with_digest(fileinfo)
+    prediction = _get_cached_prediction(model_name, fileinfo)
+    if prediction is None:
+        data = await extract_features(fileinfo)
+        predictions = await predict_model(model_name, data)
+        prediction = _to_prediction(model_name, fileinfo, predictions.loc[0])
+        _put_cached_prediction(prediction, fileinfo)
+    return prediction
+
+
+async def predict_batch(
+    model_names: List[str], fileinfos: List[schemas.FileInfo]
+) -> Tuple[List[schemas.Prediction], Dict[str, str]]:
+    """
+    Predicts every file with every model taking its kind of features (see `get_feature_set`).
+
+    Cached predictions are reused, for the rest features are extracted once per file
+    and each model predicts its uncached files in one `predict_model` call.
+    Returns the predictions and {file id: reason} of files that could not be predicted,
+    with {model: reason} of models that could not predict. `PoolBusyError` is raised.
+    """
+    errors = {}
+    pairs = []
+    fileinfos = [await with_digest(f) for f in fileinfos]
+    for fileinfo in fileinfos:
+        file_models = [m for m in model_names if get_feature_set(m) == get_file_feature_set(fileinfo)]
+        if not file_models:
+            errors[fileinfo.id] = f"None of the models takes {fileinfo.filepath.suffix} files"
+        pairs.extend((model_name, fileinfo) for model_name in file_models)
+    cached = {}
+    for model_name, fileinfo in pairs:
+        prediction = _get_cached_prediction(model_name, fileinfo)
+        if prediction is not None:
+            cached[model_name, fileinfo.id] = prediction
+    missing = list({f.id: f for m, f in pairs if (m, f.id) not in cached}.values())
+
+    extracted = await extract_features_many(missing)
+    extracted_fileinfos = []
+    frames = []
+    for fileinfo, df in zip(missing, extracted):
+        if isinstance(df, PoolTimeoutError):
+            errors[fileinfo.id] = "Feature extraction timed out"
+        elif isinstance(df, FeatureExtractionError):
+            errors[fileinfo.id] = str(df)
+        elif isinstance(df, Exception):
+            errors[fileinfo.id] = f"Feature extraction failed: {df!r}"
+        else:
+            extracted_fileinfos.append(fileinfo)
+            frames.append(df)
+
+    async def predict_missing(model_name: str) -> None:
+        feature_set = get_feature_set(model_name)
+        idx = [
+            i
+            for i, f in enumerate(extracted_fileinfos)
+            if get_file_feature_set(f) == feature_set and (model_name, f.id) not in cached
+        ]
+        if not idx:
+            return
+        import pandas as pd
+
+        data = pd.concat([frames[i] for i in idx], ignore_index=True)
+        predictions = await predict_model(model_name, data)
+        for i, (_, row) in zip(idx, predictions.iterrows()):
+            prediction = _to_prediction(model_name, extracted_fileinfos[i], row)
+            _put_cached_prediction(prediction, extracted_fileinfos[i])
+            cached[model_name, extracted_fileinfos[i].id] = prediction
+
+    results = await asyncio.gather(*map(predict_missing, model_names), return_exceptions=True)
+    for model_name, result in zip(model_names, results):
+        if isinstance(result, PoolBusyError):
+            raise result
+        elif isinstance(result, BadModelError):
+            errors[model_name] = "Model failed to load"
+        elif isinstance(result, PoolTimeoutError):
+            errors[model_name] = "Prediction timed out"
+        elif isinstance(result, FeatureExtractionError):
+            errors[model_name] = str(result)
+        elif isinstance(result, Exception):
+            errors[model_name] = f"Prediction failed: {result!r}"
+    out = [cached[m, f.id] for m, f in pairs if (m, f.id) in cached]
+    return out, errors
+
+
+async def predict_ensemble(
+    model_names: List[str], fileinfo: schemas.FileInfo
+) -> Tuple[List[schemas.Prediction], Dict[str, str]]:
+    """
+    Predicts a file with many models, from one feature extraction, all models at once.
+
+    Returns the predictions and {model: reason} of models that could not predict.
+    Feature extraction errors and `PoolBusyError` are raised.
+    """
+    fileinfo = await with_digest(fileinfo)
+    cached = {m: _get_cached_prediction(m, fileinfo) for m in model_names}
+    missing = [m for m, prediction in cached.items() if prediction is None]
+    if missing:
+        data = await extract_features(fileinfo)
+
+    async def predict_one(model_name: str) -> schemas.Prediction:
+        predictions = await predict_model(model_name, data)
+        prediction = _to_prediction(model_name, fileinfo, predictions.loc[0])
+        _put_cached_prediction(prediction, fileinfo)
+        return prediction
+
+    results = await asyncio.gather(*map(predict_one, missing), return_exceptions=True)
+    errors = {}
+    for model_name, result in zip(missing, results):
+        if isinstance(result, PoolBusyError):
+            raise result
+        elif isinstance(result, BadModelError):
+            errors[model_name] = "Model failed to load"
+        elif isinstance(result, PoolTimeoutError):
+            errors[model_name] = "Prediction timed out"
+        elif isinstance(result, Exception):
+            errors[model_name] = f"Prediction failed: {result!r}"
+        else:
+            cached[model_name] = result
+    return [p for p in cached.values() if p is not None], errors
+
+
+def aggregate(predictions: List[schemas.Prediction]) -> List[schemas.EnsembleAggregate]:
+    """Mean label of the regression models, label with the most votes weighted by score of the classifiers."""
+    by_task: Dict[schemas.ModelTask, List[schemas.Prediction]] = {}
+    for prediction in predictions:
+        by_task.setdefault(get_registry().get(prediction.model).task, []).append(prediction)
+    out = []
+    for task, group in by_task.items():
+        models = [p.model for p in group]
+        if task == "regression":
+            label = sum(p.label for p in group) / len(group)
+            out.append(schemas.EnsembleAggregate(task=task, method="mean", label=label, models=models))
+        else:
+            votes: Dict[Union[int, float], float] = {}
+            for p in group:
+                votes[p.label] = votes.get(p.label, 0) + (1 if p.score is None else p.score)
+            label = max(votes, key=votes.get)
+            score = votes[label] / sum(votes.values())
+            out.append(
+                schemas.EnsembleAggregate(task=task, method="weighted_vote", label=label, score=score, models=models)
+            )
+    return out
+
+
+readiness = schemas.Readiness(ready=False, models=[])
+
+
+async def preload() -> None:
+    """
+    Starts the worker processes, which load and dry-run every model, and collects their load times in `readiness`.
+    """
+    global readiness
+    if not settings.MODEL_PRELOAD:
+        readiness = schemas.Readiness(ready=True, models=[])
+        return
+    # one job per process starts the workers, but a fast worker may take two of them and leave another idle;
+    # readiness rests on the pool initializer instead: a worker runs `_preload_models` before any job,
+    # so every report, and every later prediction, comes from a worker that has loaded the models
+    reports = await asyncio.gather(
+        *(pool.run(_get_model_status, timeout=settings.MODEL_PRELOAD_TIMEOUT) for _ in range(pool.processes)),
+        return_exceptions=True,
+    )
+    for report in reports:
+        if isinstance(report, Exception):
+            print(f"Preloading models failed: {report!r}")
+    reports = [report for report in reports if not isinstance(report, Exception)]
+    models = [schemas.ModelStatus(**status) for status in reports[0]] if reports else []
+    # a model that failed would answer its requests with errors, it is listed with the reason
+    readiness = schemas.Readiness(ready=bool(reports) and all(m.loaded for m in models), models=models)
+    get_registry().set_load_seconds({m.id: m.load_seconds for m in models if m.loaded})
+
+
+if settings.MODEL_PRELOAD:
+    pool.set_initializer(_preload_models, get_registry().ids())
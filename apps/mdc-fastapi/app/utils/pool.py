@@ -0,0 +1,110 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional, Tuple
+
+from app.core.config import settings
+from app.utils import metrics
+
+
+class PoolBusyError(Exception):
+    """The pool already has as many jobs as it accepts, try again later."""
+
+
+class PoolTimeoutError(Exception):
+    """A job did not finish in time."""
+
+
+class WorkerPool:
+    """
+    Process pool for CPU bound work (music21 parsing, pycaret inference), so it does not block the event loop.
+
+    At most `processes + queue_size` jobs are accepted at once, further jobs are rejected with `PoolBusyError`.
+    A job counts until its process is done with it, even after its caller gave up with `PoolTimeoutError`.
+    Metrics recorded by a job (see `app.utils.metrics`) are added to those of this process.
+    """
+
+    def __init__(self, processes: Optional[int], queue_size: int, timeout: float):
+        self.processes = processes or os.cpu_count() or 1
+        self.max_pending = self.processes + queue_size
+        self.timeout = timeout
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._initializer: Optional[Callable] = None
+        self._initargs: tuple = ()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.processes, initializer=self._initializer, initargs=self._initargs
+            )
+        return self._executor
+
+    def set_initializer(self, initializer: Optional[Callable], *initargs: Any) -> None:
+        """Sets a function every worker process runs once when it starts, e.g. to load models."""
+        if self._executor is not None:
+            raise RuntimeError("the worker processes have already been started")
+        self._initializer = initializer
+        self._initargs = initargs
+
+    def _discard(self, executor: ProcessPoolExecutor) -> None:
+        """Drops a broken pool, unless another job already replaced it, so the next job starts a new one."""
+        if self._executor is executor:
+            self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, fn: Callable, *args: Any) -> Tuple[ProcessPoolExecutor, Future]:
+        executor = self.executor
+        try:
+            return executor, executor.submit(metrics.call_recorded, fn, *args)
+        except BrokenProcessPool:
+            # a worker died while the pool was idle, once on a new pool
+            self._discard(executor)
+            executor = self.executor
+            return executor, executor.submit(metrics.call_recorded, fn, *args)
+
+    def _release(self, _) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, fn: Callable, *args: Any, timeout: Optional[float] = None) -> Any:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise PoolBusyError
+            self._pending += 1
+        try:
+            executor, future = self._submit(fn, *args)
+        except BaseException:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        try:
+            result, recorded = await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.timeout)
+        except metrics.RecordedError as e:
+            metrics.replay(e.recorded)
+            raise e.error from None
+        except asyncio.TimeoutError:
+            raise PoolTimeoutError from None
+        except BrokenProcessPool:
+            # a worker died (e.g. out of memory), the next job starts a new pool
+            self._discard(executor)
+            raise
+        # the worker's timings and counts
+        metrics.replay(recorded)
+        return result
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+pool = WorkerPool(settings.WORKER_PROCESSES, settings.WORKER_QUEUE_SIZE, settings.WORKER_TIMEOUT)
@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app import schemas
+
+MANIFEST_NAME = "manifest.json"
+
+_families = {
+    "rf": "Random Forest",
+    "et": "Extra Trees",
+    "gbr": "Gradient Boosting",
+    "xgb": "Extreme Gradient Boosting",
+    "catboost": "CatBoost",
+}
+
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        while chunk := f.read(1 << 16):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _describe(path: Path) -> schemas.ModelEntry:
+    """Entry for a model missing from the manifest, guessed from its name (e.g. rf_mdc_reg_v1)."""
+    parts = path.stem.split("_")
+    task = "regression" if "reg" in parts else "classification"
+    words = [_families[part] for part in parts if part in _families][:1]
+    words.append("Regressor" if task == "regression" else "Classifier")
+    words.extend(part for part in parts if part.startswith("v") and part[1:].isdigit())
+    return schemas.ModelEntry(
+        id=path.stem,
+        description=" ".join(words),
+        task=task,
+        # models trained on mdc.csv (musescore features) are named with "mdc"
+        feature_set="musescore" if "mdc" in parts else "music21",
+        sha256=_sha256(path),
+        size=path.stat().st_size,
+    )
+
+
+class ModelRegistry:
+    """
+    Models in `models_dir`, described by its manifest.json: task, features, column order, hash and load cost.
+
+    Read once; models without an entry are added with what their name suggests and the manifest is saved,
+    so it can be corrected by hand. An entry whose file changed keeps its description and task,
+    but not its hash, columns and load cost.
+    """
+
+    def __init__(self, models_dir: Path):
+        self.models_dir = models_dir
+        self.path = models_dir / MANIFEST_NAME
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # one writer of the manifest at a time
+        self._entries: Dict[str, schemas.ModelEntry] = {}
+        self.etag = ""
+        self.load()
+
+    def load(self) -> None:
+        manifest = {}
+        if self.path.is_file():
+            manifest = {e["id"]: e for e in json.loads(self.path.read_text(encoding="utf-8"))["models"]}
+        entries = {}
+        changed = False
+        for path in sorted(self.models_dir.glob("*.pkl")):
+            entry = manifest.get(path.stem)
+            if entry is None:
+                entries[path.stem] = _describe(path)
+                changed = True
+                continue
+            entry = schemas.ModelEntry(**entry)
+            sha256 = _sha256(path)
+            if entry.sha256 != sha256:
+                entry = entry.copy(update=dict(sha256=sha256, size=path.stat().st_size, columns=None, load_seconds=None))
+                changed = True
+            entries[path.stem] = entry
+        changed = changed or entries.keys() != manifest.keys()
+        with self._lock:
+            self._entries = entries
+            self._update_etag()
+        if changed:
+            self.save()
+
+    def _update_etag(self) -> None:
+        infos = [schemas.ModelInfo(**e.dict()).dict() for e in self._entries.values()]
+        self.etag = hashlib.sha256(json.dumps(infos, sort_keys=True).encode()).hexdigest()[:32]
+
+    def save(self) -> None:
+        # entries are read under the save lock, so the last write has the latest ones;
+        # a temporary file of its own keeps processes sharing `models_dir` from writing into each other's
+        with self._save_lock:
+            with self._lock:
+                models = [e.dict() for e in self._entries.values()]
+            tmp = tempfile.NamedTemporaryFile(
+                "w", dir=self.models_dir, prefix=f"{MANIFEST_NAME}.", suffix=".tmp", delete=False, encoding="utf-8"
+            )
+            try:
+                with tmp:
+                    tmp.write(json.dumps({"models": models}, indent=2) + "\n")
+                os.replace(tmp.name, self.path)
+            except BaseException:
+                os.unlink(tmp.name)
+                raise
+
+    def __contains__(self, model_name: str) -> bool:
+        return model_name in self._entries
+
+    def get(self, model_name: str) -> Optional[schemas.ModelEntry]:
+        return self._entries.get(model_name)
+
+    def ids(self) -> List[str]:
+        return list(self._entries)
+
+    def entries(self) -> List[schemas.ModelEntry]:
+        return list(self._entries.values())
+
+    def set_load_seconds(self, load_seconds: Dict[str, float]) -> None:
+        """Records measured load times, e.g. from preloading, and saves the manifest if they changed much."""
+        with self._lock:
+            changed = False
+            for model_name, seconds in load_seconds.items():
+                entry = self._entries.get(model_name)
+                if entry is None:
+                    continue
+                # measurements vary, rewriting the manifest for small differences is not worth it
+                if entry.load_seconds is None or abs(seconds - entry.load_seconds) > 0.25 * entry.load_seconds:
+                    self._entries[model_name] = entry.copy(update=dict(load_seconds=round(seconds, 3)))
+                    changed = True
+            if changed:
+                self._update_etag()
+        if changed:
+            self.save()
@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+os.environ.setdefault("PROJECT_NAME", "mdc")
+
+from app.utils import model
+from app.utils.cache import LRUCache
+
+
+class LRUCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.disk_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.disk_dir)
+
+    def files(self) -> int:
+        return len(list(self.disk_dir.glob("*.pkl")))
+
+    def test_memory(self):
+        cache = LRUCache("test", 2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+        self.assertEqual((cache.get("a"), cache.get("b"), cache.get("c")), (1, None, 3))
+
+    def test_disk(self):
+        LRUCache("test", 1, self.disk_dir).put("a", 1)
+        # e.g. after a restart
+        cache = LRUCache("test", 1, self.disk_dir)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.disk_hits, 1)
+
+    def test_disk_eviction(self):
+        cache = LRUCache("test", 1, self.disk_dir, disk_maxsize=10)
+        for i in range(10):
+            cache.put(str(i), i)
+            # modification times far enough apart to order them
+            past = time.time() - 100 + i
+            os.utime(cache._path(str(i)), (past, past))
+        self.assertEqual(self.files(), 10)
+        # read, so no longer the least recently used
+        cache._data.clear()
+        self.assertEqual(cache.get("0"), 0)
+
+        cache.put("10", 10)
+        self.assertEqual(self.files(), 9)
+        cache._data.clear()
+        self.assertEqual(cache.get("0"), 0)
+        self.assertIsNone(cache.get("1"))
+        self.assertIsNone(cache.get("2"))
+        self.assertEqual(cache.get("10"), 10)
+
+    def test_disk_eviction_on_open(self):
+        cache = LRUCache("test", 1, self.disk_dir)
+        for i in range(5):
+            cache.put(str(i), i)
+        LRUCache("test", 1, self.disk_dir, disk_maxsize=3)
+        self.assertLessEqual(self.files(), 3)
+
+
+class FeatureKeyTestCase(unittest.TestCase):
+    def test_musescore_code_changed(self):
+        key = model._feature_key("0" * 64, "musescore")
+        self.assertEqual(key, model._feature_key("0" * 64, "musescore"))
+        with mock.patch.object(model, "_get_musescore_version_stamp", return_value="other"):
+            self.assertNotEqual(model._feature_key("0" * 64, "musescore"), key)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,164 @@
+import os
+import unittest
+from functools import partial
+from unittest import mock
+
+os.environ.setdefault("PROJECT_NAME", "mdc")
+
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.linear_model import LinearRegression, LogisticRegression
+from sklearn.pipeline import Pipeline
+
+from app.utils import compiled, model
+
+
+class Select(BaseEstimator, TransformerMixin):
+    """Selects and orders columns, as pycaret's type inference does for numeric input."""
+
+    def __init__(self, columns, replacement=None):
+        self.columns = columns
+        self.replacement = replacement  # {label: encoded} of the target, as pycaret keeps it
+
+    def fit(self, X, y=None):
+        return self
+
+    def transform(self, X):
+        return X[self.columns]
+
+
+class Scale(BaseEstimator, TransformerMixin):
+    def fit(self, X, y=None):
+        return self
+
+    def transform(self, X):
+        return X * 2
+
+
+def get_data(n: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(rng.uniform(0, 10, size=(n, 4)), columns=["a", "b", "c", "d"])
+
+
+def predict_regression(pipeline: Pipeline, data: pd.DataFrame) -> pd.DataFrame:
+    """What `predict_model` returns for a regressor: the input and the rounded Label."""
+    return data.assign(Label=np.round(pipeline.predict(data), compiled.ROUND))
+
+
+def predict_classification(pipeline: Pipeline, labels: dict, data: pd.DataFrame) -> pd.DataFrame:
+    proba = pipeline.predict_proba(data)
+    classes = [labels[c] for c in pipeline.classes_[proba.argmax(axis=1)]]
+    return data.assign(Label=classes, Score=np.round(proba.max(axis=1), compiled.ROUND))
+
+
+class CompileModelTestCase(unittest.TestCase):
+    def setUp(self):
+        self.train = get_data(50)
+        self.sample = get_data(20, seed=1)
+        self.data = get_data(10, seed=2)
+        self.y = self.train["c"] * 3 - self.train["a"]
+
+    def fit_regressor(self, *steps) -> Pipeline:
+        pipeline = Pipeline([*((f"step{i}", s) for i, s in enumerate(steps)), ("model", LinearRegression())])
+        return pipeline.fit(self.train, self.y)
+
+    def assert_parity(self, result: compiled.CompiledModel, reference) -> None:
+        expected = reference(self.data)
+        actual = result.predict(self.data)
+        self.assertEqual(list(actual.columns), [c for c in ["Label", "Score"] if c in expected.columns])
+        for column in actual.columns:
+            self.assertEqual(list(actual[column]), list(expected[column]))
+
+    def test_select(self):
+        pipeline = self.fit_regressor(Select(["c", "a"]))
+        reference = partial(predict_regression, pipeline)
+        result = compiled.compile_model(pipeline, "regression", reference, self.sample)
+        self.assertEqual(result.kind, "select")
+        self.assertEqual(result.columns, ["c", "a"])
+        self.assert_parity(result, reference)
+
+    def test_pipeline(self):
+        # the step changes values, so it is run
+        pipeline = self.fit_regressor(Select(["c", "a"]), Scale())
+        reference = partial(predict_regression, pipeline)
+        result = compiled.compile_model(pipeline, "regression", reference, self.sample)
+        self.assertEqual(result.kind, "pipeline")
+        self.assert_parity(result, reference)
+
+    def test_classification(self):
+        labels = {0: "easy", 1: "hard"}
+        y = (self.y > self.y.median()).astype(int)
+        select = Select(["a", "b", "c", "d"], replacement={label: encoded for encoded, label in labels.items()})
+        pipeline = Pipeline([("select", select), ("model", LogisticRegression())]).fit(self.train, y)
+        reference = partial(predict_classification, pipeline, labels)
+        result = compiled.compile_model(pipeline, "classification", reference, self.sample)
+        self.assertEqual(result.kind, "select")
+        self.assertEqual(result.labels, labels)
+        self.assert_parity(result, reference)
+
+    def test_mismatch(self):
+        # e.g. predict_model transforms the target back, which the estimator does not
+        pipeline = self.fit_regressor(Select(["c", "a"]))
+
+        def reference(data):
+            return predict_regression(pipeline, data).assign(Label=lambda df: np.exp(df["Label"]))
+
+        self.assertIsNone(compiled.compile_model(pipeline, "regression", reference, self.sample))
+
+    def test_not_a_pipeline(self):
+        estimator = LinearRegression().fit(self.train, self.y)
+        self.assertIsNone(compiled.compile_model(estimator, "regression", None, self.sample))
+
+
+class PredictModelTestCase(unittest.TestCase):
+    """`model._predict_model` uses the compiled model if there is one, else `predict_model`."""
+
+    def setUp(self):
+        train = get_data(50)
+        self.pipeline = Pipeline([("select", Select(["c", "a"])), ("model", LinearRegression())])
+        self.pipeline.fit(train, train["c"] * 3 - train["a"])
+        self.data = get_data(10, seed=2)
+        self.pycaret = mock.Mock()
+        self.pycaret.predict_model.side_effect = predict_regression
+        registry = mock.Mock()
+        registry.get.return_value.columns = None
+        registry.get.return_value.task = "regression"
+        for target, value in [
+            ("get_model", mock.Mock(return_value=self.pipeline)),
+            ("get_registry", mock.Mock(return_value=registry)),
+            ("_get_pycaret", mock.Mock(return_value=self.pycaret)),
+            ("_compiled", {}),
+            ("_get_parity_sample", mock.Mock(return_value=get_data(20, seed=1))),
+        ]:
+            self.enterContext(mock.patch.object(model, target, value))
+
+    def test_compiled(self):
+        reference = partial(predict_regression, self.pipeline)
+        model._compiled["m"] = compiled.compile_model(self.pipeline, "regression", reference, get_data(20, seed=1))
+        result = model._predict_model("m", self.data)
+        self.pycaret.predict_model.assert_not_called()
+        self.assertEqual(list(result["Label"]), list(reference(self.data)["Label"]))
+
+    def test_compile_model(self):
+        model._compiled["m"] = model._compile_model("m", self.pipeline)
+        self.assertEqual(model._compiled["m"].kind, "select")
+        self.pycaret.predict_model.reset_mock()
+        model._predict_model("m", self.data)
+        self.pycaret.predict_model.assert_not_called()
+
+    def test_mismatch_falls_back(self):
+        def predict_model(pipeline, data):
+            return predict_regression(pipeline, data).assign(Label=lambda df: np.exp(df["Label"]))
+
+        self.pycaret.predict_model.side_effect = predict_model
+        model._compiled["m"] = model._compile_model("m", self.pipeline)
+        self.assertIsNone(model._compiled["m"])
+        self.pycaret.predict_model.reset_mock()
+        result = model._predict_model("m", self.data)
+        self.pycaret.predict_model.assert_called_once()
+        self.assertEqual(list(result["Label"]), list(predict_model(self.pipeline, self.data)["Label"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
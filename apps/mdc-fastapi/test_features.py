@@ -0,0 +1,73 @@
+import math
+import os
+import unittest
+from pathlib import Path
+
+os.environ.setdefault("PROJECT_NAME", "mdc")
+
+from music21 import corpus
+
+from app.core.config import settings
+from app.utils import model
+
+REPO = Path(__file__).resolve().parent.parent.parent
+
+# music21's corpus, and tiny scores for the cases it lacks
+SAMPLE_CORPUS = [
+    "bach/bwv66.6",
+    "bach/bwv324.xml",
+    "bach/bwv7.7",
+    "bach/bwv57.8",
+    "beethoven/opus18no1/movement3.mxl",
+    "mozart/k80/movement2.mxl",
+    "schumann_clara/opus17/movement3.xml",
+]
+TINY_SCORES = [
+    model.DRY_RUN_SOURCE,
+    "tinyNotation: 3/4 r2.",  # no notes
+    "tinyNotation: 6/8 c8 d e f4. 5/8 g4 a4. 6/8 c'4. c'4.",  # compound, changes of meter
+    "tinyNotation: 3/4 c4~ c4 c4 d2 e-4 e-4",  # ties, equally common pitches
+    "tinyNotation: 5/4 C,,,4 c''''4 f#4 g-4 b#4",  # very low and high, enharmonics
+]
+
+
+def extract_features(source, vectorized: bool):
+    previous, settings.FEATURE_VECTORIZED = settings.FEATURE_VECTORIZED, vectorized
+    try:
+        return model._extract_features(source)
+    finally:
+        settings.FEATURE_VECTORIZED = previous
+
+
+class VectorizedFeaturesTestCase(unittest.TestCase):
+    def help_test(self, source):
+        expected = extract_features(source, vectorized=False)
+        actual = extract_features(source, vectorized=True)
+        self.assertEqual(list(actual.columns), list(expected.columns))
+        for column in expected.columns:
+            e, a = expected.at[0, column], actual.at[0, column]
+            if isinstance(e, str):
+                self.assertEqual(a, e, column)
+            else:
+                # the primary register is a float mean, music21 computes it exactly
+                self.assertTrue(math.isclose(a, e, rel_tol=0, abs_tol=1e-9), f"{column}: {a} != {e}")
+
+    def test_tiny_scores(self):
+        for source in TINY_SCORES:
+            with self.subTest(source=source):
+                self.help_test(source)
+
+    def test_corpus(self):
+        for work in SAMPLE_CORPUS:
+            with self.subTest(work=work):
+                self.help_test(corpus.getWork(work))
+
+    def test_henle(self):
+        # the Henle dataset scores, if downloaded
+        for path in sorted(REPO.glob("assets/**/*.mxl"))[:20]:
+            with self.subTest(path=path.name):
+                self.help_test(path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+os.environ.setdefault("PROJECT_NAME", "mdc")
+
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.main import app
+from app.utils import file
+
+
+class FilesTestCase(unittest.TestCase):
+    def setUp(self):
+        # uploads in a directory of their own
+        data_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, data_dir)
+        previous = settings.DATA_PATH, settings.UPLOAD_MAX_BYTES, file._index
+        settings.DATA_PATH = str(data_dir)
+
+        def restore():
+            settings.DATA_PATH, settings.UPLOAD_MAX_BYTES, file._index = previous
+
+        self.addCleanup(restore)
+        file._index = None
+        self.client = TestClient(app)
+
+    def upload(self, filename: str, content: bytes):
+        return self.client.post(f"{settings.API_V1_STR}/files/", files={"file": (filename, content)})
+
+
+class UploadTestCase(FilesTestCase):
+    def test_too_large(self):
+        settings.UPLOAD_MAX_BYTES = 4
+        response = self.upload("big.mscx", b"0123456789")
+        self.assertEqual(response.status_code, 413, response.text)
+        # the reservation is released, not left for the next startup
+        rows = file.get_index()._conn.execute("SELECT id FROM uploads").fetchall()
+        self.assertEqual(rows, [])
+        self.assertEqual(list(settings.UPLOAD_DIR.glob("*")), [])
+
+
+class DownloadTestCase(FilesTestCase):
+    content = bytes(range(100))
+
+    def setUp(self):
+        super().setUp()
+        response = self.upload("score.mscz", self.content)
+        self.assertEqual(response.status_code, 200, response.text)
+        self.url = f"{settings.API_V1_STR}/files/{response.json()['id']}"
+        self.etag = self.client.get(self.url).headers["ETag"]
+
+    def get(self, **headers):
+        return self.client.get(self.url, headers=headers)
+
+    def assert_partial(self, response, first: int, last: int):
+        self.assertEqual(response.status_code, 206, response.text)
+        self.assertEqual(response.headers["Content-Range"], f"bytes {first}-{last}/{len(self.content)}")
+        self.assertEqual(response.headers["Content-Length"], str(last - first + 1))
+        self.assertEqual(response.content, self.content[first : last + 1])
+
+    def test_whole(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, self.content)
+        self.assertEqual(response.headers["Accept-Ranges"], "bytes")
+        self.assertNotIn("Content-Range", response.headers)
+
+    def test_range(self):
+        self.assert_partial(self.get(Range="bytes=10-19"), 10, 19)
+        # past the end is cut at the end
+        self.assert_partial(self.get(Range="bytes=90-200"), 90, 99)
+
+    def test_suffix_range(self):
+        self.assert_partial(self.get(Range="bytes=-10"), 90, 99)
+        self.assert_partial(self.get(Range="bytes=-1000"), 0, 99)
+
+    def test_open_ended_range(self):
+        self.assert_partial(self.get(Range="bytes=95-"), 95, 99)
+
+    def test_unsatisfiable_range(self):
+        for range_ in ["bytes=100-", "bytes=20-10", "bytes=-0", "bytes=a-b"]:
+            with self.subTest(range=range_):
+                response = self.get(Range=range_)
+                self.assertEqual(response.status_code, 416)
+                self.assertEqual(response.headers["Content-Range"], "bytes */100")
+
+    def test_multiple_ranges(self):
+        # not supported, the whole file is sent
+        self.assertEqual(self.get(Range="bytes=0-1,5-6").status_code, 200)
+
+    def test_if_range(self):
+        self.assert_partial(self.get(Range="bytes=0-9", **{"If-Range": self.etag}), 0, 9)
+        # the file changed since the client got its first part
+        response = self.get(Range="bytes=0-9", **{"If-Range": '"other"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, self.content)
+
+    def test_if_none_match(self):
+        response = self.get(**{"If-None-Match": self.etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["ETag"], self.etag)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(self.get(**{"If-None-Match": '"other"'}).status_code, 200)
+
+    def test_not_found(self):
+        self.assertEqual(self.client.get(f"{settings.API_V1_STR}/files/missing").status_code, 404)
+
+
+class ParseRangeTestCase(unittest.TestCase):
+    def test_parse_range(self):
+        cases = {
+            "bytes=0-0": (0, 0),
+            "bytes=0-": (0, 9),
+            "bytes= 2-5": (2, 5),
+            "bytes=5-100": (5, 9),
+            "bytes=-3": (7, 9),
+            "bytes=-30": (0, 9),
+            "bytes=0-1,3-4": None,
+            "items=0-1": None,
+        }
+        for header, expected in cases.items():
+            with self.subTest(header=header):
+                self.assertEqual(file.parse_range(header, 10), expected)
+
+    def test_unsatisfiable(self):
+        for header, size in [("bytes=10-", 10), ("bytes=3-2", 10), ("bytes=-0", 10), ("bytes=-1", 0), ("bytes=x-", 10)]:
+            with self.subTest(header=header, size=size), self.assertRaises(ValueError):
+                file.parse_range(header, size)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+os.environ.setdefault("PROJECT_NAME", "mdc")
+
+from app import schemas
+from app.core.config import settings
+from app.utils import jobs, model
+
+
+class JobQueueTestCase(unittest.TestCase):
+    def setUp(self):
+        data_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, data_dir)
+        self.path = data_dir / "jobs.sqlite3"
+        self.queue = self.open()
+
+    def open(self) -> jobs.JobQueue:
+        return jobs.JobQueue(self.path, retention=60, stale_after=60)
+
+    def test_priority_then_fifo(self):
+        ids = [self.queue.submit("m", f"f{i}", priority).id for i, priority in enumerate([0, 1, 0, 1])]
+        claimed = [self.queue.claim().id for _ in ids]
+        self.assertEqual(claimed, [ids[1], ids[3], ids[0], ids[2]])
+        self.assertIsNone(self.queue.claim())
+
+    def test_claimed_once(self):
+        # another server process on the same file
+        other = self.open()
+        self.queue.submit("m", "f")
+        job = other.claim()
+        self.assertEqual(job.status, "running")
+        self.assertIsNone(self.queue.claim())
+
+    def test_requeue_after_restart(self):
+        stale = self.queue.submit("m", "f1").id
+        running = self.queue.submit("m", "f2").id
+        self.queue.claim()
+        self.queue.claim()
+        self.queue._conn.execute("UPDATE jobs SET started = ? WHERE id = ?", (time.time() - 120, stale))
+        self.queue._conn.commit()
+
+        # a process starting while another one runs `running`
+        queue = self.open()
+        self.assertEqual(queue.get(stale).status, "queued")
+        self.assertIsNone(queue.get(stale).started)
+        self.assertEqual(queue.get(running).status, "running")
+        self.assertEqual(queue.claim().id, stale)
+
+    def test_retry(self):
+        id_ = self.queue.submit("m", "f").id
+        self.queue.claim()
+        self.assertTrue(self.queue.retry(id_, 2))
+        self.assertEqual(self.queue.get(id_).status, "queued")
+        self.queue.claim()
+        self.assertFalse(self.queue.retry(id_, 2))
+        self.assertEqual(self.queue.get(id_).status, "running")
+
+    def test_stats(self):
+        done, failed, _ = (self.queue.submit("m", f"f{i}").id for i in range(3))
+        self.queue.claim()
+        self.queue.finish(done, schemas.Prediction(model="m", input="f0", label=1))
+        self.queue.claim()
+        self.queue.fail(failed, "Prediction timed out")
+        stats = self.queue.stats()
+        self.assertEqual((stats.queued, stats.running, stats.done, stats.failed), (1, 0, 1, 1))
+        self.assertEqual(set(stats.wait_seconds), {"p50", "p90", "p99"})
+        self.assertTrue(all(seconds >= 0 for seconds in stats.run_seconds.values()))
+
+
+class RunTestCase(unittest.TestCase):
+    def setUp(self):
+        data_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, data_dir)
+        previous = jobs._queue, settings.WORKER_RETRY_AFTER, settings.JOB_MAX_ATTEMPTS
+        jobs._queue = jobs.JobQueue(data_dir / "jobs.sqlite3", retention=60, stale_after=60)
+        settings.WORKER_RETRY_AFTER, settings.JOB_MAX_ATTEMPTS = 0, 2
+
+        def restore():
+            jobs._queue, settings.WORKER_RETRY_AFTER, settings.JOB_MAX_ATTEMPTS = previous
+
+        self.addCleanup(restore)
+        fileinfo = schemas.FileInfo(id="f", filename="f.mscz")
+        self.enterContext(mock.patch.object(jobs.file, "retrieve_by_id", return_value=fileinfo))
+
+    def run_next(self) -> schemas.Job:
+        job = jobs._queue.claim()
+        asyncio.run(jobs._run(job))
+        return jobs._queue.get(job.id)
+
+    def test_model_fails_to_load(self):
+        id_ = jobs._queue.submit("m", "f").id
+        with mock.patch.object(model, "predict", side_effect=model.BadModelError):
+            self.assertEqual(self.run_next().status, "queued")
+            job = self.run_next()
+        self.assertEqual(job.id, id_)
+        self.assertEqual((job.status, job.error), ("failed", "Model failed to load"))
+
+    def test_done(self):
+        jobs._queue.submit("m", "f")
+        prediction = schemas.Prediction(model="m", input="f.mscz", label=2)
+        with mock.patch.object(model, "predict", return_value=prediction):
+            job = self.run_next()
+        self.assertEqual(job.status, "done")
+        self.assertEqual(job.result, prediction)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import asyncio
+import os
+import signal
+import time
+import unittest
+
+os.environ.setdefault("PROJECT_NAME", "mdc")
+
+from app.utils.pool import WorkerPool
+
+
+def square(x: int) -> int:
+    return x * x
+
+
+class WorkerPoolTestCase(unittest.TestCase):
+    def setUp(self):
+        self.pool = WorkerPool(1, 0, 10)
+        self.addCleanup(self.pool.shutdown)
+
+    def run_job(self, fn, *args):
+        return asyncio.run(self.pool.run(fn, *args))
+
+    def test_run(self):
+        self.assertEqual(self.run_job(square, 3), 9)
+        self.assertEqual(self.pool.pending, 0)
+
+    def test_worker_killed_while_idle(self):
+        pid = self.run_job(os.getpid)
+        broken = self.pool.executor
+        os.kill(pid, signal.SIGKILL)
+        # the executor notices the dead worker in a thread of its own
+        deadline = time.monotonic() + 10
+        while not broken._broken and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertTrue(broken._broken)
+
+        self.assertEqual(self.run_job(square, 4), 16)
+        self.assertIsNot(self.pool.executor, broken)
+        self.assertEqual(self.pool.pending, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+os.environ.setdefault("PROJECT_NAME", "mdc")
+
+from fastapi.testclient import TestClient
+
+from app import schemas
+from app.core.config import settings
+from app.main import app
+from app.utils import file, model
+from app.utils.pool import pool
+
+MODEL = "test_mdc_reg_v1"
+
+
+class CorruptUploadTestCase(unittest.TestCase):
+    def setUp(self):
+        # uploads and the model registry in a directory of their own
+        data_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, data_dir)
+        (data_dir / "models").mkdir()
+        previous = settings.DATA_PATH, model._registry, file._index
+        settings.DATA_PATH = str(data_dir)
+
+        def restore():
+            settings.DATA_PATH, model._registry, file._index = previous
+
+        self.addCleanup(restore)
+        model._registry = file._index = None
+        # a musescore model to predict with, it is not loaded as extraction fails first
+        model.get_registry()._entries[MODEL] = schemas.ModelEntry(
+            id=MODEL, description="Test Regressor", task="regression", feature_set="musescore", sha256="0", size=0
+        )
+        # worker processes without preloading, which needs pycaret
+        pool.shutdown()
+        pool.set_initializer(None)
+        self.addCleanup(pool.shutdown)
+        self.client = TestClient(app)
+
+    def upload(self, filename: str, content: bytes) -> str:
+        response = self.client.post(f"{settings.API_V1_STR}/files/", files={"file": (filename, content)})
+        self.assertEqual(response.status_code, 200, response.text)
+        return response.json()["id"]
+
+    def predict(self, id_: str):
+        return self.client.get(f"{settings.API_V1_STR}/predict/", params={"model": MODEL, "id": id_})
+
+    def test_not_a_zip(self):
+        response = self.predict(self.upload("g.mscz", b"garbage"))
+        self.assertEqual(response.status_code, 422, response.text)
+        self.assertEqual(response.json()["detail"], "Not a valid MuseScore file")
+
+    def test_malformed_xml(self):
+        response = self.predict(self.upload("g.mscx", b'<museScore version="3.01"><Score></museScore>'))
+        self.assertEqual(response.status_code, 422, response.text)
+        self.assertEqual(response.json()["detail"], "Not a valid MuseScore file")
+
+
+class ReadinessTestCase(unittest.TestCase):
+    def preload(self, statuses):
+        previous = settings.MODEL_PRELOAD, model.readiness
+        settings.MODEL_PRELOAD = True
+
+        def restore():
+            settings.MODEL_PRELOAD, model.readiness = previous
+
+        self.addCleanup(restore)
+        with mock.patch.object(pool, "run", mock.AsyncMock(return_value=statuses)), mock.patch.object(
+            model, "get_registry"
+        ):
+            asyncio.run(model.preload())
+        return model.readiness
+
+    def test_all_loaded(self):
+        readiness = self.preload([dict(id="a", loaded=True, resident=True), dict(id="b", loaded=True, resident=True)])
+        self.assertTrue(readiness.ready)
+
+    def test_one_failed(self):
+        readiness = self.preload(
+            [dict(id="a", loaded=True, resident=True), dict(id="b", loaded=False, resident=False, error="ValueError()")]
+        )
+        self.assertFalse(readiness.ready)
+        self.assertEqual([(m.id, m.error) for m in readiness.models], [("a", None), ("b", "ValueError()")])
+
+
+if __name__ == "__main__":
+    unittest.main()
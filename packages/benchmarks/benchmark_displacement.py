@@ -0,0 +1,58 @@
+import random
+import sys
+import timeit
+from pathlib import Path
+
+import numpy as np
+from attr import frozen
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from musescore import common
+
+
+@frozen
+class Note:
+    pitch: int
+
+
+@frozen
+class Chord:
+    notes: list[Note]
+
+
+def get_chords():
+    for _ in range(50_000):
+        yield Chord([Note(random.randint(21, 108)) for _ in range(random.randint(1, 5))])
+
+
+chords = list(get_chords())
+pitches = [n.pitch for c in chords for n in c.notes]
+columns = common.StaffColumns(
+    note_pitch=np.array(pitches, int),
+    note_accidental=np.zeros(len(pitches), bool),
+    chord_note_pitch=np.array(pitches, int),
+    chord_note_tie=np.zeros(len(pitches), bool),
+    chord_note_chord=np.array([i for i, c in enumerate(chords) for _ in c.notes], int),
+    chord_tick=np.arange(len(chords)),
+    chord_pulsation=np.ones(len(chords)),
+    stroke_tick=np.arange(len(chords)),
+    stroke_measure=np.zeros(len(chords), int),
+    num_measures=1,
+)
+assert common.get_hand_displacement_rate_from_list(chords) == common.get_hand_displacement_rate_from_np_array(columns)
+
+
+def per_pair():
+    return common.get_hand_displacement_rate_from_list(chords)
+
+
+def reduceat():
+    return common.get_hand_displacement_rate_from_np_array(columns)
+
+
+if __name__ == "__main__":
+    # chords 50,000, notes per chord <= 5, number 20
+    # per_pair() 2.272466758000064
+    # reduceat() 0.09196810400021604  ***
+    print("per_pair()", timeit.timeit("per_pair()", "from __main__ import per_pair", number=20))
+    print("reduceat()", timeit.timeit("reduceat()", "from __main__ import reduceat", number=20))
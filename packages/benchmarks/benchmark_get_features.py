@@ -0,0 +1,156 @@
+import random
+import sys
+import timeit
+from pathlib import Path
+
+import numpy as np
+from bs4 import BeautifulSoup
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from musescore import common, v3
+from musescore.features import Features
+from utils.math import get_entropy
+
+
+def get_measure(num_chords: int) -> str:
+    """Two voices of `num_chords` 16th note chords of 1 to 4 notes, some with accidentals and ties."""
+    voices = []
+    for _ in range(2):
+        chords = []
+        for _ in range(num_chords):
+            notes = "".join(
+                f"<Note><pitch>{p}</pitch><tpc>14</tpc>"
+                + ("<Accidental><subtype>accidentalSharp</subtype></Accidental>" if p % 7 == 0 else "")
+                + (f'<Tie id="{p}"/>' if p % 11 == 0 else "")
+                + "</Note>"
+                for p in random.sample(range(21, 109), random.randint(1, 4))
+            )
+            chords.append(f"<Chord><durationType>16th</durationType>{notes}</Chord>")
+        voices.append(f"<voice>{''.join(chords)}</voice>")
+    return "".join(voices)
+
+
+def get_score(num_measures: int, num_chords: int) -> v3.MuseScore:
+    """A two staff piano score."""
+    tempo = "<Tempo><tempo>2</tempo><text>= 120</text></Tempo>"
+    time_sig = "<TimeSig><sigN>4</sigN><sigD>4</sigD></TimeSig>"
+    staffs = []
+    for id_ in (1, 2):
+        first = f"<Measure><voice>{time_sig}{tempo if id_ == 1 else ''}</voice>{get_measure(num_chords)}</Measure>"
+        rest = "".join(f"<Measure>{get_measure(num_chords)}</Measure>" for _ in range(num_measures - 1))
+        staffs.append(f'<Staff id="{id_}">{first}{rest}</Staff>')
+    soup = BeautifulSoup(
+        '<museScore version="3.01"><programVersion>3.0.5</programVersion><programRevision/><Score>'
+        "<Part><Staff id='1'/><Staff id='2'/><trackName>Piano</trackName>"
+        "<Instrument><trackName>Piano</trackName></Instrument></Part>"
+        f"{''.join(staffs)}</Score></museScore>",
+        "xml",
+    )
+    return v3.MuseScore.from_tag(soup.find("museScore"))
+
+
+class CountingList(list):
+    """Counts the passes over the list."""
+
+    passes = 0
+
+    def __iter__(self):
+        CountingList.passes += 1
+        return super().__iter__()
+
+
+score = get_score(200, 64)
+staffs = score.score.get_piano_staffs()
+for s in staffs:
+    s.measures = CountingList(s.measures)
+
+
+def previous_columns(staff) -> common.StaffColumns:
+    # previous implementation: one pass for the notes as written, one for the merged strokes
+    note_pitch = []
+    note_accidental = []
+    for note in staff.notes:
+        note_pitch.append(note.pitch)
+        note_accidental.append(note.accidental is not None)
+    chord_note_pitch, chord_note_tie, chord_note_chord, chord_tick, chord_pulsation = [], [], [], [], []
+    for measure in staff.measures:
+        for tick, stroke in measure.ticked_strokes:
+            if hasattr(stroke, "notes"):
+                i = len(chord_tick)
+                chord_tick.append(tick)
+                chord_pulsation.append(common.get_pulsation(stroke.durationType, stroke.dots))
+                for note in stroke.notes:
+                    chord_note_pitch.append(note.pitch)
+                    chord_note_tie.append(bool(note.tie))
+                    chord_note_chord.append(i)
+    empty = np.array([], int)
+    return common.StaffColumns(
+        np.array(note_pitch, int),
+        np.array(note_accidental, bool),
+        np.array(chord_note_pitch, int),
+        np.array(chord_note_tie, bool),
+        np.array(chord_note_chord, int),
+        np.array(chord_tick, int),
+        np.array(chord_pulsation, float),
+        empty,
+        empty,
+        0,
+    )
+
+
+def previous():
+    # previous implementation: insert(0, ...), a third pass for the distinct stroke rate on sets of ticks
+    for s in staffs:
+        s._columns = previous_columns(s)
+    avg_pitches, PS, HDR, PPR = [], [], [], []
+    for s in staffs:
+        avg_pitches.insert(0, s.get_average_pitch())
+        PS.insert(0, s.get_playing_speed())
+        HDR.insert(0, s.get_hand_displacement_rate())
+        PPR.insert(0, s.get_polyphony_rate())
+    avg_pitches = list(filter(lambda x: x is not None, avg_pitches))
+    HS = None if len(avg_pitches) != 2 else abs(avg_pitches[1] - avg_pitches[0])
+    pitches = np.concatenate([s.columns.note_pitch for s in staffs])
+    accidentals = np.concatenate([s.columns.note_accidental for s in staffs])
+    count = len(pitches)
+    PE = None if count == 0 else get_entropy(common.get_pitch_occurrences(pitches))
+    ANR = None if count == 0 else int(np.count_nonzero(accidentals)) / count
+    DSR = common.get_distinct_stroke_rate(*staffs)
+    return Features(PS=PS, PE=PE, DSR=DSR, HDR=HDR, HS=HS, PPR=PPR, ANR=ANR)
+
+
+def single_pass():
+    for s in staffs:
+        s._columns = None
+    return common.get_features(*staffs)
+
+
+def dsr_sets():
+    return common.get_distinct_stroke_rate(*staffs)
+
+
+def dsr_columns():
+    return common.get_distinct_stroke_rate_from_np_array([s.columns for s in staffs])
+
+
+def passes(fn) -> int:
+    CountingList.passes = 0
+    fn()
+    return CountingList.passes
+
+
+if __name__ == "__main__":
+    # 2 staffs, 200 measures, 2 voices of 64 chords each, number 20
+    # previous() 2.63359136400004        passes over the measures 6
+    # single_pass() 2.6756181410000863  passes over the measures 2
+    # dsr_sets() 0.10667873200009126
+    # dsr_columns() 0.012725213000067015  ***
+    # the notes are still visited twice, as written and merged into strokes, which is most of the time
+    assert previous() == single_pass()
+    print("previous()", timeit.timeit("previous()", "from __main__ import previous", number=20), end=" ")
+    print("passes over the measures", passes(previous))
+    print("single_pass()", timeit.timeit("single_pass()", "from __main__ import single_pass", number=20), end=" ")
+    print("passes over the measures", passes(single_pass))
+    assert dsr_sets() == dsr_columns()
+    print("dsr_sets()", timeit.timeit("dsr_sets()", "from __main__ import dsr_sets", number=20))
+    print("dsr_columns()", timeit.timeit("dsr_columns()", "from __main__ import dsr_columns", number=20))
@@ -0,0 +1,95 @@
+import io
+import random
+import sys
+import time
+import timeit
+from pathlib import Path
+
+from lxml import etree
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from musescore import common, stream
+
+
+def get_measure(num_chords: int) -> str:
+    """Two voices of `num_chords` 16th note chords of 1 to 4 notes, some with accidentals and ties."""
+    voices = []
+    for _ in range(2):
+        chords = []
+        for _ in range(num_chords):
+            notes = "".join(
+                f"<Note><pitch>{p}</pitch><tpc>14</tpc>"
+                + ("<Accidental><subtype>accidentalSharp</subtype></Accidental>" if p % 7 == 0 else "")
+                + (f'<Tie id="{p}"/>' if p % 11 == 0 else "")
+                + "</Note>"
+                for p in random.sample(range(21, 109), random.randint(1, 4))
+            )
+            chords.append(f"<Chord><durationType>16th</durationType>{notes}</Chord>")
+        voices.append(f"<voice>{''.join(chords)}</voice>")
+    return "".join(voices)
+
+
+def get_mscx(measures: list[list[str]]) -> bytes:
+    """A two staff piano score of the given measures of each staff."""
+    tempo = "<Tempo><tempo>2</tempo><text>= 120</text></Tempo>"
+    time_sig = "<TimeSig><sigN>4</sigN><sigD>4</sigD></TimeSig>"
+    staffs = []
+    for id_, staff in enumerate(measures, 1):
+        first = f"<Measure><voice>{time_sig}{tempo if id_ == 1 else ''}</voice>{staff[0]}</Measure>"
+        rest = "".join(f"<Measure>{m}</Measure>" for m in staff[1:])
+        staffs.append(f'<Staff id="{id_}">{first}{rest}</Staff>')
+    return (
+        '<museScore version="3.01"><programVersion>3.0.5</programVersion><programRevision/><Score>'
+        "<Part><Staff id='1'/><Staff id='2'/><trackName>Piano</trackName>"
+        "<Instrument><trackName>Piano</trackName></Instrument></Part>"
+        f"{''.join(staffs)}</Score></museScore>"
+    ).encode()
+
+
+random.seed(0)
+measures = [[get_measure(16) for _ in range(200)] for _ in range(2)]
+old = get_mscx(measures)
+# a few measures edited
+for staff in measures:
+    for i in random.sample(range(200), 4):
+        staff[i] = get_measure(16)
+new = get_mscx(measures)
+
+
+def parse(data: bytes):
+    return stream.parse(io.BytesIO(data))
+
+
+def digests() -> list[str]:
+    # what `Measure.from_tag` adds to the parsing
+    return [common.get_measure_digest(stream.LxmlTag(m)) for m in etree.fromstring(new).iter("Measure")]
+
+
+def features(incremental: bool) -> tuple[float, common.MeasureAggregates]:
+    """Seconds for the features of the new version, 5 times, with the aggregates of the old one if incremental."""
+    total = 0.0
+    for _ in range(5):
+        aggregates = common.MeasureAggregates()
+        aggregates.get_features(*parse(old).score.get_piano_staffs())
+        score = parse(new)
+        start = time.perf_counter()
+        score.get_features(aggregates if incremental else None)
+        total += time.perf_counter() - start
+    return total, aggregates
+
+
+if __name__ == "__main__":
+    # 2 staffs, 200 measures, 2 voices of 16 chords each, 4 measures of each staff edited, number 5
+    # parse(new) 14.372313752000082
+    # digests() 0.4775445010000112     digest of every measure, part of parse(new)
+    # full 0.8908105769996837
+    # incremental 0.06043751199831604  ***  computed 8 measures, reused 392
+    # parsing is most of the time, and is needed for the digests
+    aggregates = common.MeasureAggregates()
+    aggregates.get_features(*parse(old).score.get_piano_staffs())
+    assert parse(new).get_features() == parse(new).get_features(aggregates)
+    print("parse(new)", timeit.timeit("parse(new)", "from __main__ import parse, new", number=5))
+    print("digests()", timeit.timeit("digests()", "from __main__ import digests", number=5))
+    print("full", features(False)[0])
+    seconds, aggregates = features(True)
+    print("incremental", seconds, f"computed {aggregates.num_computed} measures, reused {aggregates.num_reused}")
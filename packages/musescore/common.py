@@ -1,10 +1,12 @@
+import hashlib
 from bisect import bisect_right
 from collections.abc import Iterable, Iterator, Sequence
 from functools import reduce
-from itertools import chain, islice, tee, zip_longest
+from itertools import islice, tee, zip_longest
 from typing import Optional
 
 import numpy as np
+from attr import frozen
 
 from musescore.features import Features, displacement_cost
 from musescore.proto import Chord, Measure, Note, Part, Staff, Tempo
@@ -14,38 +16,268 @@ from utils.math import get_entropy
 
 
 def get_features(*staffs: Staff) -> Features:
+    """Features of the staffs, computed from each staff's `StaffColumns`, which are built in one pass over it."""
+    columns = [staff.columns for staff in staffs]
     avg_pitches = []
     PS = []
     HDR = []
     PPR = []
-    for staff in staffs:
-        avg_pitches.insert(0, staff.get_average_pitch())
-        PS.insert(0, staff.get_playing_speed())
-        HDR.insert(0, staff.get_hand_displacement_rate())
-        PPR.insert(0, staff.get_polyphony_rate())
-    avg_pitches = list(filter(lambda x: x is not None, avg_pitches))
+    # the last staff comes first
+    for staff in reversed(staffs):
+        avg_pitches.append(staff.get_average_pitch())
+        PS.append(staff.get_playing_speed())
+        HDR.append(staff.get_hand_displacement_rate())
+        PPR.append(staff.get_polyphony_rate())
+    avg_pitches = [p for p in avg_pitches if p is not None]
     HS = None if len(avg_pitches) != 2 else abs(avg_pitches[1] - avg_pitches[0])
 
-    num_accidental_notes = 0
-    midi_num_occurrence = {}
-    count = 0
-    for note in chain.from_iterable([staff.notes for staff in staffs]):
-        # count midi numbers
-        if note.pitch in midi_num_occurrence:
-            midi_num_occurrence[note.pitch] += 1
+    pitches = np.concatenate([c.note_pitch for c in columns])
+    count = len(pitches)
+    PE = None if count == 0 else get_entropy(get_pitch_occurrences(pitches))
+    ANR = None if count == 0 else sum(c.num_accidentals for c in columns) / count
+
+    DSR = get_distinct_stroke_rate_from_np_array(columns)
+    return Features(PS=PS, PE=PE, DSR=DSR, HDR=HDR, HS=HS, PPR=PPR, ANR=ANR)
+
+
+@frozen
+class StaffColumns:
+    """Columnar (struct of arrays) view of the notes and chords of a Staff.
+
+    `note_*` has one entry per note of `Staff.notes`, i.e. as written in the score.
+    `chord_note_*` has one entry per note of `Staff.flattened_chords`, i.e. after voices were merged into strokes,
+    `chord_note_chord` is the index of the chord the note belongs to.
+    `chord_*` has one entry per chord of `Staff.flattened_chords`.
+    `stroke_*` has one entry per stroke (chord or rest) of `Staff.strokes`, `stroke_measure` is its measure index.
+    """
+
+    note_pitch: np.ndarray
+    note_accidental: np.ndarray
+    chord_note_pitch: np.ndarray
+    chord_note_tie: np.ndarray
+    chord_note_chord: np.ndarray
+    chord_tick: np.ndarray
+    chord_pulsation: np.ndarray
+    stroke_tick: np.ndarray
+    stroke_measure: np.ndarray
+    num_measures: int
+
+    @classmethod
+    def from_staff(cls, staff: Staff) -> "StaffColumns":
+        """Builds every column in one pass over the measures of the staff."""
+        return cls.from_measures(staff.measures)
+
+    @classmethod
+    def from_measures(cls, measures: Iterable[Measure]) -> "StaffColumns":
+        """Builds every column in one pass over the measures."""
+        note_pitch = []
+        note_accidental = []
+        chord_note_pitch = []
+        chord_note_tie = []
+        chord_note_chord = []
+        chord_tick = []
+        chord_pulsation = []
+        stroke_tick = []
+        stroke_measure = []
+        num_measures = 0
+        for m, measure in enumerate(measures):
+            num_measures += 1
+            notes = list(measure.notes)
+            note_pitch.extend([note.pitch for note in notes])
+            note_accidental.extend([note.accidental is not None for note in notes])
+            ticked_strokes = measure.ticked_strokes
+            stroke_tick.extend([tick for tick, _ in ticked_strokes])
+            stroke_measure.extend([m] * len(ticked_strokes))
+            for tick, stroke in ticked_strokes:
+                if hasattr(stroke, "notes"):  # isinstance(stroke, Chord)
+                    i = len(chord_tick)
+                    chord_tick.append(tick)
+                    chord_pulsation.append(get_pulsation(stroke.durationType, stroke.dots))
+                    for note in stroke.notes:
+                        chord_note_pitch.append(note.pitch)
+                        chord_note_tie.append(bool(note.tie))
+                        chord_note_chord.append(i)
+        return cls(
+            note_pitch=np.array(note_pitch, int),
+            note_accidental=np.array(note_accidental, bool),
+            chord_note_pitch=np.array(chord_note_pitch, int),
+            chord_note_tie=np.array(chord_note_tie, bool),
+            chord_note_chord=np.array(chord_note_chord, int),
+            chord_tick=np.array(chord_tick, int),
+            chord_pulsation=np.array(chord_pulsation, float),
+            stroke_tick=np.array(stroke_tick, int),
+            stroke_measure=np.array(stroke_measure, int),
+            num_measures=num_measures,
+        )
+
+    @property
+    def num_chords(self) -> int:
+        return len(self.chord_tick)
+
+    @property
+    def num_accidentals(self) -> int:
+        return int(np.count_nonzero(self.note_accidental))
+
+    @property
+    def chord_size(self) -> np.ndarray:
+        """Number of notes of each chord."""
+        return np.bincount(self.chord_note_chord, minlength=self.num_chords)
+
+    @property
+    def chord_num_tied(self) -> np.ndarray:
+        """Number of tied notes of each chord."""
+        return np.bincount(self.chord_note_chord[self.chord_note_tie], minlength=self.num_chords)
+
+
+def get_measure_digest(tag) -> str:
+    """Hash of the content of a <Measure> tag, not of its attributes (e.g. the measure number of v1 and v2)."""
+    h = hashlib.sha1()
+    for child in tag.children:
+        h.update(str(child).encode())
+    return h.hexdigest()
+
+
+@frozen
+class MeasureAggregate:
+    """Partial sums of the features over one measure of a staff, see `MeasureAggregates`.
+
+    Ticks are relative to the start of the measure, so the aggregate stays valid when measures before it
+    are added or removed. `first_chord` and `last_chord` are (lowest, highest pitch) of the chords at the
+    boundaries of the measure, for the hand displacement from and to the measures around it.
+    """
+
+    num_notes: int
+    pitch_sum: int
+    num_accidentals: int
+    pitch_occurrences: dict[int, int]
+    num_chords: int
+    first_chord: Optional[tuple[int, int]]
+    last_chord: Optional[tuple[int, int]]
+    displacement_cost: int
+    num_strokes: int
+    num_chord_strokes: int
+    chord_tick: np.ndarray
+    chord_pulsation: np.ndarray
+    pulsation_sum: float
+    stroke_tick: np.ndarray
+
+    @classmethod
+    def from_measure(cls, measure: Measure) -> "MeasureAggregate":
+        columns = StaffColumns.from_measures([measure])
+        first_chord = last_chord = None
+        displacement_cost = 0
+        if columns.num_chords:
+            lows, highs = get_chord_ranges(columns)
+            first_chord = int(lows[0]), int(highs[0])
+            last_chord = int(lows[-1]), int(highs[-1])
+            displacement_cost = int(get_displacement_costs(lows[:-1], highs[:-1], lows[1:], highs[1:]).sum())
+        num_strokes, num_chord_strokes = count_strokes(columns)
+        tick = measure.tick
+        return cls(
+            num_notes=len(columns.note_pitch),
+            pitch_sum=int(columns.note_pitch.sum()),
+            num_accidentals=columns.num_accidentals,
+            pitch_occurrences=get_pitch_occurrences(columns.note_pitch),
+            num_chords=columns.num_chords,
+            first_chord=first_chord,
+            last_chord=last_chord,
+            displacement_cost=displacement_cost,
+            num_strokes=num_strokes,
+            num_chord_strokes=num_chord_strokes,
+            chord_tick=columns.chord_tick - tick,
+            chord_pulsation=columns.chord_pulsation,
+            pulsation_sum=float(columns.chord_pulsation.sum()),
+            stroke_tick=columns.stroke_tick - tick,
+        )
+
+
+class MeasureAggregates:
+    """
+    The `MeasureAggregate` of every measure of the staffs last given to `get_features`, so the features of
+    the next version of the score (e.g. uploaded again after an edit) only need the changed measures computed.
+
+    Measures are looked up by `Measure.digest`, a hash of their content: measures moved by measures added
+    or removed before them are found, as are measures repeated within the score. Measures without
+    a digest (v1) are always computed.
+    """
+
+    def __init__(self):
+        self._aggregates: dict[str, MeasureAggregate] = {}
+        self.num_computed = 0
+        self.num_reused = 0
+
+    def get_features(self, *staffs: Staff) -> Features:
+        """Same as `get_features`. Only the aggregates of these staffs are kept for the next call."""
+        previous, self._aggregates = self._aggregates, {}
+        self.num_computed = self.num_reused = 0
+        aggregates = [[self._get(measure, previous) for measure in staff.measures] for staff in staffs]
+        return get_features_from_aggregates(staffs, aggregates)
+
+    def _get(self, measure: Measure, previous: dict[str, MeasureAggregate]) -> MeasureAggregate:
+        digest = getattr(measure, "digest", None)
+        if digest is None:
+            self.num_computed += 1
+            return MeasureAggregate.from_measure(measure)
+        aggregate = self._aggregates.get(digest)
+        if aggregate is None:
+            aggregate = previous.get(digest)
+        if aggregate is None:
+            self.num_computed += 1
+            aggregate = MeasureAggregate.from_measure(measure)
         else:
-            midi_num_occurrence[note.pitch] = 1
-        # count altered notes
-        if note.accidental is not None:
-            num_accidental_notes += 1
-        count += 1
-    PE = None if count == 0 else get_entropy(midi_num_occurrence)
-    ANR = None if count == 0 else num_accidental_notes / count
-
-    DSR = get_distinct_stroke_rate(*staffs)
+            self.num_reused += 1
+        self._aggregates[digest] = aggregate
+        return aggregate
+
+
+def get_features_from_aggregates(staffs: Sequence[Staff], aggregates: Sequence[Sequence[MeasureAggregate]]) -> Features:
+    """Same as `get_features`, combined from the aggregate of every measure of each staff."""
+    measure_ticks = [np.array([measure.tick for measure in staff.measures], int) for staff in staffs]
+    avg_pitches = []
+    PS = []
+    HDR = []
+    PPR = []
+    # the last staff comes first
+    for staff, ticks, measures in zip(reversed(staffs), reversed(measure_ticks), reversed(aggregates)):
+        num_notes = sum(a.num_notes for a in measures)
+        avg_pitches.append(np.float64(sum(a.pitch_sum for a in measures)) / num_notes if num_notes else None)
+        # the last tick as `Staff.get_playing_speed` has it, strokes of one measure are cheap to compute
+        last_tick = max(staff.measures[-1].stroke_ticks) if staff.parent.tempos else None
+        PS.append(get_playing_speed_from_aggregates(staff.parent.tempos, ticks, measures, last_tick))
+        HDR.append(get_hand_displacement_rate_from_aggregates(measures))
+        num_strokes = sum(a.num_strokes for a in measures)
+        PPR.append(sum(a.num_chord_strokes for a in measures) / num_strokes if num_strokes else None)
+    avg_pitches = [p for p in avg_pitches if p is not None]
+    HS = None if len(avg_pitches) != 2 else abs(avg_pitches[1] - avg_pitches[0])
+
+    # merged in the order of the notes, so the pitches are in order of first occurrence
+    occurrences: dict[int, int] = {}
+    for measures in aggregates:
+        for a in measures:
+            for pitch, n in a.pitch_occurrences.items():
+                occurrences[pitch] = occurrences.get(pitch, 0) + n
+    count = sum(occurrences.values())
+    PE = None if count == 0 else get_entropy(occurrences)
+    ANR = None if count == 0 else sum(a.num_accidentals for measures in aggregates for a in measures) / count
+
+    stroke_ticks = []
+    stroke_measures = []
+    for ticks, measures in zip(measure_ticks, aggregates):
+        num_strokes = [len(a.stroke_tick) for a in measures]
+        relative = np.concatenate([a.stroke_tick for a in measures]) if measures else np.empty(0, int)
+        stroke_ticks.append(relative + np.repeat(ticks, num_strokes))
+        stroke_measures.append(np.repeat(np.arange(len(measures)), num_strokes))
+    DSR = get_distinct_stroke_rate_from_ticks(stroke_ticks, stroke_measures, [len(m) for m in aggregates])
     return Features(PS=PS, PE=PE, DSR=DSR, HDR=HDR, HS=HS, PPR=PPR, ANR=ANR)
 
 
+def get_pitch_occurrences(pitches: np.ndarray) -> dict[int, int]:
+    """Returns {midi number: occurrences}, in order of first occurrence."""
+    values, first_idx, counts = np.unique(pitches, return_index=True, return_counts=True)
+    order = np.argsort(first_idx)
+    return dict(zip(values[order].tolist(), counts[order].tolist()))
+
+
 def _a_intersect_stroke_ticks(a: set[int], b: Measure):
     return a.intersection(b.stroke_ticks)
 
@@ -77,6 +309,33 @@ def get_distinct_stroke_rate(*staffs: Staff) -> float:
     return 1 - intersection / union
 
 
+def get_distinct_stroke_rate_from_np_array(columns: Sequence[StaffColumns]) -> float:
+    """Same as `get_distinct_stroke_rate`, on the stroke columns of the staffs."""
+    return get_distinct_stroke_rate_from_ticks(
+        [c.stroke_tick for c in columns], [c.stroke_measure for c in columns], [c.num_measures for c in columns]
+    )
+
+
+def get_distinct_stroke_rate_from_ticks(
+    stroke_ticks: Sequence[np.ndarray], stroke_measures: Sequence[np.ndarray], num_measures: Sequence[int]
+) -> float:
+    """Same as `get_distinct_stroke_rate`, given the tick and measure index of each stroke of each staff."""
+    if len(stroke_ticks) < 1:
+        raise ValueError("there must be at least one staff")
+    # measures are paired by index, up to the shortest staff
+    num_paired = min(num_measures)
+    ticks = [t[m < num_paired] for t, m in zip(stroke_ticks, stroke_measures)]
+    measures = [m[m < num_paired] for m in stroke_measures]
+    # (measure, tick) as one number
+    span = max((int(t.max()) + 1 for t in ticks if len(t)), default=1)
+    keys = np.concatenate([m.astype(np.int64) * span + t for m, t in zip(measures, ticks)])
+    # a staff has at most one stroke per tick of a measure
+    _, counts = np.unique(keys, return_counts=True)
+    intersection = int(np.count_nonzero(counts == len(stroke_ticks)))
+    union = len(counts)
+    return 1 - intersection / union
+
+
 def get_staffs_from_piano_parts_id(parts: Iterable[Part], staffs: Sequence[Staff]) -> Iterator[Staff]:
     for part in parts:
         if part.is_piano:
@@ -137,8 +396,7 @@ def get_vbox_text(staffs: list) -> dict[str, str]:
     return dct
 
 
-def get_average_pitch_from_np_array(notes: Iterator[Note]) -> Optional[float]:
-    pitches = np.fromiter((n.pitch for n in notes), int)
+def get_average_pitch_from_np_array(pitches: np.ndarray) -> Optional[float]:
     if len(pitches) != 0:
         return pitches.mean()
     return None
@@ -154,30 +412,76 @@ def get_hand_displacement_rate_from_list(flattened_chords: Sequence[Chord]) -> O
     return None
 
 
+def get_hand_displacement_rate_from_np_array(columns: StaffColumns) -> Optional[float]:
+    """Same as `get_hand_displacement_rate_from_list`, with the costs of all adjacent chords computed at once."""
+    if columns.num_chords == 0:
+        return None
+    lows, highs = get_chord_ranges(columns)
+    costs = get_displacement_costs(lows[:-1], highs[:-1], lows[1:], highs[1:])
+    return costs.mean() / 2
+
+
+def get_chord_ranges(columns: StaffColumns) -> tuple[np.ndarray, np.ndarray]:
+    """Returns the lowest and the highest pitch of each chord."""
+    chord_size = columns.chord_size
+    if not chord_size.all():
+        raise ValueError("chord without notes")
+    starts = np.cumsum(chord_size) - chord_size
+    lows = np.minimum.reduceat(columns.chord_note_pitch, starts)
+    highs = np.maximum.reduceat(columns.chord_note_pitch, starts)
+    return lows, highs
+
+
+def get_displacement_costs(lows: np.ndarray, highs: np.ndarray, next_lows: np.ndarray, next_highs: np.ndarray):
+    """`features.displacement_cost` of each chord, given by its lowest and highest pitch, and the chord after it."""
+    d = np.maximum(highs - next_lows, next_highs - lows)
+    # 0 below 7 semitones, 1 below 12, else 2
+    return np.digitize(d, [7, 12])
+
+
+def get_hand_displacement_rate_from_aggregates(measures: Sequence[MeasureAggregate]) -> Optional[float]:
+    """Same as `get_hand_displacement_rate_from_np_array`, adding the costs between the measures' boundary chords."""
+    measures = [a for a in measures if a.num_chords]
+    if not measures:
+        return None
+    cost = sum(a.displacement_cost for a in measures)
+    if len(measures) > 1:
+        lows, highs = np.array([a.last_chord for a in measures[:-1]]).T
+        next_lows, next_highs = np.array([a.first_chord for a in measures[1:]]).T
+        cost += int(get_displacement_costs(lows, highs, next_lows, next_highs).sum())
+    num_pairs = sum(a.num_chords for a in measures) - 1
+    # as the mean of no costs
+    return (np.float64(cost) / num_pairs if num_pairs else np.float64("nan")) / 2
+
+
 def is_chord(chord: Chord) -> bool:
     return len(chord.notes) > 1
 
 
-def get_polyphony_rate(flattened_chords: Iterator[Chord]) -> Optional[float]:
-    num_chord_strokes = 0
-    num_strokes = 0
-    for chord in flattened_chords:
-        if not all(n.tie for n in chord.notes):
-            # count as new stroke if at least one note is not tied
-            # if all is tied, it just is the old stroke with longer tick length
-            num_chord_strokes += int(is_chord(chord))
-            num_strokes += 1
+def get_polyphony_rate(columns: StaffColumns) -> Optional[float]:
+    num_strokes, num_chord_strokes = count_strokes(columns)
     if num_strokes == 0:
         return None
     return num_chord_strokes / num_strokes
 
 
+def count_strokes(columns: StaffColumns) -> tuple[int, int]:
+    """Returns the number of new strokes and of new strokes of more than one note."""
+    # count as new stroke if at least one note is not tied
+    # if all is tied, it just is the old stroke with longer tick length
+    chord_size = columns.chord_size
+    is_new_stroke = columns.chord_num_tied < chord_size
+    num_strokes = int(np.count_nonzero(is_new_stroke))
+    num_chord_strokes = int(np.count_nonzero(is_new_stroke & (chord_size > 1)))
+    return num_strokes, num_chord_strokes
+
+
 def get_chords_for_each_tempo(measures: list[Measure], tempo_ticks: list[int]):
     chords_each_tempo: list[list[Chord]] = [[] for _ in range(len(tempo_ticks))]
     for measure in measures:
-        for stroke in measure.strokes:
+        for tick, stroke in measure.ticked_strokes:
             if hasattr(stroke, "notes"):  # isinstance(stroke, Chord)
-                tempo_idx = bisect_right(tempo_ticks, measure.get_stroke_tick(stroke)) - 1
+                tempo_idx = bisect_right(tempo_ticks, tick) - 1
                 chords_each_tempo[tempo_idx].append(stroke)
     return chords_each_tempo
 
@@ -206,3 +510,56 @@ def get_playing_speed(tempo_chords: Iterator[tuple[Tempo, list[Chord]]], last_ti
 
     # TODO: numpy calculate variance PS
     return avg_ps
+
+
+def get_playing_speed_from_np_array(tempos: Sequence[Tempo], columns: StaffColumns, last_tick: int) -> float:
+    """Same as `get_playing_speed`, on the chord columns of a staff."""
+    tempo_ticks = np.array([t.tick for t in tempos], int)
+    tempo_idx = get_tempo_index(tempo_ticks, columns.chord_tick)
+    num_chords = np.bincount(tempo_idx, minlength=len(tempos))
+    sum_pulsation = np.bincount(tempo_idx, weights=columns.chord_pulsation, minlength=len(tempos))
+    return get_playing_speed_from_sums(tempos, num_chords, sum_pulsation, last_tick)
+
+
+def get_tempo_index(tempo_ticks: np.ndarray, ticks: np.ndarray) -> np.ndarray:
+    """Returns the index of the tempo at each tick."""
+    # ticks before the first tempo wrap around to the last one, like the list index -1 does
+    return (np.searchsorted(tempo_ticks, ticks, side="right") - 1) % len(tempo_ticks)
+
+
+def get_playing_speed_from_sums(
+    tempos: Sequence[Tempo], num_chords: np.ndarray, sum_pulsation: np.ndarray, last_tick: int
+) -> float:
+    """Same as `get_playing_speed`, given the number of chords and their summed pulsation under each tempo."""
+    tempo_ticks = np.array([t.tick for t in tempos], int)
+    tempo_values = np.array([t.tempo for t in tempos], float)
+    ps = np.zeros(len(tempos))
+    np.divide(sum_pulsation / tempo_values, num_chords, out=ps, where=num_chords != 0)
+    del_x = np.diff(tempo_ticks, append=last_tick)
+    # summed in order, as floating point addition is not associative
+    total_area = sum((del_x * ps).tolist())
+    return total_area / last_tick
+
+
+def get_playing_speed_from_aggregates(
+    tempos: Sequence[Tempo], measure_ticks: np.ndarray, measures: Sequence[MeasureAggregate], last_tick: int
+) -> Optional[float]:
+    """Same as `Staff.get_playing_speed`, adding up the pulsation sums of the measures under each tempo."""
+    if not tempos:
+        return None
+    tempo_ticks = np.array([t.tick for t in tempos], int)
+    chorded = [i for i, a in enumerate(measures) if a.num_chords]
+    starts = measure_ticks[chorded]
+    first = np.searchsorted(tempo_ticks, starts + [measures[i].chord_tick.min() for i in chorded], side="right")
+    last = np.searchsorted(tempo_ticks, starts + [measures[i].chord_tick.max() for i in chorded], side="right")
+    # the sums of a measure under one tempo are added at once, others chord by chord
+    whole = first == last
+    tempo_idx = (first[whole] - 1) % len(tempos)
+    whole_measures = [measures[i] for i in np.compress(whole, chorded)]
+    num_chords = np.bincount(tempo_idx, [a.num_chords for a in whole_measures], len(tempos)).astype(int)
+    sum_pulsation = np.bincount(tempo_idx, [a.pulsation_sum for a in whole_measures], len(tempos))
+    for i, start in zip(np.compress(~whole, chorded), starts[~whole]):
+        tempo_idx = get_tempo_index(tempo_ticks, start + measures[i].chord_tick)
+        num_chords += np.bincount(tempo_idx, minlength=len(tempos))
+        sum_pulsation += np.bincount(tempo_idx, weights=measures[i].chord_pulsation, minlength=len(tempos))
+    return get_playing_speed_from_sums(tempos, num_chords, sum_pulsation, last_tick)
@@ -1,12 +1,25 @@
-from typing import Union
+from typing import IO, Literal, Union
 
 from bs4 import BeautifulSoup
 
-from musescore import v1, v2, v3
+from musescore import stream, v1, v2, v3
 
 
-def newMuseScore(soup: BeautifulSoup) -> Union[v1.MuseScore, v2.MuseScore, None]:
-    museScore_tag = soup.find("museScore")
+def newMuseScore(
+    source: Union[BeautifulSoup, IO[bytes], str], *, backend: Literal["bs4", "lxml"] = "bs4"
+) -> Union[v1.MuseScore, v2.MuseScore, v3.MuseScore, None]:
+    """Returns the parsed MuseScore for the matching version, None if the version is unknown.
+
+    Args:
+        source: a parsed ``BeautifulSoup`` for the "bs4" backend,
+            or a file object / path of the ``.mscx`` file for the "lxml" backend.
+        backend: "lxml" parses incrementally with ``lxml.etree.iterparse`` (see ``musescore.stream``).
+    """
+    if backend == "lxml":
+        return stream.parse(source)
+    if backend != "bs4":
+        raise ValueError(f"unknown backend: {backend}")
+    museScore_tag = source.find("museScore")
     version = museScore_tag.get("version")
     if version in v1.MuseScore.known_versions:
         return v1.MuseScore.from_tag(museScore_tag)
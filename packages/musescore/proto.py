@@ -28,8 +28,12 @@ class Rest(Stroke):
 
 
 class Measure(Protocol):
+    digest: Optional[str]  # hash of the content, None if not known
+    tick: int
+    notes: Iterator[Note]
     strokes: list[Stroke]
     stroke_ticks: set[int]  # TODO: Use numpy array instead
+    ticked_strokes: list[tuple[int, Stroke]]
 
     def get_stroke_tick(stroke: Stroke) -> int:
         ...
@@ -39,6 +43,7 @@ class Staff(Protocol):
     id: int
     notes: Iterator[Note]
     measures: list[Measure]
+    columns: Any  # musescore.common.StaffColumns
 
     def get_average_pitch(self) -> float:
         ...
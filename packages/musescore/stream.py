@@ -0,0 +1,204 @@
+"""Incremental parsing backend built on ``lxml.etree.iterparse``.
+
+Fills the same attrs objects as ``MuseScore.from_tag`` does on a full ``BeautifulSoup`` tree,
+but each ``<Measure>`` element is handed to ``Measure.from_tag`` as soon as it is complete and
+then cleared, so memory stays bounded by the largest measure instead of the whole score.
+"""
+from typing import IO, Iterator, Optional, Union
+
+from lxml import etree
+
+from musescore import v1, v2, v3
+
+__all__ = ["LxmlTag", "parse", "read_version"]
+
+Source = Union[str, IO[bytes]]
+
+
+class LxmlTag:
+    """Wraps an ``lxml`` element with the subset of the ``bs4.element.Tag`` API used by ``from_tag``."""
+
+    __slots__ = ("_element",)
+
+    def __init__(self, element: etree._Element):
+        self._element = element
+
+    @property
+    def name(self) -> str:
+        return etree.QName(self._element).localname
+
+    @property
+    def text(self) -> str:
+        return "".join(self._element.itertext())
+
+    @property
+    def children(self) -> Iterator["LxmlTag"]:
+        for child in self._element:
+            if isinstance(child.tag, str):  # skip comments and processing instructions
+                yield LxmlTag(child)
+
+    def get(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        return self._element.get(key, default)
+
+    def find(self, name: str, recursive: bool = True) -> Optional["LxmlTag"]:
+        path = f".//{{*}}{name}" if recursive else f"{{*}}{name}"
+        element = self._element.find(path)
+        return None if element is None else LxmlTag(element)
+
+    def find_all(self, name: str, recursive: bool = True) -> list["LxmlTag"]:
+        path = f".//{{*}}{name}" if recursive else f"{{*}}{name}"
+        return [LxmlTag(e) for e in self._element.iterfind(path)]
+
+    def get_text(self, separator: str = "", strip: bool = False) -> str:
+        strings = self._element.itertext()
+        if strip:
+            strings = (s.strip() for s in strings)
+            strings = (s for s in strings if s)
+        return separator.join(strings)
+
+    def prettify(self) -> str:
+        return etree.tostring(self._element, encoding="unicode", pretty_print=True)
+
+    def __repr__(self) -> str:
+        return etree.tostring(self._element, encoding="unicode")
+
+
+def _release(element: etree._Element) -> None:
+    """Frees a consumed element along with the already consumed siblings before it."""
+    element.clear(keep_tail=True)
+    parent = element.getparent()
+    if parent is not None:
+        while element.getprevious() is not None:
+            del parent[0]
+
+
+def read_version(source: Source) -> Optional[str]:
+    """Returns the ``version`` attribute of ``<museScore>`` without reading the rest of the file."""
+    for _, element in etree.iterparse(source, events=("start",), huge_tree=True):
+        if element.tag == "museScore":
+            return element.get("version")
+    return None
+
+
+def parse(source: Source) -> Union[v1.MuseScore, v2.MuseScore, v3.MuseScore, None]:
+    """Parses a ``.mscx`` file incrementally. Returns None for unknown versions."""
+    context = etree.iterparse(source, events=("start", "end"), huge_tree=True)
+    for event, element in context:
+        if event == "start" and element.tag == "museScore":
+            version = element.get("version")
+            if version in v1.MuseScore.known_versions:
+                return _parse_v1(context, version)
+            if version in v2.MuseScore.known_versions:
+                return _parse_score(context, version, v2)
+            if version in v3.MuseScore.known_versions:
+                return _parse_score(context, version, v3)
+            return None
+    return None
+
+
+def _parse_v1(context: etree.iterparse, version: str) -> v1.MuseScore:
+    # v1 has <Part> and <Staff> directly under <museScore>, which is depth 0
+    tags: dict[str, LxmlTag] = {}
+    parts: list[v1.Part] = []
+    staffs: list[v1.Staff] = []
+    inst: Optional[v1.MuseScore] = None
+    staff: Optional[v1.Staff] = None
+    depth = 1
+    for event, element in context:
+        if event == "start":
+            if depth == 1 and element.tag == "Staff":
+                if inst is None:
+                    inst = v1.MuseScore(
+                        version=version,
+                        programVersion=tags["programVersion"].text,
+                        programRevision=tags["programRevision"].text,
+                        siglist=v1.SigList(
+                            list(map(v1.sig.from_tag, tags["siglist"].find_all("sig", recursive=False)))
+                        ),
+                        tempolist=list(map(v1.tempo.from_tag, tags["tempolist"].find_all("tempo", recursive=False))),
+                        parts=parts,
+                        staffs=[],
+                    )
+                staff = v1.Staff(parent=inst, id=int(element.get("id")), vbox=None, measures=[])
+            depth += 1
+            continue
+        depth -= 1
+        if depth == 0:
+            # </museScore>
+            break
+        if depth == 1:
+            if element.tag == "Staff":
+                staffs.append(staff)
+                staff = None
+            elif element.tag == "Part":
+                parts.append(v1.Part.from_tag(LxmlTag(element)))
+            elif element.tag in ("programVersion", "programRevision", "siglist", "tempolist"):
+                tags.setdefault(element.tag, LxmlTag(element))
+                continue
+            _release(element)
+        elif depth == 2 and staff is not None:
+            if element.tag == "Measure":
+                v1.Measure.from_tag(LxmlTag(element), staff)
+                _release(element)
+            elif element.tag == "VBox" and staff.vbox is None:
+                staff.vbox = v1.VBox.from_tag(LxmlTag(element))
+    if inst is None:
+        raise ValueError("no <Staff> found in <museScore>")
+    inst.staffs = staffs
+    inst.count_tempos()
+    return inst
+
+
+def _parse_score(context: etree.iterparse, version: str, module) -> Union[v2.MuseScore, v3.MuseScore]:
+    # v2 and v3 nest everything in <museScore><Score>; excerpts are nested <Score> elements and are ignored
+    tags: dict[str, LxmlTag] = {}
+    score = None
+    staffs = []
+    staff = None
+    depth = 1
+    for event, element in context:
+        if event == "start":
+            if depth == 1 and element.tag == "Score" and score is None:
+                score = module.Score(parts=[], staffs=[], metaTags=[])
+            elif depth == 2 and element.tag == "Staff" and score is not None:
+                staff = module.Staff(parent=score, id=int(element.get("id")), vbox=None, measures=[])
+            depth += 1
+            continue
+        depth -= 1
+        if depth == 0:
+            # </museScore>
+            break
+        if depth == 1:
+            if element.tag in ("programVersion", "programRevision"):
+                tags.setdefault(element.tag, LxmlTag(element))
+                continue
+            if element.tag == "Score" and not score.staffs:
+                score.staffs = sorted(staffs, key=lambda s: getattr(s, "id"))
+                score.count_tempos()
+            _release(element)
+        elif depth == 2:
+            if element.tag == "Staff" and staff is not None:
+                staffs.append(staff)
+                staff = None
+            elif element.tag == "Part":
+                score.parts.append(module.Part.from_tag(LxmlTag(element)))
+            elif element.tag == "metaTag":
+                score.metaTags.append(module.metaTag.from_tag(LxmlTag(element)))
+            _release(element)
+        elif depth == 3 and staff is not None:
+            if element.tag == "Measure":
+                module.Measure.from_tag(LxmlTag(element), staff)
+                _release(element)
+            elif element.tag == "VBox" and staff.vbox is None:
+                staff.vbox = module.VBox.from_tag(LxmlTag(element))
+        elif element.tag == "Measure":
+            # measures of excerpts are not used, drop them early
+            _release(element)
+    if score is None:
+        raise ValueError("no <Score> found in <museScore>")
+    return module.MuseScore(
+        version=version,
+        programVersion=tags["programVersion"].text,
+        programRevision=tags["programRevision"].text,
+        score=score,
+    )
@@ -0,0 +1,114 @@
+import io
+import random
+import unittest
+from typing import Optional
+
+from musescore import common, stream
+
+
+# note values and how many fill a 4/4 measure, so the playing speed depends on which tempo each measure is under
+DURATIONS = {"16th": 16, "eighth": 8, "quarter": 4}
+
+
+def get_measure(rng: random.Random, tempo_at: Optional[int] = None, duration: Optional[str] = None) -> str:
+    """A voice of chords of 1 to 3 notes, of one note value, with a tempo of 90 before chord `tempo_at`."""
+    duration = duration or rng.choice(list(DURATIONS))
+    chords = []
+    for i in range(DURATIONS[duration]):
+        if i == tempo_at:
+            chords.append("<Tempo><tempo>1.5</tempo><text>= 90</text></Tempo>")
+        notes = "".join(
+            f"<Note><pitch>{p}</pitch><tpc>14</tpc>"
+            + ("<Accidental><subtype>accidentalSharp</subtype></Accidental>" if p % 7 == 0 else "")
+            + "</Note>"
+            for p in rng.sample(range(36, 96), rng.randint(1, 3))
+        )
+        chords.append(f"<Chord><durationType>{duration}</durationType>{notes}</Chord>")
+    return f"<voice>{''.join(chords)}</voice>"
+
+
+def get_mscx(staffs: list[list[str]]) -> bytes:
+    """A v3 piano score of the given measures of each staff, in 4/4 at 120."""
+    tempo = "<Tempo><tempo>2</tempo><text>= 120</text></Tempo>"
+    time_sig = "<TimeSig><sigN>4</sigN><sigD>4</sigD></TimeSig>"
+    tags = []
+    for id_, measures in enumerate(staffs, 1):
+        first = f"<Measure><voice>{time_sig}{tempo if id_ == 1 else ''}</voice>{measures[0]}</Measure>"
+        rest = "".join(f"<Measure>{m}</Measure>" for m in measures[1:])
+        tags.append(f'<Staff id="{id_}">{first}{rest}</Staff>')
+    return (
+        '<museScore version="3.01"><programVersion>3.0.5</programVersion><programRevision/><Score>'
+        "<Part><Staff id='1'/><Staff id='2'/><trackName>Piano</trackName>"
+        "<Instrument><trackName>Piano</trackName></Instrument></Part>"
+        f"{''.join(tags)}</Score></museScore>"
+    ).encode()
+
+
+def parse(staffs: list[list[str]]):
+    return stream.parse(io.BytesIO(get_mscx(staffs)))
+
+
+class MeasureAggregatesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.rng = random.Random(0)
+        self.staffs = [[get_measure(self.rng) for _ in range(8)] for _ in range(2)]
+
+    def assert_incremental(self, old: list[list[str]], new: list[list[str]]) -> common.MeasureAggregates:
+        """Asserts the features of `new` from the aggregates of `old` are those computed from scratch."""
+        aggregates = common.MeasureAggregates()
+        aggregates.get_features(*parse(old).score.get_piano_staffs())
+        self.assertEqual(parse(new).get_features(aggregates), parse(new).get_features())
+        return aggregates
+
+    def test_unchanged(self):
+        aggregates = self.assert_incremental(self.staffs, self.staffs)
+        self.assertEqual((aggregates.num_computed, aggregates.num_reused), (0, 16))
+
+    def test_edit(self):
+        new = [list(measures) for measures in self.staffs]
+        new[0][2] = get_measure(self.rng)
+        new[1][5] = get_measure(self.rng)
+        aggregates = self.assert_incremental(self.staffs, new)
+        self.assertEqual((aggregates.num_computed, aggregates.num_reused), (2, 14))
+
+    def test_insert(self):
+        # the measures after it move
+        new = [measures[:3] + [get_measure(self.rng)] + measures[3:] for measures in self.staffs]
+        aggregates = self.assert_incremental(self.staffs, new)
+        self.assertEqual((aggregates.num_computed, aggregates.num_reused), (2, 16))
+
+    def test_delete(self):
+        new = [measures[:3] + measures[4:] for measures in self.staffs]
+        aggregates = self.assert_incremental(self.staffs, new)
+        self.assertEqual((aggregates.num_computed, aggregates.num_reused), (0, 14))
+
+    def test_repeat(self):
+        # measure 3 played again as measure 6, in both staffs
+        new = [measures[:6] + [measures[3]] + measures[7:] for measures in self.staffs]
+        aggregates = self.assert_incremental(self.staffs, new)
+        self.assertEqual((aggregates.num_computed, aggregates.num_reused), (0, 16))
+        # repeated within the first version too
+        aggregates = self.assert_incremental(new, new)
+        self.assertEqual((aggregates.num_computed, aggregates.num_reused), (0, 16))
+
+    def test_tempo_change_within_measure(self):
+        new = [list(measures) for measures in self.staffs]
+        new[0][4] = get_measure(self.rng, tempo_at=6, duration="16th")
+        aggregates = self.assert_incremental(self.staffs, new)
+        self.assertEqual((aggregates.num_computed, aggregates.num_reused), (1, 15))
+        # and removed again, the measures after it are under the first tempo
+        self.assert_incremental(new, self.staffs)
+        self.assertNotEqual(parse(new).get_features(), parse(self.staffs).get_features())
+
+    def test_insert_before_tempo_change(self):
+        # measures reused from the old version are under other tempos in the new one
+        old = [list(measures) for measures in self.staffs]
+        old[0][4] = get_measure(self.rng, tempo_at=6, duration="16th")
+        new = [measures[:2] + [get_measure(self.rng)] + measures[2:] for measures in old]
+        new[0][7] = get_measure(self.rng, tempo_at=10, duration="16th")
+        aggregates = self.assert_incremental(old, new)
+        self.assertEqual((aggregates.num_computed, aggregates.num_reused), (3, 15))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,9 +6,9 @@ import bs4.element
 from attr import define, evolve, field, frozen
 
 from musescore.features import Features
-from musescore.common import (get_average_pitch_from_np_array, get_chords_for_each_tempo, get_features,
-                              get_hand_displacement_rate_from_list, get_playing_speed, get_polyphony_rate,
-                              get_vbox_text, is_piano)
+from musescore.common import (StaffColumns, get_average_pitch_from_np_array, get_features,
+                              get_hand_displacement_rate_from_np_array, get_playing_speed_from_np_array,
+                              get_polyphony_rate, get_vbox_text, is_piano)
 from musescore.proto import note_possible_tags
 from musescore.utils import get_bpm, get_duration_type, get_pulsation, get_tick_length, tick_length_to_pulsation
 
@@ -347,6 +347,8 @@ class Staff:
     vbox: Optional["VBox"]
     measures: list["Measure"]
 
+    _columns: Optional[StaffColumns] = field(init=False, default=None)
+
     @classmethod
     def from_tag(cls, tag: bs4.element.Tag, parent: "MuseScore") -> "Staff":
         assert tag.name == "Staff"
@@ -378,26 +380,28 @@ class Staff:
     @property
     def notes(self) -> Iterator["Note"]:
         for measure in self.measures:
-            for child in measure.children:
-                if isinstance(child, Chord):
-                    for note in child.notes:
-                        yield note
+            yield from measure.notes
+
+    @property
+    def columns(self) -> StaffColumns:
+        if self._columns is None:
+            self._columns = StaffColumns.from_staff(self)
+        return self._columns
 
     def get_average_pitch(self) -> Optional[float]:
-        return get_average_pitch_from_np_array(self.notes)
+        return get_average_pitch_from_np_array(self.columns.note_pitch)
 
     def get_hand_displacement_rate(self) -> Optional[float]:
-        return get_hand_displacement_rate_from_list(self.flattened_chords)
+        return get_hand_displacement_rate_from_np_array(self.columns)
 
     def get_polyphony_rate(self) -> Optional[float]:
-        return get_polyphony_rate(self.flattened_chords)
+        return get_polyphony_rate(self.columns)
 
     def get_playing_speed(self) -> float:
         if not self.parent.tempos:
             return None
-        tempo_chords = get_chords_for_each_tempo(self.measures, self.parent.tempo_ticks)
         last_tick = max(self.measures[-1].stroke_ticks)
-        return get_playing_speed(zip(self.parent.tempos, tempo_chords), last_tick)
+        return get_playing_speed_from_np_array(self.parent.tempos, self.columns, last_tick)
 
 
 @define
@@ -439,6 +443,7 @@ class Measure:
     idx: int = field(init=False)
     _strokes: Optional[list[Union["Chord", "Rest"]]] = field(init=False, default=None)
     _stroke_ticks: Optional[list[int]] = field(init=False, default=None)
+    _stroke_tick_index: Optional[dict[int, int]] = field(init=False, default=None)  # id(stroke) -> tick
 
     @classmethod
     def from_tag(cls, tag: bs4.element.Tag, parent: "Staff") -> "Measure":
@@ -465,7 +470,7 @@ class Measure:
         parent.measures.append(inst)
 
         for child in tag.children:
-            if not isinstance(child, bs4.element.Tag):
+            if child.name is None:  # NavigableString or Comment
                 continue
             if child.name == "Dynamic":
                 inst.children.append(Dynamic.from_tag(child))
@@ -549,6 +554,14 @@ class Measure:
                     stroke_ticks.append(stroke_tick)
         self._strokes = strokes
         self._stroke_ticks = stroke_ticks
+        self._stroke_tick_index = {id(stroke): tick for tick, stroke in zip(stroke_ticks, strokes)}
+
+    @property
+    def notes(self) -> Iterator["Note"]:
+        """Returns the notes of every chord, as written."""
+        for child in self.children:
+            if isinstance(child, Chord):
+                yield from child.notes
 
     @property
     def strokes(self) -> list[Union["Chord", "Rest"]]:
@@ -567,11 +580,21 @@ class Measure:
         assert len(result) == len(self._stroke_ticks)
         return result
 
+    @property
+    def ticked_strokes(self) -> list[tuple[int, Union["Chord", "Rest"]]]:
+        """Returns (tick, stroke) for each distinct stroke, merging all voices."""
+        if self._strokes is None:
+            self._compute_strokes()
+        return list(zip(self._stroke_ticks, self._strokes))
+
     def get_stroke_tick(self, stroke: Union["Chord", "Rest"]) -> int:
-        """Returns the tick of the given stroke."""
-        if self._stroke_ticks is None:
+        """Returns the tick of the given stroke (by identity, not equality)."""
+        if self._stroke_tick_index is None:
             self._compute_strokes()
-        return self._stroke_ticks[self.strokes.index(stroke)]
+        try:
+            return self._stroke_tick_index[id(stroke)]
+        except KeyError:
+            raise ValueError(f"{stroke} is not a stroke of this measure") from None
 
     def get_last_tick(self) -> int:
         """Returns the last tick in this measure."""
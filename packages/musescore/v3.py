@@ -8,9 +8,10 @@ import numpy as np
 from attr import define, evolve, field
 
 from musescore.features import Features
-from musescore.common import (get_average_pitch_from_np_array, get_chords_for_each_tempo, get_features,
-                              get_hand_displacement_rate_from_list, get_playing_speed, get_polyphony_rate,
-                              get_staffs_from_piano_parts_id, get_vbox_text, is_piano)
+from musescore.common import (MeasureAggregates, StaffColumns, get_average_pitch_from_np_array, get_features,
+                              get_hand_displacement_rate_from_np_array, get_measure_digest,
+                              get_playing_speed_from_np_array, get_polyphony_rate, get_staffs_from_piano_parts_id,
+                              get_vbox_text, is_piano)
 from musescore.proto import note_possible_tags
 from musescore.utils import get_bpm, get_duration_type, get_pulsation, get_tick_length, tick_length_to_pulsation
 from utils.dict import append_value
@@ -47,10 +48,13 @@ class MuseScore:
             score=score,
         )
 
-    def get_features(self) -> Features:
+    def get_features(self, aggregates: Optional[MeasureAggregates] = None) -> Features:
+        """Features of the piano staffs. With `aggregates` of a previous version, only changed measures are computed."""
         staffs = self.score.get_piano_staffs()
         if not staffs:
             return None
+        if aggregates is not None:
+            return aggregates.get_features(*staffs)
         return get_features(*staffs)
 
     @property
@@ -265,6 +269,8 @@ class Staff:
     vbox: Optional["VBox"]
     measures: list["Measure"]
 
+    _columns: Optional[StaffColumns] = field(init=False, default=None)
+
     @classmethod
     def from_tag(cls, tag: bs4.element.Tag, parent: "Score") -> "Staff":
         assert tag.name == "Staff"
@@ -296,27 +302,28 @@ class Staff:
     @property
     def notes(self) -> Iterator["Note"]:
         for measure in self.measures:
-            for voice in measure.voices:
-                for child in voice.children:
-                    if isinstance(child, Chord):
-                        for note in child.notes:
-                            yield note
+            yield from measure.notes
+
+    @property
+    def columns(self) -> StaffColumns:
+        if self._columns is None:
+            self._columns = StaffColumns.from_staff(self)
+        return self._columns
 
     def get_average_pitch(self) -> Optional[float]:
-        return get_average_pitch_from_np_array(self.notes)
+        return get_average_pitch_from_np_array(self.columns.note_pitch)
 
     def get_hand_displacement_rate(self) -> Optional[float]:
-        return get_hand_displacement_rate_from_list(self.flattened_chords)
+        return get_hand_displacement_rate_from_np_array(self.columns)
 
     def get_polyphony_rate(self) -> Optional[float]:
-        return get_polyphony_rate(self.flattened_chords)
+        return get_polyphony_rate(self.columns)
 
     def get_playing_speed(self) -> float:
         if not self.parent.tempos:
             return None
-        tempo_chords = get_chords_for_each_tempo(self.measures, self.parent.tempo_ticks)
         last_tick = max(self.measures[-1].stroke_ticks)
-        return get_playing_speed(zip(self.parent.tempos, tempo_chords), last_tick)
+        return get_playing_speed_from_np_array(self.parent.tempos, self.columns, last_tick)
 
 
 @define
@@ -363,10 +370,12 @@ class Measure:
     timeSig: "TimeSig"  # in <voice>
 
     idx: int = field(init=False)
+    digest: Optional[str] = field(init=False, default=None)  # of the content, see `MeasureAggregates`
     _tick: Optional[int] = field(init=False, default=None)
     _tick_length: Optional[int] = field(init=False, default=None)
     _strokes: Optional[list[Union["Chord", "Rest"]]] = field(init=False, default=None)
     _stroke_ticks: Optional[list[int]] = field(init=False, default=None)
+    _stroke_tick_index: Optional[dict[int, int]] = field(init=False, default=None)  # id(stroke) -> tick
 
     @classmethod
     def from_tag(cls, tag: bs4.element.Tag, parent: "Staff") -> "Measure":
@@ -395,12 +404,14 @@ class Measure:
         # should have at least one <voice> with children
         assert len(inst.voices) != 0
         assert any(len(v.children) != 0 for v in inst.voices), tag.find_all("voice", recursive=False)
+        inst.digest = get_measure_digest(tag)
         # TODO: maybe just keep the Measure as is?
         for voice in inst.voices:
             for child in voice.children:
                 if isinstance(child, RepeatMeasure):
                     inst = evolve(inst.previous)
                     inst.idx = idx
+                    inst.digest = inst.previous.digest
         parent.measures.append(inst)
         inst._compute_ticks()
 
@@ -505,6 +516,15 @@ class Measure:
 
         self._strokes = strokes
         self._stroke_ticks = stroke_ticks
+        self._stroke_tick_index = {id(stroke): tick for tick, stroke in zip(stroke_ticks, strokes)}
+
+    @property
+    def notes(self) -> Iterator["Note"]:
+        """Returns the notes of every chord, as written."""
+        for voice in self.voices:
+            for child in voice.children:
+                if isinstance(child, Chord):
+                    yield from child.notes
 
     @property
     def strokes(self) -> list[Union["Chord", "Rest"]]:
@@ -522,11 +542,21 @@ class Measure:
         assert len(result) == len(self._stroke_ticks)
         return result
 
+    @property
+    def ticked_strokes(self) -> list[tuple[int, Union["Chord", "Rest"]]]:
+        """Returns (tick, stroke) for each distinct stroke, merging all voices."""
+        if self._strokes is None:
+            self._compute_strokes()
+        return list(zip(self._stroke_ticks, self._strokes))
+
     def get_stroke_tick(self, stroke: Union["Chord", "Rest"]) -> int:
-        """Returns the tick of the given stroke."""
-        if self._stroke_ticks is None:
+        """Returns the tick of the given stroke (by identity, not equality)."""
+        if self._stroke_tick_index is None:
             self._compute_strokes()
-        return self._stroke_ticks[self.strokes.index(stroke)]
+        try:
+            return self._stroke_tick_index[id(stroke)]
+        except KeyError:
+            raise ValueError(f"{stroke} is not a stroke of this measure") from None
 
     def get_last_tick(self) -> int:
         """Returns the last tick in this measure."""
@@ -567,7 +597,7 @@ class Voice:
         parent.voices.append(inst)
 
         for child in tag.children:
-            if not isinstance(child, bs4.element.Tag):
+            if child.name is None:  # NavigableString or Comment
                 continue
             if child.name == "tick":
                 inst.children.append(Tick.from_tag(child))
@@ -7,10 +7,12 @@ import logging
 import math
 import os
 import pathlib
+import sqlite3
 import subprocess
 import time
 import typing
 import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from copy import deepcopy
 
 import chardet
@@ -21,175 +23,226 @@ from matplotlib import pyplot as plt
 from music21 import converter, features
 
 
-def batch_process(data_dir: pathlib.Path, *, batch_size: int = 8):
+FEATURE_EXTRACTOR_IDS = [
+    'm1',    # MelodicIntervalHistogramFeature
+    'm2',    # AverageMelodicIntervalFeature
+    'm3',    # MostCommonMelodicIntervalFeature
+    'm4',    # DistanceBetweenMostCommonMelodicIntervalsFeature
+    'm5',    # MostCommonMelodicIntervalPrevalenceFeature
+    'm6',    # RelativeStrengthOfMostCommonIntervalsFeature
+    'm7',    # NumberOfCommonMelodicIntervalsFeature
+    'm8',    # AmountOfArpeggiationFeature
+    'm9',    # RepeatedNotesFeature
+    'm10',   # ChromaticMotionFeature
+    'm11',   # StepwiseMotionFeature
+    'm12',   # MelodicThirdsFeature
+    'm13',   # MelodicFifthsFeature
+    'm14',   # MelodicTritonesFeature
+    'm15',   # MelodicOctavesFeature
+    'm17',   # DirectionOfMotionFeature
+    'm18',   # DurationOfMelodicArcsFeature
+    'm19',   # SizeOfMelodicArcsFeature
+    'r15',   # NoteDensityFeature
+    'r17',   # AverageNoteDurationFeature
+    'r18',   # VariabilityOfNoteDurationFeature
+    'r19',   # MaximumNoteDurationFeature
+    'r20',   # MinimumNoteDurationFeature
+    'r21',   # StaccatoIncidenceFeature
+    'r22',   # AverageTimeBetweenAttacksFeature
+    'r23',   # VariabilityOfTimeBetweenAttacksFeature
+    'r24',   # AverageTimeBetweenAttacksForEachVoiceFeature
+    'r25',   # AverageVariabilityOfTimeBetweenAttacksForEachVoiceFeature
+    'r30',   # InitialTempoFeature
+    'r31',   # InitialTimeSignatureFeature
+    'r32',   # CompoundOrSimpleMeterFeature
+    'r35',   # ChangesOfMeterFeature
+    'r36',   # DurationFeature
+    'p1',    # MostCommonPitchPrevalenceFeature
+    'p2',    # MostCommonPitchClassPrevalenceFeature
+    'p3',    # RelativeStrengthOfTopPitchesFeature
+    'p4',    # RelativeStrengthOfTopPitchClassesFeature
+    'p5',    # IntervalBetweenStrongestPitchesFeature
+    'p6',    # IntervalBetweenStrongestPitchClassesFeature
+    'p7',    # NumberOfCommonPitchesFeature
+    'p8',    # PitchVarietyFeature
+    'p9',    # PitchClassVarietyFeature
+    'p10',   # RangeFeature
+    'p11',   # MostCommonPitchFeature
+    'p12',   # PrimaryRegisterFeature
+    'p13',   # ImportanceOfBassRegisterFeature
+    'p14',   # ImportanceOfMiddleRegisterFeature
+    'p15',   # ImportanceOfHighRegisterFeature
+    'p16',   # MostCommonPitchClassFeature
+    'p19',   # BasicPitchHistogramFeature
+    'p20',   # PitchClassDistributionFeature
+    'p21',   # FifthsPitchHistogramFeature
+    'k1',    # TonalCertainty
+    'ql1',   # UniqueNoteQuarterLengths
+    'ql2',   # MostCommonNoteQuarterLength
+    'ql3',   # MostCommonNoteQuarterLengthPrevalence
+    'ql4',   # RangeOfNoteQuarterLengths
+    'cs1',   # UniquePitchClassSetSimultaneities
+    'cs2',   # UniqueSetClassSimultaneities
+    'cs3',   # MostCommonPitchClassSetSimultaneityPrevalence
+    'cs4',   # MostCommonSetClassSimultaneityPrevalence
+    'cs5',   # MajorTriadSimultaneityPrevalence
+    'cs6',   # MinorTriadSimultaneityPrevalence
+    'cs7',   # DominantSeventhSimultaneityPrevalence
+    'cs8',   # DiminishedTriadSimultaneityPrevalence
+    'cs9',   # TriadSimultaneityPrevalence
+    'cs10',  # DiminishedSeventhSimultaneityPrevalence
+    'cs11',  # IncorrectlySpelledTriadPrevalence
+    'cs12',  # ChordBassMotionFeature
+    'mc1',   # LandiniCadence
+]
+
+_feature_extractors = None
+
+
+def get_feature_extractors() -> list:
+    # per worker process, built on first use
+    global _feature_extractors
+    if _feature_extractors is None:
+        _feature_extractors = features.extractorsById(FEATURE_EXTRACTOR_IDS)
+        _feature_extractors += features.extractorsById('p22', library=['native'])
+    return _feature_extractors
+
+
+def load_works(data_dir: pathlib.Path) -> pd.DataFrame:
+    """Henle works with a difficulty and a usable .mxl, in henle-mxl-manual-v3.csv order."""
     df_mxl_man = pd.read_csv(data_dir / "henle-mxl-manual-v3.csv")
     df_mxl_man = df_mxl_man[df_mxl_man['difficulty'].notna()]
     df_mxl_man_no_problem = df_mxl_man['problem'] == 0
     df_mxl_man_problem_fixed = (df_mxl_man['problem'] == 1) & (df_mxl_man['changed'] == 1)
-    df = df_mxl_man[df_mxl_man_no_problem | df_mxl_man_problem_fixed]
-    print(df.shape)
-    # print(df.loc[0])
-
-    feature_extractors = features.extractorsById([
-        'm1',    # MelodicIntervalHistogramFeature
-        'm2',    # AverageMelodicIntervalFeature
-        'm3',    # MostCommonMelodicIntervalFeature
-        'm4',    # DistanceBetweenMostCommonMelodicIntervalsFeature
-        'm5',    # MostCommonMelodicIntervalPrevalenceFeature
-        'm6',    # RelativeStrengthOfMostCommonIntervalsFeature
-        'm7',    # NumberOfCommonMelodicIntervalsFeature
-        'm8',    # AmountOfArpeggiationFeature
-        'm9',    # RepeatedNotesFeature
-        'm10',   # ChromaticMotionFeature
-        'm11',   # StepwiseMotionFeature
-        'm12',   # MelodicThirdsFeature
-        'm13',   # MelodicFifthsFeature
-        'm14',   # MelodicTritonesFeature
-        'm15',   # MelodicOctavesFeature
-        'm17',   # DirectionOfMotionFeature
-        'm18',   # DurationOfMelodicArcsFeature
-        'm19',   # SizeOfMelodicArcsFeature
-        'r15',   # NoteDensityFeature
-        'r17',   # AverageNoteDurationFeature
-        'r18',   # VariabilityOfNoteDurationFeature
-        'r19',   # MaximumNoteDurationFeature
-        'r20',   # MinimumNoteDurationFeature
-        'r21',   # StaccatoIncidenceFeature
-        'r22',   # AverageTimeBetweenAttacksFeature
-        'r23',   # VariabilityOfTimeBetweenAttacksFeature
-        'r24',   # AverageTimeBetweenAttacksForEachVoiceFeature
-        'r25',   # AverageVariabilityOfTimeBetweenAttacksForEachVoiceFeature
-        'r30',   # InitialTempoFeature
-        'r31',   # InitialTimeSignatureFeature
-        'r32',   # CompoundOrSimpleMeterFeature
-        'r35',   # ChangesOfMeterFeature
-        'r36',   # DurationFeature
-        'p1',    # MostCommonPitchPrevalenceFeature
-        'p2',    # MostCommonPitchClassPrevalenceFeature
-        'p3',    # RelativeStrengthOfTopPitchesFeature
-        'p4',    # RelativeStrengthOfTopPitchClassesFeature
-        'p5',    # IntervalBetweenStrongestPitchesFeature
-        'p6',    # IntervalBetweenStrongestPitchClassesFeature
-        'p7',    # NumberOfCommonPitchesFeature
-        'p8',    # PitchVarietyFeature
-        'p9',    # PitchClassVarietyFeature
-        'p10',   # RangeFeature
-        'p11',   # MostCommonPitchFeature
-        'p12',   # PrimaryRegisterFeature
-        'p13',   # ImportanceOfBassRegisterFeature
-        'p14',   # ImportanceOfMiddleRegisterFeature
-        'p15',   # ImportanceOfHighRegisterFeature
-        'p16',   # MostCommonPitchClassFeature
-        'p19',   # BasicPitchHistogramFeature
-        'p20',   # PitchClassDistributionFeature
-        'p21',   # FifthsPitchHistogramFeature
-        'k1',    # TonalCertainty
-        'ql1',   # UniqueNoteQuarterLengths
-        'ql2',   # MostCommonNoteQuarterLength
-        'ql3',   # MostCommonNoteQuarterLengthPrevalence
-        'ql4',   # RangeOfNoteQuarterLengths
-        'cs1',   # UniquePitchClassSetSimultaneities
-        'cs2',   # UniqueSetClassSimultaneities
-        'cs3',   # MostCommonPitchClassSetSimultaneityPrevalence
-        'cs4',   # MostCommonSetClassSimultaneityPrevalence
-        'cs5',   # MajorTriadSimultaneityPrevalence
-        'cs6',   # MinorTriadSimultaneityPrevalence
-        'cs7',   # DominantSeventhSimultaneityPrevalence
-        'cs8',   # DiminishedTriadSimultaneityPrevalence
-        'cs9',   # TriadSimultaneityPrevalence
-        'cs10',  # DiminishedSeventhSimultaneityPrevalence
-        'cs11',  # IncorrectlySpelledTriadPrevalence
-        'cs12',  # ChordBassMotionFeature
-        'mc1',   # LandiniCadence
-    ])
-
-    feature_extractors += [features.extractorsById('p22', library=['native'])]
-
-    dfi = pd.DataFrame([], columns=['hn', 'title', 'difficulty'])
-    # new batch
-    count = 0
-    batch_number = 1
-    ds = features.DataSet(classLabel='ClassLabel')
-    ds.addFeatureExtractors(feature_extractors)
-    for i, row in df.iterrows():
-        print(f'>>> {row["mvt1"][:-4]}')
-        zfp = data_dir / "playlists" / row['mvt1']
-        zfp = zfp.with_suffix('.mxl')
-        # zf = zipfile.ZipFile(zfp)
-        # assert row['mvt1'] in zf.namelist()
-        # f = zf.open(row['mvt1'])
-        # s = converter.parse(f.read())
+    return df_mxl_man[df_mxl_man_no_problem | df_mxl_man_problem_fixed]
+
+
+def extract_work(data_dir: pathlib.Path, work: dict) -> dict:
+    """
+    music21 features of the first movement of `work` that parses (mvt1, else mvt2, else mvt3).
+
+    Runs in a worker process. Returns the work with `source`, `labels` and `values`, or with `error`.
+    """
+    error = None
+    for mvt in ('mvt1', 'mvt2', 'mvt3'):
+        if not isinstance(work.get(mvt), str) or not work[mvt]:
+            break
+        zfp = (data_dir / "playlists" / work[mvt]).with_suffix('.mxl')
         try:
             s = converter.parse(str(zfp))
-        except Exception as e:
-            if isinstance(row['mvt2'], str) and row['mvt2']:
-                zfp = data_dir / "playlists" / row['mvt2']
-                zfp = zfp.with_suffix('.mxl')
-                try:
-                    s = converter.parse(str(zfp))
-                except Exception as e:
-                    if isinstance(row['mvt3'], str) and row['mvt3']:
-                        zfp = data_dir / "playlists" / row['mvt3']
-                        zfp = zfp.with_suffix('.mxl')
-                        try:
-                            s = converter.parse(str(zfp))
-                        except Exception as e:
-                            print(e)
-                            continue
-                    else:
-                        print(e)
-                        continue
-            else:
-                print(e)
-                continue
-        ds.addData(s, classValue=row['difficulty'])
-        dfi.loc[dfi.shape[0]] = row
-        count += 1
-        print(f'>>> {count}!')
-        if count >= batch_size:
-            # process batch
-            print(">>> processing...")
-            ds.process()
-            ds.write(str(data_dir / f"henle-music21-{batch_number}x{batch_size}.tab"))
-            print(f"Exported henle-music21-{batch_number}x{batch_size}.tab")
-            dfi.to_csv(data_dir / "henle-music21-info.csv")
-            print(dfi.shape)
-            # new batch
-            count = 0
-            batch_number += 1
             ds = features.DataSet(classLabel='ClassLabel')
-            ds.addFeatureExtractors(feature_extractors)
-    if count > 0:
-        # process batch
-        print(">>> processing...")
-        ds.process()
-        ds.write(str(data_dir / f"henle-music21-{batch_number}x{batch_size}.tab"))
-        print(f"Exported henle-music21-{batch_number}x{batch_size}.tab")
-        dfi.to_csv(data_dir / "henle-music21-info.csv", index=False)
-        print(dfi.shape)
-
-
-def merge_batches(data_dir: pathlib.Path, *, batch_size: int):
-    dfi = pd.read_csv(data_dir / "henle-music21-info.csv")
-    df_ds = None
-    for i in range(math.ceil(dfi.shape[0] / batch_size)):
-        batch_number = i + 1
-        print(batch_number)
-        df_dsi = pd.read_csv(data_dir / f"henle-music21-{batch_number}x{batch_size}.tab", skiprows=[1, 2], dialect='excel-tab')
-        if df_ds is None:
-            df_ds = df_dsi
+            ds.addFeatureExtractors(get_feature_extractors())
+            ds.addData(s, classValue=work['difficulty'])
+            ds.process()
+        except Exception as e:
+            error = e
+            continue
+        return dict(work, source=zfp.name, labels=ds.getAttributeLabels(), values=ds.getFeaturesAsList()[0])
+    return dict(work, error=repr(error))
+
+
+def _sql_value(value):
+    # numpy scalars from pandas rows
+    return value.item() if isinstance(value, np.generic) else value
+
+
+class FeatureStore:
+    """
+    Append-only SQLite store of one row of features per work, written as soon as the work is done.
+
+    `features` has the work's hn, title and difficulty, then the music21 attributes as columns,
+    created from the first result. `failures` has works that did not parse.
+    """
+
+    def __init__(self, path: pathlib.Path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS failures (mvt1 TEXT PRIMARY KEY, position INTEGER, error TEXT)"
+        )
+        self.conn.commit()
+
+    def _has_features(self) -> bool:
+        row = self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'features'").fetchone()
+        return row is not None
+
+    def done(self, *, failed: bool = True) -> typing.Set[str]:
+        """mvt1 of the works already extracted, and of those that failed if `failed`."""
+        done = set()
+        if self._has_features():
+            done.update(mvt1 for mvt1, in self.conn.execute("SELECT mvt1 FROM features"))
+        if failed:
+            done.update(mvt1 for mvt1, in self.conn.execute("SELECT mvt1 FROM failures"))
+        return done
+
+    def add(self, position: int, result: dict) -> None:
+        if 'error' in result:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO failures (mvt1, position, error) VALUES (?, ?, ?)",
+                (result['mvt1'], position, result['error']),
+            )
         else:
-            df_ds = pd.concat([df_ds, df_dsi], ignore_index=True, sort=False)
+            columns = ['mvt1', 'position', 'hn', 'title', 'difficulty', 'source'] + result['labels']
+            quoted = ", ".join(f'"{c}"' for c in columns)
+            if not self._has_features():
+                self.conn.execute(f"CREATE TABLE features ({quoted}, PRIMARY KEY (mvt1))")
+            row = [result['mvt1'], position, result['hn'], result['title'], result['difficulty'], result['source']]
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO features ({quoted}) VALUES ({', '.join('?' * len(columns))})",
+                [_sql_value(value) for value in row + list(result['values'])],
+            )
+            self.conn.execute("DELETE FROM failures WHERE mvt1 = ?", (result['mvt1'],))
+        self.conn.commit()
+
+    def read(self) -> pd.DataFrame:
+        """All extracted works in henle-mxl-manual-v3.csv order, in one query."""
+        df = pd.read_sql_query("SELECT * FROM features ORDER BY position", self.conn)
+        return df.drop(columns=['mvt1', 'position', 'source'])
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def build_dataset(data_dir: pathlib.Path, *, processes: typing.Optional[int] = None, retry_failed: bool = False):
+    """
+    Extracts music21 features of the Henle works in a process pool into henle-music21.sqlite3.
+
+    Every work is written when it is done, so an interrupted run loses only the works in progress;
+    running again skips the works already in the store (and those that failed, unless `retry_failed`).
+    """
+    df = load_works(data_dir)
+    store = FeatureStore(data_dir / "henle-music21.sqlite3")
+    done = store.done(failed=not retry_failed)
+    todo = [(position, row.to_dict()) for position, (_, row) in enumerate(df.iterrows()) if row['mvt1'] not in done]
+    print(f"{df.shape[0]} works, {df.shape[0] - len(todo)} done, {len(todo)} to do")
+    try:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = {executor.submit(extract_work, data_dir, work): position for position, work in todo}
+            for count, future in enumerate(as_completed(futures), 1):
+                result = future.result()
+                store.add(futures[future], result)
+                status = result['error'] if 'error' in result else result['source']
+                print(f">>> {count}/{len(todo)} {result['mvt1'][:-4]}: {status}")
+    finally:
+        store.close()
+
 
-    df = dfi.merge(df_ds, left_index=True, right_index=True)
+def merge_batches(data_dir: pathlib.Path):
+    """Writes the works of henle-music21.sqlite3 to henle-music21.csv."""
+    store = FeatureStore(data_dir / "henle-music21.sqlite3")
+    try:
+        df = store.read()
+    finally:
+        store.close()
     print(df)
     df.to_csv(data_dir / "henle-music21.csv", index=False)
 
 
 if __name__ == '__main__':
     # data_dir = pathlib.Path("D:\\data\\MDC")
-    # batch_process(pathlib.Path("D:\\data\\MDC"), batch_size=8)
-    merge_batches(pathlib.Path("D:\\data\\MDC"), batch_size=8)
+    # build_dataset(pathlib.Path("D:\\data\\MDC"))
+    merge_batches(pathlib.Path("D:\\data\\MDC"))
 
     # df_books_headers = list(pd.read_csv(data_dir / "henle-books-header.csv").columns[:15]) + functools.reduce(
     #     lambda a, b: a + b, ([
@@ -0,0 +1,166 @@
+"""
+Time every music21 feature extractor on a corpus and rank them by cost against feature importance.
+
+    python packages/music/profile_extractors.py SCORES... [--ids m1,p1,...] [--isolated]
+        [--model apps/mdc-fastapi/data/models/xgb_996_v1.pkl ...] [--out extractor-profile.csv]
+
+SCORES are files or directories of .mxl/.musicxml/.xml files. Extractors default to the Henle dataset set
+(`music.main.FEATURE_EXTRACTOR_IDS` and native p22). Importance is the sum of the trained models'
+`feature_importances_` over the columns an extractor produces, normalized per model and averaged over models.
+
+Extractors share a `DataInstance` per score, as in `DataSet.process`, so intermediate streams (e.g. chordify)
+are paid for by the first extractor needing them. With `--isolated` every extractor gets a fresh one,
+which gives what each costs alone (not counting the `DataInstance`, which is built before the timing).
+"""
+import argparse
+import json
+import pathlib
+import sys
+import time
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from music21 import converter, features
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+from music.main import FEATURE_EXTRACTOR_IDS
+
+SCORE_SUFFIXES = ('.mxl', '.musicxml', '.xml')
+MANIFEST = pathlib.Path(__file__).resolve().parents[2] / "apps" / "mdc-fastapi" / "data" / "models" / "manifest.json"
+
+
+def get_extractor_classes(ids: Optional[Sequence[str]] = None) -> list:
+    if ids is None:
+        return features.extractorsById(FEATURE_EXTRACTOR_IDS) + features.extractorsById('p22', library=['native'])
+    return features.extractorsById(list(ids))
+
+
+def iter_scores(paths: Iterable[pathlib.Path]) -> Iterable[pathlib.Path]:
+    for path in paths:
+        if path.is_dir():
+            yield from sorted(p for p in path.rglob('*') if p.suffix.lower() in SCORE_SUFFIXES)
+        else:
+            yield path
+
+
+def profile_score(path: pathlib.Path, extractor_classes: list, *, isolated: bool = False) -> Dict[str, float]:
+    """Seconds to parse the score ("parse") and to run each extractor on it (by id, NaN if it failed)."""
+    start = time.perf_counter()
+    s = converter.parse(str(path))
+    times = {'parse': time.perf_counter() - start}
+    shared = None if isolated else features.DataInstance(s)
+    for cls in extractor_classes:
+        data = features.DataInstance(s) if isolated else shared
+        start = time.perf_counter()
+        try:
+            cls(data).extract()
+        except Exception:
+            times[cls.id] = float('nan')
+        else:
+            times[cls.id] = time.perf_counter() - start
+    return times
+
+
+def profile_corpus(paths: Iterable[pathlib.Path], extractor_classes: list, *, isolated: bool = False) -> pd.DataFrame:
+    """Seconds per score (rows) and extractor (columns)."""
+    rows = {}
+    for path in iter_scores(paths):
+        try:
+            rows[str(path)] = profile_score(path, extractor_classes, isolated=isolated)
+        except Exception as e:
+            print(f"Skipping {path}: {e!r}", file=sys.stderr)
+        else:
+            print(f">>> {len(rows)} {path.name}: {sum(rows[str(path)].values()):.2f}s", file=sys.stderr)
+    return pd.DataFrame.from_dict(rows, orient='index')
+
+
+def get_column_extractors(extractor_classes: list) -> Dict[str, str]:
+    """{DataSet column (e.g. Basic_Pitch_Histogram_3): extractor id}"""
+    return {label: cls.id for cls in extractor_classes for label in cls().getAttributeLabels()}
+
+
+def _feature_names(pipeline, model_id: str) -> Optional[List[str]]:
+    estimator = pipeline.steps[-1][1] if hasattr(pipeline, 'steps') else pipeline
+    names = getattr(estimator, 'feature_names_in_', None)
+    if names is None and hasattr(estimator, 'get_booster'):
+        names = estimator.get_booster().feature_names
+    if names is None and hasattr(pipeline, 'steps') and MANIFEST.is_file():
+        # pycaret's preprocessing decides the columns the estimator sees, run it on a row of zeros
+        entries = {e['id']: e for e in json.loads(MANIFEST.read_text(encoding='utf-8'))['models']}
+        columns = entries.get(model_id, {}).get('columns')
+        if columns:
+            X = pd.DataFrame([np.zeros(len(columns))], columns=columns)
+            for _, step in pipeline.steps[:-1]:
+                X = step.transform(X)
+            names = getattr(X, 'columns', None)
+    return None if names is None else [str(name) for name in names]
+
+
+def load_importance(model_path: pathlib.Path) -> pd.Series:
+    """Normalized feature importance of a saved pycaret (or sklearn) model, by column."""
+    import joblib
+
+    pipeline = joblib.load(model_path)
+    estimator = pipeline.steps[-1][1] if hasattr(pipeline, 'steps') else pipeline
+    importances = getattr(estimator, 'feature_importances_', None)
+    if importances is None:
+        raise ValueError(f"{model_path.name} has no feature_importances_")
+    names = _feature_names(pipeline, model_path.stem)
+    if names is None or len(names) != len(importances):
+        raise ValueError(f"cannot tell which columns the importances of {model_path.name} are for")
+    importance = pd.Series(importances, index=names, dtype=float)
+    return importance / importance.sum()
+
+
+def rank(times: pd.DataFrame, importance: Optional[pd.DataFrame], column_extractors: Dict[str, str]) -> pd.DataFrame:
+    """
+    Cost of every extractor over the corpus, most expensive first, with its importance if known.
+
+    `importance` has one column per model and one row per feature column.
+    """
+    per_extractor = times.drop(columns=['parse'])
+    report = pd.DataFrame({
+        'mean_seconds': per_extractor.mean(),
+        'p90_seconds': per_extractor.quantile(0.9),
+        'total_seconds': per_extractor.sum(),
+        'failures': per_extractor.isna().sum(),
+    })
+    report['share'] = report['total_seconds'] / report['total_seconds'].sum()
+    if importance is not None:
+        extractor_of = importance.index.map(lambda column: column_extractors.get(column))
+        by_extractor = importance.groupby(extractor_of).sum().mean(axis=1)
+        report['importance'] = by_extractor.reindex(report.index).fillna(0.0)
+        # seconds per unit of importance, the best candidates to drop have the highest
+        report['seconds_per_importance'] = report['mean_seconds'] / report['importance'].replace(0.0, np.nan)
+    return report.sort_values('total_seconds', ascending=False)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Time music21 feature extractors and rank them by importance.")
+    parser.add_argument('scores', nargs='+', type=pathlib.Path, help="score files or directories")
+    parser.add_argument('--ids', help="comma separated extractor ids (default: the Henle dataset set)")
+    parser.add_argument('--isolated', action='store_true', help="do not share intermediate streams")
+    parser.add_argument('--model', action='append', type=pathlib.Path, default=[], help="trained model .pkl")
+    parser.add_argument('--out', type=pathlib.Path, default=pathlib.Path('extractor-profile.csv'))
+    args = parser.parse_args()
+
+    extractor_classes = get_extractor_classes(args.ids.split(',') if args.ids else None)
+    times = profile_corpus(args.scores, extractor_classes, isolated=args.isolated)
+    if times.empty:
+        print("No score could be parsed", file=sys.stderr)
+        return 1
+    importance = None
+    if args.model:
+        importance = pd.concat({path.stem: load_importance(path) for path in args.model}, axis=1).fillna(0.0)
+    report = rank(times, importance, get_column_extractors(extractor_classes))
+    report.to_csv(args.out, index_label='extractor')
+    times.to_csv(args.out.with_name(f"{args.out.stem}-scores.csv"), index_label='score')
+    print(f"{len(times)} scores, parse {times['parse'].mean():.3f}s per score")
+    with pd.option_context('display.max_rows', None, 'display.width', 200):
+        print(report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
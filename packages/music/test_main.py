@@ -0,0 +1,44 @@
+import pathlib
+import shutil
+import tempfile
+import unittest
+
+import pandas as pd
+from music21 import corpus
+
+from main import FEATURE_EXTRACTOR_IDS, FeatureStore, build_dataset, get_feature_extractors
+
+
+class BuildDatasetTestCase(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = pathlib.Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.data_dir)
+        (self.data_dir / "playlists").mkdir()
+        shutil.copy(str(corpus.getWork('bach/bwv66.6')), self.data_dir / "playlists" / "bwv66.6.mxl")
+        pd.DataFrame([{
+            'hn': 1, 'title': "Chorale", 'difficulty': 2, 'problem': 0, 'changed': 0,
+            'mvt1': "bwv66.6.pdf", 'mvt2': None, 'mvt3': None,
+        }]).to_csv(self.data_dir / "henle-mxl-manual-v3.csv", index=False)
+
+    def test_feature_extractors(self):
+        extractors = get_feature_extractors()
+        self.assertEqual(len(extractors), len(FEATURE_EXTRACTOR_IDS) + 1)
+        self.assertTrue(all(isinstance(e, type) for e in extractors))
+
+    def test_one_work(self):
+        build_dataset(self.data_dir, processes=1)
+        store = FeatureStore(self.data_dir / "henle-music21.sqlite3")
+        try:
+            failures = store.conn.execute("SELECT mvt1, error FROM failures").fetchall()
+            self.assertEqual(failures, [])
+            df = store.read()
+        finally:
+            store.close()
+        self.assertEqual(len(df), 1)
+        self.assertEqual(df.loc[0, 'title'], "Chorale")
+        self.assertEqual(df.loc[0, 'difficulty'], 2)
+        self.assertIn('Quality', df.columns)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import pathlib
+import unittest
+
+from music21 import corpus
+
+import profile_extractors
+from music.main import FEATURE_EXTRACTOR_IDS
+
+
+class ProfileExtractorsTestCase(unittest.TestCase):
+    def test_default_extractors(self):
+        extractor_classes = profile_extractors.get_extractor_classes()
+        self.assertEqual(len(extractor_classes), len(FEATURE_EXTRACTOR_IDS) + 1)
+        self.assertEqual(extractor_classes[-1].id, 'P22')
+
+        score = pathlib.Path(str(corpus.getWork('bach/bwv66.6')))
+        times = profile_extractors.profile_corpus([score], extractor_classes)
+        self.assertEqual(list(times.index), [str(score)])
+        self.assertEqual(list(times.columns), ['parse'] + [cls.id for cls in extractor_classes])
+        self.assertFalse(times.isna().any().any(), times.columns[times.isna().any()].tolist())
+
+    def test_isolated(self):
+        score = pathlib.Path(str(corpus.getWork('bach/bwv66.6')))
+        times = profile_extractors.profile_score(score, profile_extractors.get_extractor_classes(['p1', 'p22']),
+                                                 isolated=True)
+        self.assertEqual(list(times), ['parse', 'P1', 'P22'])
+        self.assertTrue(all(seconds >= 0 for seconds in times.values()))
+
+
+if __name__ == '__main__':
+    unittest.main()